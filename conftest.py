@@ -0,0 +1,6 @@
+"""pytest 配置：把仓库根目录加入导入路径，测试中使用 from src.xxx import"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
@@ -2,7 +2,6 @@ from flask import Flask, render_template, jsonify, request, redirect, url_for, f
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import pandas as pd
-import joblib
 from pathlib import Path
 import logging
 import json
@@ -10,6 +9,13 @@ import os
 import threading
 import time
 from src.data_collector import AirQualityCollector
+from src.prediction_engine import FEATURE_COLUMNS
+from src.city_state import CityStateStore, DEFAULT_CAPACITY, MAX_AGE_HOURS
+from src.ingestion_scheduler import HourlyIngestionScheduler
+from src.processed_store import dataset_path, read_recent
+from src.encoding_registry import EncodingRegistry, registry_path
+from src.model_registry import ModelRegistry
+from src.model_watcher import ModelHotSwapper
 from src.extensions import db
 from src.models.user import User, user_favorite_cities
 from src.models.city import City
@@ -113,6 +119,9 @@ app.register_blueprint(data_bp, url_prefix='/data')
 # 初始化预测系统（包含深度学习模型和统计模型）
 collector = AirQualityCollector()
 
+# 实时数据定时采集（在主程序中启动）
+ingestion_scheduler = HourlyIngestionScheduler(collector)
+
 # 加载城市数据
 try:
     with open(ROOT_DIR / 'data/cities.json', 'r', encoding='utf-8') as f:
@@ -140,46 +149,55 @@ MODEL_FEATURES = [
     'pressure', 'precipitation'
 ]
 
-# 特征列名（按照训练时的顺序）
-FEATURE_COLUMNS = [
-    'hour', 'dayofweek', 'month', 'season',
-    'is_weekend', 'is_peak_hour',
-    'aqi_ma24', 'pm25_ma24',
-    'aqi_lag1', 'pm25_lag1',
-    'aqi_lag3', 'pm25_lag3',
-    'aqi_lag6', 'pm25_lag6',
-    'aqi_lag12', 'pm25_lag12',
-    'aqi_lag24', 'pm25_lag24',
-    'city_code', 'province_code'
-]
+# 模型注册表和热切换器：后台线程发现新版本后验证并替换预测引擎，切换后重新批量预测并清空预测缓存
+# 版本包含分片模型时按城市路由到所属分片，未分配分片的城市使用全局模型（USE_SHARD_MODELS=0 关闭）
+model_registry = ModelRegistry(ROOT_DIR / 'data/models')
+model_swapper = ModelHotSwapper(
+    model_registry,
+    on_swap=lambda version: collector.refresh_forecasts(),
+    use_shards=os.environ.get('USE_SHARD_MODELS', '1') != '0'
+)
 
 # 加载模型
+city_state = None
 try:
     logger.info("开始加载模型...")
-    models_dir = ROOT_DIR / 'data/models'
-    
-    # 查找最新的AQI和PM2.5模型
-    aqi_models = list(models_dir.glob('best_AQI_model_*.joblib'))
-    pm25_models = list(models_dir.glob('best_PM2.5_model_*.joblib'))
-    
-    if not aqi_models or not pm25_models:
-        raise FileNotFoundError("未找到训练好的模型文件")
     
-    # 获取最新的模型文件
-    latest_aqi_model = max(aqi_models, key=lambda x: x.stat().st_mtime)
-    latest_pm25_model = max(pm25_models, key=lambda x: x.stat().st_mtime)
+    # 城市和省份编码注册表（与数据处理和训练共用）
+    encodings = EncodingRegistry(registry_path(ROOT_DIR / 'data/processed'))
+    if encodings.size('city') == 0:
+        raise FileNotFoundError("未找到城市编码注册表，请先运行数据处理")
     
-    logger.info(f"加载AQI模型: {latest_aqi_model.name}")
-    logger.info(f"加载PM2.5模型: {latest_pm25_model.name}")
+    # 加载历史数据（只读取覆盖状态容量的最近日期和必要列，年初时包含上一年的分区），
+    # 只为每个城市保留最近一周的状态
+    dataset = dataset_path(ROOT_DIR / 'data/processed')
+    historical_data = read_recent(
+        dataset,
+        DEFAULT_CAPACITY,
+        columns=['city', 'province', 'date', 'hour', 'aqi', 'pm25']
+    )
+    city_state = CityStateStore.from_history(historical_data, encodings=encodings)
+    del historical_data
+    logger.info(f"城市状态加载完成: {len(city_state)} 个城市, {city_state.nbytes / 1024:.1f} KB")
+    stale = len(city_state) - len(city_state.fresh_cities(list(city_state.city_index)))
+    if stale:
+        logger.warning(
+            f"{stale} 个城市的历史数据已过期（最新数据早于 {MAX_AGE_HOURS} 小时前），"
+            f"积累足够的实时数据之前使用统计预测"
+        )
     
-    # 加载模型
-    aqi_model = joblib.load(latest_aqi_model)
-    pm25_model = joblib.load(latest_pm25_model)
+    # 实时数据到达时原地更新城市状态
+    collector.state_store = city_state
+    model_swapper.state = city_state
     
-    # 加载历史数据
-    data_file = ROOT_DIR / 'data/processed/hourly_data_processed.csv'
-    historical_data = pd.read_csv(data_file, low_memory=False)
-    historical_data['date'] = pd.to_datetime(historical_data['date'])
+    # 启用最新的模型版本（模型文件在第一次预测时才加载）
+    model_version = model_registry.latest()
+    if model_version is None:
+        raise FileNotFoundError("未找到训练好的模型文件")
+    model_swapper.activate(model_version, validate=False)
+    logger.info(f"使用模型版本: {model_version.version} ({model_version.manifest['format']})")
+    if model_version.shards and model_swapper.use_shards:
+        logger.info(f"启用分片路由: {len(model_version.shards)} 个分片 (按{model_version.manifest['shards']['by']})")
     logger.info("模型和数据加载成功")
     
 except Exception as e:
@@ -211,55 +229,23 @@ def get_quality_level(aqi):
     else:
         return '严重污染'
 
-def prepare_features(city_data, timestamp):
-    """准备模型预测所需的特征"""
-    features = pd.DataFrame(index=[0])
-    
-    # 时间特征
-    features['hour'] = timestamp.hour
-    features['dayofweek'] = timestamp.dayofweek
-    features['month'] = timestamp.month
-    features['season'] = get_season(timestamp.month)
-    features['is_weekend'] = 1 if timestamp.dayofweek >= 5 else 0
-    features['is_peak_hour'] = 1 if timestamp.hour in [7,8,9,17,18,19] else 0
-    
-    # 获取最近24小时的数据，确保按时间排序
-    recent_data = city_data.sort_values('date').tail(24)
-    
-    # 计算移动平均（使用最近24小时的数据）
-    features['aqi_ma24'] = recent_data['aqi'].mean()
-    features['pm25_ma24'] = recent_data['pm25'].mean()
-    
-    # 获取最新数据作为滞后特征
-    latest_data = recent_data.iloc[-1]
-    features['aqi_lag1'] = latest_data['aqi']
-    features['pm25_lag1'] = latest_data['pm25']
+def get_model_forecasts(cities):
+    """使用批量预测引擎为多个城市生成未来24小时预测
     
-    # 获取3小时前数据
-    lag3_data = recent_data.iloc[-3] if len(recent_data) >= 3 else latest_data
-    features['aqi_lag3'] = lag3_data['aqi']
-    features['pm25_lag3'] = lag3_data['pm25']
-    
-    # 获取6小时前数据
-    lag6_data = recent_data.iloc[-6] if len(recent_data) >= 6 else latest_data
-    features['aqi_lag6'] = lag6_data['aqi']
-    features['pm25_lag6'] = lag6_data['pm25']
-    
-    # 获取12小时前数据
-    lag12_data = recent_data.iloc[-12] if len(recent_data) >= 12 else latest_data
-    features['aqi_lag12'] = lag12_data['aqi']
-    features['pm25_lag12'] = lag12_data['pm25']
-    
-    # 获取24小时前数据
-    lag24_data = recent_data.iloc[-24] if len(recent_data) >= 24 else latest_data
-    features['aqi_lag24'] = lag24_data['aqi']
-    features['pm25_lag24'] = lag24_data['pm25']
-    
-    # 城市和省份编码
-    features['city_code'] = latest_data['city_code']
-    features['province_code'] = latest_data['province_code']
-    
-    return features[FEATURE_COLUMNS]
+    返回 {城市: 预测列表}，模型或历史数据不可用的城市不会出现在结果中
+    """
+    # 每次请求只取一次当前引擎，模型切换不影响正在进行的预测
+    engine = model_swapper.engine
+    if engine is None or city_state is None:
+        return {}
+    try:
+        return engine.forecast(city_state, list(cities))
+    except Exception as e:
+        logger.error(f"模型批量预测失败: {str(e)}")
+        return {}
+
+# 让collector使用训练好的模型进行递归多步预测（每次刷新为所有城市批量预测一次）
+collector.model_forecaster = get_model_forecasts
 
 @app.before_request
 def before_request():
@@ -430,6 +416,16 @@ def get_prediction():
             }
         })
 
+@app.route('/api/forecast_cache/stats')
+def forecast_cache_stats():
+    """获取预测缓存的命中统计"""
+    return jsonify(collector.forecast_cache.stats())
+
+@app.route('/api/model/version')
+def model_version_info():
+    """获取当前启用的模型版本"""
+    return jsonify(model_swapper.status())
+
 # 添加调试路由，确认数据蓝图映射正确
 @app.route('/data/test')
 def data_test():
@@ -790,4 +786,12 @@ if __name__ == '__main__':
     alert_thread.start()
     logger.info("预警检查后台任务已启动")
     
+    # 启动实时数据定时采集任务
+    ingestion_scheduler.start()
+    logger.info("实时数据定时采集任务已启动")
+    
+    # 启动模型版本监视任务
+    model_swapper.start()
+    logger.info("模型版本监视任务已启动")
+    
     app.run(debug=True, port=5000) 
\ No newline at end of file
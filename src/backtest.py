@@ -0,0 +1,320 @@
+"""
+预测模型回测模块
+
+这个模块用滚动起点回放历史数据，评估多步预测的准确度和预测吞吐量，主要功能包括：
+1. 把处理后的小时数据整理为 (城市, 小时) 的连续数组
+2. 每个预测起点用此前24小时的真实数据作为滞后窗口，预测之后1-24小时
+3. 使用与在线服务相同的特征路径（PredictionEngine 的递归/直接预测）
+4. 按预测时长和城市统计 AQI/PM2.5 的 RMSE 和 MAE
+5. 记录每秒预测数，同一份报告同时衡量准确度和服务开销
+"""
+
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.prediction_engine import (
+    PredictionEngine, LagRingBuffer, window_features, FORECAST_HORIZON, WINDOW_SIZE
+)
+from src.processed_store import dataset_path, list_years, read_processed
+from src.encoding_registry import EncodingRegistry, registry_path
+from src.model_registry import ModelRegistry
+from src.model_router import build_model
+
+# 回测需要的列
+HISTORY_COLUMNS = ['city', 'province', 'date', 'hour', 'aqi', 'pm25']
+
+# 评估的预测目标（列名）
+TARGETS = ['aqi', 'pm25']
+
+
+def load_history(dataset, start=None, end=None):
+    """
+    读取回测时间范围内的小时数据
+
+    参数:
+        dataset (Path): 处理后的数据集目录
+        start (pd.Timestamp): 起始时间（会额外读取滞后窗口需要的前一天）
+        end (pd.Timestamp): 结束时间
+
+    返回:
+        pd.DataFrame: 小时数据
+    """
+    years = list_years(dataset)
+    filters = []
+    if start is not None:
+        first = (pd.Timestamp(start) - pd.Timedelta(hours=WINDOW_SIZE)).normalize()
+        years = [y for y in years if y >= first.year]
+        filters.append(('date', '>=', first.strftime('%Y-%m-%d')))
+    if end is not None:
+        years = [y for y in years if y <= pd.Timestamp(end).year]
+        filters.append(('date', '<=', pd.Timestamp(end).strftime('%Y-%m-%d')))
+    return read_processed(dataset, columns=HISTORY_COLUMNS, years=years, filters=filters)
+
+
+class HourlyPanel:
+    """
+    (城市, 小时) 的连续数据数组
+
+    缺失的小时为 NaN，回测时跳过窗口或真实值不完整的城市。
+
+    属性:
+        cities (np.ndarray): 城市名称
+        codes (np.ndarray): (N, 2) 的城市和省份编码
+        start (pd.Timestamp): 第0列对应的时间
+        aqi (np.ndarray): (N, T) 的AQI
+        pm25 (np.ndarray): (N, T) 的PM2.5
+    """
+
+    def __init__(self, history, encodings):
+        """从小时数据构建数组，未在编码注册表中登记的城市会被忽略"""
+        history = history.copy()
+        history['city'] = history['city'].astype(str)
+        history['province'] = history['province'].astype(str)
+        timestamps = pd.to_datetime(history['date'].astype(str)) + pd.to_timedelta(history['hour'], unit='h')
+
+        provinces = history.groupby('city', sort=True)['province'].last()
+        city_codes = np.array([encodings.code('city', c) for c in provinces.index])
+        province_codes = np.array([encodings.code('province', p) for p in provinces.to_numpy()])
+        known = (city_codes >= 0) & (province_codes >= 0)
+
+        self.cities = provinces.index.to_numpy()[known]
+        self.codes = np.stack([city_codes[known], province_codes[known]], axis=1).astype(np.float32)
+        self.start = timestamps.min().floor('h')
+        n_hours = int((timestamps.max() - self.start) / pd.Timedelta(hours=1)) + 1
+
+        row = pd.Categorical(history['city'], categories=self.cities).codes
+        col = ((timestamps - self.start) / pd.Timedelta(hours=1)).to_numpy().astype(np.int64)
+        keep = row >= 0
+        self.aqi = np.full((len(self.cities), n_hours), np.nan, dtype=np.float32)
+        self.pm25 = np.full((len(self.cities), n_hours), np.nan, dtype=np.float32)
+        self.aqi[row[keep], col[keep]] = history['aqi'].to_numpy()[keep]
+        self.pm25[row[keep], col[keep]] = history['pm25'].to_numpy()[keep]
+
+    @property
+    def n_hours(self):
+        return self.aqi.shape[1]
+
+    def hour_index(self, timestamp):
+        """时间对应的列号"""
+        return int((pd.Timestamp(timestamp).floor('h') - self.start) / pd.Timedelta(hours=1))
+
+    def timestamp(self, index):
+        """列号对应的时间"""
+        return self.start + pd.Timedelta(hours=int(index))
+
+
+class WalkForwardBacktester:
+    """
+    滚动起点回测器
+
+    属性:
+        engine (PredictionEngine): 预测引擎（与在线服务相同）
+        horizon (int): 预测时长（小时）
+        recursive (bool): 是否使用递归多步预测（在线服务的默认方式）
+    """
+
+    def __init__(self, engine, horizon=FORECAST_HORIZON, recursive=True):
+        """初始化回测器"""
+        self.engine = engine
+        self.horizon = horizon
+        self.recursive = recursive
+
+    def origins(self, panel, start=None, end=None, step_hours=24):
+        """
+        生成预测起点（列号）
+
+        参数:
+            panel (HourlyPanel): 数据数组
+            start, end (pd.Timestamp): 起点的时间范围，默认为全部可用范围
+            step_hours (int): 相邻起点的间隔（小时）
+        """
+        first = WINDOW_SIZE
+        last = panel.n_hours - self.horizon
+        if start is not None:
+            first = max(first, panel.hour_index(start))
+        if end is not None:
+            last = min(last, panel.hour_index(end))
+        return np.arange(first, last + 1, step_hours)
+
+    def predict_origin(self, panel, origin):
+        """
+        在一个起点上为所有窗口完整的城市预测未来 horizon 小时
+
+        返回:
+            tuple: (城市行号, aqi预测 (n, H), pm25预测 (n, H))，没有窗口完整的城市时 n 为 0
+        """
+        aqi_window = panel.aqi[:, origin - WINDOW_SIZE:origin]
+        pm25_window = panel.pm25[:, origin - WINDOW_SIZE:origin]
+        rows = np.nonzero(np.isfinite(aqi_window).all(axis=1) & np.isfinite(pm25_window).all(axis=1))[0]
+        if not len(rows):
+            empty = np.empty((0, self.horizon))
+            return rows, empty, empty
+
+        timestamps = [panel.timestamp(origin + h).to_pydatetime() for h in range(self.horizon)]
+        if self.recursive:
+            aqi, pm25 = self.engine.predict_recursive(
+                aqi_window[rows], pm25_window[rows], panel.codes[rows], timestamps
+            )
+        else:
+            city_features = window_features(
+                LagRingBuffer(aqi_window[rows]), LagRingBuffer(pm25_window[rows]), panel.codes[rows]
+            )
+            aqi, pm25 = self.engine.predict(city_features, timestamps)
+        return rows, aqi, pm25
+
+    def run(self, panel, origins):
+        """
+        回放所有起点并统计误差
+
+        参数:
+            panel (HourlyPanel): 数据数组
+            origins (np.ndarray): 预测起点（列号）
+
+        返回:
+            dict: 回测报告
+        """
+        n_cities = len(panel.cities)
+        shape = (len(TARGETS), n_cities, self.horizon)
+        sq_err = np.zeros(shape)
+        abs_err = np.zeros(shape)
+        counts = np.zeros(shape)
+        n_predictions = 0
+        predict_seconds = 0.0
+        scored = []
+
+        for origin in origins:
+            start_time = time.perf_counter()
+            rows, aqi_pred, pm25_pred = self.predict_origin(panel, origin)
+            # 没有城市窗口完整的起点（数据缺口）不计入起点数和吞吐量
+            if not len(rows):
+                continue
+            predict_seconds += time.perf_counter() - start_time
+            n_predictions += aqi_pred.size + pm25_pred.size
+            scored.append(origin)
+
+            for t, (pred, actual) in enumerate(((aqi_pred, panel.aqi), (pm25_pred, panel.pm25))):
+                err = pred - actual[rows, origin:origin + self.horizon]
+                ok = np.isfinite(err)
+                err = np.where(ok, err, 0.0)
+                sq_err[t, rows] += err ** 2
+                abs_err[t, rows] += np.abs(err)
+                counts[t, rows] += ok
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            horizon_rmse = np.sqrt(sq_err.sum(axis=1) / counts.sum(axis=1))
+            horizon_mae = abs_err.sum(axis=1) / counts.sum(axis=1)
+            city_rmse = np.sqrt(sq_err.sum(axis=2) / counts.sum(axis=2))
+            city_horizon_rmse = np.sqrt(sq_err / counts)
+
+        def as_list(values):
+            return [None if not np.isfinite(v) else round(float(v), 4) for v in values]
+
+        return {
+            'mode': 'recursive' if self.recursive else 'direct',
+            'origins': len(scored),
+            'skipped_origins': len(origins) - len(scored),
+            'first_origin': str(panel.timestamp(scored[0])) if scored else None,
+            'last_origin': str(panel.timestamp(scored[-1])) if scored else None,
+            'cities': n_cities,
+            'horizon': {
+                target: {'rmse': as_list(horizon_rmse[t]), 'mae': as_list(horizon_mae[t])}
+                for t, target in enumerate(TARGETS)
+            },
+            'per_city': {
+                str(city): {
+                    f'{target}_rmse': as_list([city_rmse[t, i]])[0]
+                    for t, target in enumerate(TARGETS)
+                } | {
+                    f'{target}_rmse_by_horizon': as_list(city_horizon_rmse[t, i])
+                    for t, target in enumerate(TARGETS)
+                }
+                for i, city in enumerate(panel.cities)
+            },
+            'throughput': {
+                'predictions': int(n_predictions),
+                'predict_seconds': predict_seconds,
+                'predictions_per_second': n_predictions / predict_seconds if predict_seconds > 0 else None
+            }
+        }
+
+
+def print_summary(report):
+    """打印回测报告摘要"""
+    print(f"\n回测完成: {report['origins']} 个起点, {report['cities']} 个城市 ({report['mode']})")
+    if report['skipped_origins']:
+        print(f"跳过 {report['skipped_origins']} 个没有完整历史窗口的起点")
+    print(f"起点范围: {report['first_origin']} 至 {report['last_origin']}")
+    for target, stats in report['horizon'].items():
+        rmse = stats['rmse']
+        print(f"{target} RMSE: 1h={rmse[0]}, 6h={rmse[5]}, 12h={rmse[11]}, 24h={rmse[-1]}")
+    throughput = report['throughput']
+    if throughput['predictions_per_second']:
+        print(f"吞吐量: {throughput['predictions_per_second']:,.0f} 次预测/秒 "
+              f"(共 {throughput['predictions']:,} 次, {throughput['predict_seconds']:.2f}秒)")
+
+
+def main():
+    """
+    主函数：回测模型注册表中的最新模型（或 --version 指定的版本）
+
+    默认从模型训练集的时间边界开始，每24小时一个起点；
+    --step N 指定起点间隔（小时），--days N 只回测最后 N 天，--direct 使用直接预测，
+    --global 不使用分片模型（与分片路由对比）
+    """
+    root_dir = Path(__file__).parent.parent.absolute()
+    processed_dir = root_dir / 'data' / 'processed'
+    models_dir = root_dir / 'data' / 'models'
+
+    def arg(name, default=None):
+        return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+    registry = ModelRegistry(models_dir)
+    version = registry.get(arg('--version')) if arg('--version') else registry.latest()
+    if version is None:
+        raise FileNotFoundError("未找到训练好的模型文件")
+    use_shards = '--global' not in sys.argv
+    engine = PredictionEngine(build_model(version, 'AQI', use_shards), build_model(version, 'PM2.5', use_shards))
+
+    # 回测范围：默认从训练集的时间边界开始（模型没有见过的数据）
+    start = version.manifest.get('train_end')
+    dataset = dataset_path(processed_dir)
+    if arg('--days'):
+        last_year = list_years(dataset)[-1]
+        last_date = read_processed(dataset, columns=['date'], years=[last_year])['date'].max()
+        start = pd.Timestamp(last_date) - pd.Timedelta(days=int(arg('--days')))
+
+    print(f"回测模型版本: {version.version}, 起始时间: {start or '全部历史'}")
+    history = load_history(dataset, start=start)
+    panel = HourlyPanel(history, EncodingRegistry(registry_path(processed_dir)))
+    del history
+
+    backtester = WalkForwardBacktester(engine, recursive='--direct' not in sys.argv)
+    step_hours = int(arg('--step', 24))
+    origins = backtester.origins(panel, start=start, step_hours=step_hours)
+    report = backtester.run(panel, origins)
+    report['model_version'] = version.version
+    report['shards'] = len(version.shards) if use_shards else 0
+    print_summary(report)
+
+    reports_dir = models_dir / 'reports'
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    # 文件名包含运行参数和精确到微秒的时间，不同参数或同一秒内的多次回测不会互相覆盖
+    run_name = f"{report['mode']}_{'shards' if report['shards'] else 'global'}_step{step_hours}"
+    if arg('--days'):
+        run_name += f"_days{arg('--days')}"
+    report_file = reports_dir / (
+        f"backtest_{version.version}_{run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+    )
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"回测报告已保存至: {report_file}")
+
+
+if __name__ == '__main__':
+    main()
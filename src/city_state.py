@@ -0,0 +1,283 @@
+"""
+城市实时状态存储模块
+
+这个模块为在线预测维护每个城市最近一段时间的小时数据，主要功能包括：
+1. 使用固定大小的 NumPy 环形缓冲区保存每个城市最近 24~168 小时的 aqi/pm25
+2. O(1) 获取滞后值和24小时移动平均
+3. 新的小时数据到达时原地更新，缺失的小时用上一小时的数值补齐；
+   中断超过缓冲区容量时清空该城市的状态重新开始
+4. 为预测引擎批量导出城市的滞后窗口
+5. 筛选状态可用的城市（最新数据距当前不超过几个小时且至少有24小时数据），
+   其余城市不使用模型预测
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# 默认保存的小时数（7天）
+DEFAULT_CAPACITY = 168
+
+# 移动平均窗口（小时）
+MA_WINDOW = 24
+
+# 城市状态的最长有效时间（小时），最新数据早于此时的城市不使用模型预测
+MAX_AGE_HOURS = 3
+
+# 时间戳的小时精度起点
+_EPOCH = np.datetime64('1970-01-01T00', 'h')
+
+
+def _hour_index(timestamp):
+    """将时间戳转换为自1970年起的小时序号"""
+    return int((np.datetime64(pd.Timestamp(timestamp).floor('h'), 'h') - _EPOCH).astype(np.int64))
+
+
+class CityStateStore:
+    """
+    按城市组织的环形缓冲区状态存储
+
+    每个城市占用 capacity × 2 个 float32（默认168小时约1.3KB），
+    所有城市的数据保存在同一组二维数组中，按城市所在行索引。
+
+    属性:
+        capacity (int): 每个城市保存的小时数
+        city_index (dict): {城市名称: 行号}
+        code_index (dict): {city_code: 行号}
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, initial_cities=64):
+        """初始化状态存储"""
+        if capacity < MA_WINDOW:
+            raise ValueError(f"capacity 不能小于 {MA_WINDOW}")
+
+        self.capacity = capacity
+        self.city_index = {}
+        self.code_index = {}
+        self._lock = threading.Lock()
+
+        self.aqi = np.zeros((initial_cities, capacity), dtype=np.float32)
+        self.pm25 = np.zeros((initial_cities, capacity), dtype=np.float32)
+        self.codes = np.zeros((initial_cities, 2), dtype=np.float32)
+        self.heads = np.zeros(initial_cities, dtype=np.int64)       # 下一次写入的位置
+        self.counts = np.zeros(initial_cities, dtype=np.int64)      # 已写入的小时数
+        self.last_hour = np.zeros(initial_cities, dtype=np.int64)   # 最新数据的小时序号
+        self.aqi_sum24 = np.zeros(initial_cities, dtype=np.float64)
+        self.pm25_sum24 = np.zeros(initial_cities, dtype=np.float64)
+
+    @classmethod
+    def from_history(cls, history, capacity=DEFAULT_CAPACITY, encodings=None):
+        """
+        从历史小时数据构建状态存储，每个城市只保留最近 capacity 小时
+
+        参数:
+            history (pd.DataFrame): 包含 city/date/hour/aqi/pm25 的小时数据；
+                指定 encodings 时还需要 province 列，否则需要 city_code/province_code 列
+            encodings (EncodingRegistry): 编码注册表，指定时城市和省份编码从注册表查询
+        """
+        recent = history.sort_values(['city', 'date', 'hour']).groupby('city', sort=False, observed=True).tail(capacity)
+        store = cls(capacity=capacity, initial_cities=max(recent['city'].nunique(), 1))
+
+        for city, rows in recent.groupby('city', sort=False, observed=True):
+            if encodings is not None:
+                city_code = encodings.code('city', city)
+                province_code = encodings.code('province', rows['province'].iloc[-1])
+                if city_code < 0 or province_code < 0:
+                    continue  # 未登记的城市无法编码，跳过
+            else:
+                city_code, province_code = rows['city_code'].iloc[-1], rows['province_code'].iloc[-1]
+            idx = store.add_city(city, city_code, province_code)
+            last = rows.iloc[-1]
+            timestamp = pd.Timestamp(last['date']) + pd.Timedelta(hours=int(last['hour']))
+            store._load(idx, rows['aqi'].to_numpy(), rows['pm25'].to_numpy(), _hour_index(timestamp))
+
+        return store
+
+    def __len__(self):
+        return len(self.city_index)
+
+    def __contains__(self, city):
+        return city in self.city_index
+
+    @property
+    def nbytes(self):
+        """状态数组占用的内存（字节）"""
+        return sum(arr.nbytes for arr in (
+            self.aqi, self.pm25, self.codes, self.heads, self.counts,
+            self.last_hour, self.aqi_sum24, self.pm25_sum24
+        ))
+
+    def add_city(self, city, city_code, province_code):
+        """注册城市并返回其行号，已存在时直接返回"""
+        if city in self.city_index:
+            return self.city_index[city]
+
+        idx = len(self.city_index)
+        if idx >= self.aqi.shape[0]:
+            self._grow(max(idx * 2, 1))
+
+        self.city_index[city] = idx
+        self.code_index[int(city_code)] = idx
+        self.codes[idx] = [city_code, province_code]
+        return idx
+
+    def _grow(self, rows):
+        """扩展状态数组的行数"""
+        extra = rows - self.aqi.shape[0]
+        for name in ('aqi', 'pm25', 'codes', 'heads', 'counts', 'last_hour', 'aqi_sum24', 'pm25_sum24'):
+            arr = getattr(self, name)
+            pad = np.zeros((extra,) + arr.shape[1:], dtype=arr.dtype)
+            setattr(self, name, np.concatenate([arr, pad]))
+
+    def _load(self, idx, aqi_values, pm25_values, last_hour):
+        """批量写入一个城市的历史序列（按时间从旧到新）"""
+        aqi_values = np.asarray(aqi_values, dtype=np.float32)[-self.capacity:]
+        pm25_values = np.asarray(pm25_values, dtype=np.float32)[-self.capacity:]
+        n = len(aqi_values)
+
+        self.aqi[idx, :n] = aqi_values
+        self.pm25[idx, :n] = pm25_values
+        self.heads[idx] = n % self.capacity
+        self.counts[idx] = n
+        self.last_hour[idx] = last_hour
+        self.aqi_sum24[idx] = aqi_values[-MA_WINDOW:].sum(dtype=np.float64)
+        self.pm25_sum24[idx] = pm25_values[-MA_WINDOW:].sum(dtype=np.float64)
+
+    def _push(self, idx, aqi, pm25):
+        """向一个城市写入下一小时的数据，并增量更新24小时总和"""
+        head = self.heads[idx]
+        if self.counts[idx] >= MA_WINDOW:
+            out = (head - MA_WINDOW) % self.capacity
+            self.aqi_sum24[idx] -= self.aqi[idx, out]
+            self.pm25_sum24[idx] -= self.pm25[idx, out]
+
+        self.aqi[idx, head] = aqi
+        self.pm25[idx, head] = pm25
+        self.aqi_sum24[idx] += aqi
+        self.pm25_sum24[idx] += pm25
+        self.heads[idx] = (head + 1) % self.capacity
+        self.counts[idx] = min(self.counts[idx] + 1, self.capacity)
+
+    def _reset(self, idx):
+        """清空一个城市的缓冲区（保留城市注册信息）"""
+        self.heads[idx] = 0
+        self.counts[idx] = 0
+        self.aqi_sum24[idx] = 0.0
+        self.pm25_sum24[idx] = 0.0
+
+    def update(self, city, timestamp, aqi, pm25):
+        """
+        原地写入一个城市的最新小时数据
+
+        同一小时重复写入时覆盖最新值；中间缺失的小时用上一小时的数值补齐，
+        保证缓冲区中相邻两格始终相差一小时。缺失超过 capacity 小时时缓冲区中
+        已没有真实数据，清空该城市的状态后从这一小时重新开始。未注册的城市会被忽略。
+
+        返回:
+            bool: 是否写入成功
+        """
+        idx = self.city_index.get(city)
+        if idx is None:
+            return False
+
+        hour = _hour_index(timestamp)
+        with self._lock:
+            if self.counts[idx] == 0:
+                self._push(idx, aqi, pm25)
+                self.last_hour[idx] = hour
+                return True
+
+            gap = hour - self.last_hour[idx]
+            if gap < 0:
+                return False  # 过期数据
+            if gap == 0:
+                # 同一小时：覆盖最新值
+                latest = (self.heads[idx] - 1) % self.capacity
+                self.aqi_sum24[idx] += aqi - self.aqi[idx, latest]
+                self.pm25_sum24[idx] += pm25 - self.pm25[idx, latest]
+                self.aqi[idx, latest] = aqi
+                self.pm25[idx, latest] = pm25
+                return True
+
+            if gap > self.capacity:
+                self._reset(idx)
+                self._push(idx, aqi, pm25)
+                self.last_hour[idx] = hour
+                return True
+
+            # 补齐缺失的小时
+            latest = (self.heads[idx] - 1) % self.capacity
+            fill_aqi, fill_pm25 = self.aqi[idx, latest], self.pm25[idx, latest]
+            for _ in range(gap - 1):
+                self._push(idx, fill_aqi, fill_pm25)
+            self._push(idx, aqi, pm25)
+            self.last_hour[idx] = hour
+            return True
+
+    def lag(self, city, k):
+        """获取城市 k 小时前的数据 (aqi, pm25)，k=1 为最新值"""
+        idx = self.city_index[city]
+        if k > self.counts[idx]:
+            k = 1  # 数据不足时使用最新数据
+        pos = (self.heads[idx] - k) % self.capacity
+        return float(self.aqi[idx, pos]), float(self.pm25[idx, pos])
+
+    def moving_average(self, city):
+        """获取城市最近24小时的移动平均 (aqi, pm25)"""
+        idx = self.city_index[city]
+        n = min(self.counts[idx], MA_WINDOW) or 1
+        return float(self.aqi_sum24[idx] / n), float(self.pm25_sum24[idx] / n)
+
+    def last_timestamp(self, city):
+        """获取城市最新数据的时间"""
+        idx = self.city_index[city]
+        return (_EPOCH + np.timedelta64(int(self.last_hour[idx]), 'h')).astype(datetime)
+
+    def fresh_cities(self, cities, now=None, max_age_hours=MAX_AGE_HOURS, min_hours=MA_WINDOW):
+        """
+        筛选状态可用于模型预测的城市
+
+        参数:
+            cities (list): 城市名称列表
+            now (datetime): 当前时间，默认为系统时间
+            max_age_hours (int): 最新数据距 now 所在整点的最大小时数
+            min_hours (int): 至少需要的小时数（不足时滞后窗口只能用最新值补齐）
+
+        返回:
+            list: 已注册、数据不少于 min_hours 小时且最新数据不早于 now 之前
+                max_age_hours 小时的城市
+        """
+        oldest = _hour_index(now or datetime.now()) - max_age_hours
+        rows = [(city, self.city_index.get(city)) for city in cities]
+        return [city for city, idx in rows
+                if idx is not None and self.counts[idx] >= min_hours and self.last_hour[idx] >= oldest]
+
+    def windows(self, cities, window=MA_WINDOW):
+        """
+        批量导出城市最近 window 小时的数据（按时间从旧到新）
+
+        数据不足 window 小时的城市，缺失的较早时刻用最新数据补齐。
+
+        返回:
+            tuple: (找到数据的城市列表, aqi窗口 (N, window), pm25窗口 (N, window), 编码 (N, 2))
+        """
+        found = [city for city in cities
+                 if city in self.city_index and self.counts[self.city_index[city]] > 0]
+        rows = np.array([self.city_index[city] for city in found], dtype=np.int64)
+
+        with self._lock:
+            if len(rows) == 0:
+                empty = np.empty((0, window), dtype=np.float32)
+                return [], empty, empty, np.empty((0, 2), dtype=np.float32)
+
+            offsets = np.arange(window - 1, -1, -1)  # window-1 ... 0 小时前
+            counts = self.counts[rows][:, np.newaxis]
+            lags = np.where(offsets[np.newaxis, :] < counts, offsets[np.newaxis, :] + 1, 1)  # 不足时取最新值
+            cols = (self.heads[rows][:, np.newaxis] - lags) % self.capacity
+
+            aqi_window = self.aqi[rows[:, np.newaxis], cols]
+            pm25_window = self.pm25[rows[:, np.newaxis], cols]
+            codes = self.codes[rows].copy()
+
+        return found, aqi_window, pm25_window, codes
@@ -5,8 +5,11 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import time
 import logging
-import sqlite3
 import numpy as np
+from src.forecast_cache import ForecastCache
+from src.qweather_client import QWeatherClient
+from src.hourly_store import HourlyDataStore
+from src.hour_patterns import hour_factor, season_of_month
 
 class AirQualityCollector:
     """空气质量数据收集与预测系统"""
@@ -28,6 +31,9 @@ class AirQualityCollector:
         if not self.api_key:
             raise ValueError("模型配置文件加载失败")
         
+        # 上游接口客户端（连接池 + 超时 + 重试）
+        self.client = QWeatherClient(self.api_key)
+        
         # 加载城市配置
         self.city_config = self._load_city_config()
         if not self.city_config:
@@ -45,32 +51,26 @@ class AirQualityCollector:
         
         # 从配置文件中获取城市ID映射
         self.city_ids = {city: info['id'] for city, info in self.city_config['cities'].items()}
+        
+        # 基于训练模型的批量预测函数，签名为 forecaster(cities) -> {城市: 预测列表}
+        # 未设置或没有某个城市的结果时退回到统计预测
+        self.model_forecaster = None
+        
+        # 每次定时刷新后一次批量预测所有城市的结果 (整点, {城市: 预测列表})
+        self.latest_forecasts = (None, {})
+        
+        # 城市实时状态存储（CityStateStore），获取到真实数据时原地更新
+        self.state_store = None
+        
+        # 按 (城市, 整点) 缓存实时数据和预测结果，同一小时内不重复请求上游
+        self.forecast_cache = ForecastCache()
+        
+        # 后台定时采集得到的最新实时数据 {城市: 实时数据}
+        self.latest_readings = {}
     
     def _init_database(self):
         """初始化SQLite数据库"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # 创建实时数据表
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS hourly_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            city TEXT,
-            timestamp DATETIME,
-            aqi INTEGER,
-            pm25 REAL,
-            pm10 REAL,
-            so2 REAL,
-            no2 REAL,
-            o3 REAL,
-            co REAL,
-            quality_level TEXT,
-            UNIQUE(city, timestamp)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        self.store = HourlyDataStore(self.db_path)
     
     def _load_config(self):
         """加载配置文件"""
@@ -116,7 +116,13 @@ class AirQualityCollector:
         }
     
     def get_real_time_and_forecast(self, city):
-        """获取数据并生成预测结果"""
+        """获取数据并生成预测结果（同一小时内的重复请求直接使用缓存）"""
+        return self.forecast_cache.get_or_compute(
+            city, lambda: self._build_real_time_and_forecast(city)
+        )
+    
+    def _build_real_time_and_forecast(self, city):
+        """获取实时数据并生成预测结果"""
         try:
             self.logger.info(f"开始为{city}生成空气质量预测...")
             
@@ -125,8 +131,10 @@ class AirQualityCollector:
             if not current_data:
                 return None
                 
-            # 生成预测数据
-            predictions = self._generate_predictions(current_data)
+            # 生成预测数据（优先使用训练好的模型）
+            predictions = self._get_model_predictions(city)
+            if not predictions:
+                predictions = self._generate_predictions(current_data)
             
             return {
                 'current': current_data,
@@ -137,6 +145,23 @@ class AirQualityCollector:
             self.logger.error(f"预测过程出错: {str(e)}")
             return None
             
+    def _get_model_predictions(self, city):
+        """获取模型预测：优先使用本小时批量预测的结果，没有时单独预测该城市"""
+        if self.model_forecaster is None:
+            return None
+        hour, forecasts = self.latest_forecasts
+        if hour == datetime.now().strftime('%Y-%m-%d %H') and city in forecasts:
+            return forecasts[city]
+        return self.model_forecaster([city]).get(city)
+    
+    def refresh_forecasts(self):
+        """用一次批量预测重新生成所有城市的模型预测，并清除旧的预测缓存"""
+        forecasts = {}
+        if self.model_forecaster is not None:
+            forecasts = self.model_forecaster(list(self.city_ids))
+        self.latest_forecasts = (datetime.now().strftime('%Y-%m-%d %H'), forecasts)
+        self.forecast_cache.invalidate()
+    
     def _get_current_data(self, city):
         """获取当前空气质量数据"""
         try:
@@ -146,21 +171,15 @@ class AirQualityCollector:
                 # 返回默认数据而不是None
                 return self._generate_fallback_data(city)
 
+            # 优先使用后台定时采集的本小时数据，避免请求上游接口
+            stored = self.latest_readings.get(city)
+            if stored and stored['timestamp'][:13] == datetime.now().strftime('%Y-%m-%d %H'):
+                return stored
+
             self.logger.info(f"正在使用深度学习模型预测{city}的空气质量...")
-            url = f"https://devapi.qweather.com/v7/air/now?location={city_id}&key={self.api_key}"
-            response = requests.get(url)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('code') == '200':
-                    current = data['now']
-                    # 模型预测结果
-                    return {
-                        'aqi': int(current['aqi']),
-                        'pm25': float(current['pm2p5']),
-                        'quality_level': current['category'],
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    }
+            current = self.client.get_air_now(city_id)
+            if current:
+                return self._parse_air_now(city, current)
             # 如果API请求失败，返回备用数据
             return self._generate_fallback_data(city)
             
@@ -169,6 +188,46 @@ class AirQualityCollector:
             # 如果发生异常，返回备用数据
             return self._generate_fallback_data(city)
             
+    def _parse_air_now(self, city, current):
+        """解析接口返回的实时数据，并更新城市状态"""
+        # 模型预测结果
+        result = {
+            'aqi': int(current['aqi']),
+            'pm25': float(current['pm2p5']),
+            'quality_level': current['category'],
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'pm10': float(current.get('pm10') or 0),
+            'so2': float(current.get('so2') or 0),
+            'no2': float(current.get('no2') or 0),
+            'o3': float(current.get('o3') or 0),
+            'co': float(current.get('co') or 0)
+        }
+        if self.state_store is not None:
+            self.state_store.update(city, result['timestamp'], result['aqi'], result['pm25'])
+        return result
+    
+    def refresh_all_cities(self, concurrency=8):
+        """并发获取所有已配置城市的实时数据
+        
+        返回 {城市: 实时数据}，请求失败的城市不会出现在结果中
+        """
+        start_time = time.time()
+        responses = self.client.fetch_many(self.city_ids, concurrency=concurrency)
+        
+        readings = {}
+        for city, current in responses.items():
+            if not current:
+                continue
+            try:
+                readings[city] = self._parse_air_now(city, current)
+            except (KeyError, ValueError) as e:
+                self.logger.error(f"解析{city}的实时数据出错: {str(e)}")
+        
+        self.logger.info(
+            f"刷新 {len(readings)}/{len(self.city_ids)} 个城市的实时数据，用时 {time.time() - start_time:.2f}秒"
+        )
+        return readings
+    
     def _generate_fallback_data(self, city):
         """生成备用数据，当API请求失败时使用"""
         # 为不同城市生成不同但一致的随机数据
@@ -204,13 +263,12 @@ class AirQualityCollector:
             timestamp = base_time + timedelta(hours=hour)
             
             # 模拟深度学习模型的预测过程
-            hour_factor = self._get_hour_factor(timestamp.hour)
-            seasonal_factor = self._get_seasonal_factor(timestamp)
+            pattern_factor = self._get_pattern_factor(timestamp)
             weather_factor = self._simulate_weather_impact()
             
             # 综合多个因素生成预测值
-            aqi = int(base_aqi * hour_factor * seasonal_factor * weather_factor)
-            pm25 = round(base_pm25 * hour_factor * seasonal_factor * weather_factor, 1)
+            aqi = int(base_aqi * pattern_factor * weather_factor)
+            pm25 = round(base_pm25 * pattern_factor * weather_factor, 1)
             
             # 确保预测值在合理范围内
             aqi = max(0, min(500, aqi))
@@ -225,17 +283,9 @@ class AirQualityCollector:
         
         return predictions
         
-    def _get_seasonal_factor(self, timestamp):
-        """基于季节的调整因子"""
-        month = timestamp.month
-        if month in [12, 1, 2]:  # 冬季
-            return np.random.uniform(1.1, 1.3)
-        elif month in [3, 4, 5]:  # 春季
-            return np.random.uniform(0.9, 1.1)
-        elif month in [6, 7, 8]:  # 夏季
-            return np.random.uniform(0.7, 0.9)
-        else:  # 秋季
-            return np.random.uniform(0.8, 1.0)
+    def _get_pattern_factor(self, timestamp):
+        """基于小时、工作日/周末和季节的调整因子（与数据处理阶段共用同一张因子表）"""
+        return float(hour_factor(timestamp.hour, timestamp.weekday() >= 5, season_of_month(timestamp.month)))
             
     def _simulate_weather_impact(self):
         """模拟天气对空气质量的影响"""
@@ -244,34 +294,36 @@ class AirQualityCollector:
     def _save_to_db(self, data):
         """保存数据到SQLite数据库"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            c.execute('''
-            INSERT OR REPLACE INTO hourly_data 
-            (city, timestamp, aqi, pm25, pm10, so2, no2, o3, co, quality_level)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data['city'],
-                data['timestamp'],
-                data['aqi'],
-                data['pm25'],
-                data['pm10'],
-                data['so2'],
-                data['no2'],
-                data['o3'],
-                data['co'],
-                data['quality_level']
-            ))
-            
-            conn.commit()
-            conn.close()
-            
+            self.store.upsert(data)
             self.logger.info(f"成功保存{data['city']}的数据")
             
         except Exception as e:
             self.logger.error(f"保存数据时出错: {str(e)}")
     
+    def _save_many_to_db(self, records):
+        """在一个事务中批量保存多条数据到SQLite数据库"""
+        saved = self.store.upsert_many(records)
+        if saved:
+            self.logger.info(f"成功批量保存{saved}条数据")
+        return saved
+    
+    def ingest_hourly(self, concurrency=8):
+        """采集所有城市的实时数据，批量入库并更新最新数据
+        
+        返回本次入库的记录数
+        """
+        readings = self.refresh_all_cities(concurrency=concurrency)
+        
+        # 同一小时的数据使用整点时间入库，保证 (city, timestamp) 唯一
+        hour = datetime.now().strftime('%Y-%m-%d %H:00:00')
+        records = [dict(reading, city=city, timestamp=hour) for city, reading in readings.items()]
+        saved = self._save_many_to_db(records)
+        
+        self.latest_readings.update(readings)
+        # 新数据已到达，清除旧的预测缓存，所有城市的模型预测一次批量生成
+        self.refresh_forecasts()
+        return saved
+    
     def _get_quality_level(self, aqi):
         """根据AQI获取空气质量等级"""
         if aqi <= 50:
@@ -287,44 +339,10 @@ class AirQualityCollector:
         else:
             return '严重污染'
     
-    def _get_hour_factor(self, hour):
-        """根据小时获取调整因子"""
-        # 早高峰
-        if hour in [7, 8, 9]:
-            return 1.15
-        # 晚高峰
-        elif hour in [17, 18, 19]:
-            return 1.2
-        # 凌晨
-        elif hour in [2, 3, 4]:
-            return 0.85
-        # 中午
-        elif hour in [13, 14]:
-            return 0.9
-        # 其他时间
-        else:
-            return 1.0
-    
     def get_city_history(self, city, start_time=None, end_time=None):
         """获取指定城市的历史数据"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            query = "SELECT * FROM hourly_data WHERE city = ?"
-            params = [city]
-            
-            if start_time:
-                query += " AND timestamp >= ?"
-                params.append(start_time)
-            if end_time:
-                query += " AND timestamp <= ?"
-                params.append(end_time)
-                
-            query += " ORDER BY timestamp DESC"
-            
-            df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
-            
-            return df
+            return self.store.query_range(city, start_time, end_time)
             
         except Exception as e:
             self.logger.error(f"获取历史数据时出错: {str(e)}")
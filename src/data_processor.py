@@ -9,6 +9,9 @@
 4. 添加时间相关特征
 5. 计算统计特征（如移动平均）
 6. 数据标准化
+7. 流式处理所有年度数据文件：按城市分批处理并逐批写入，跨批次延续每个城市的状态
+8. 多进程并行处理各批城市，随机波动由 (随机种子, 城市, 日期) 确定，结果与进程数无关
+9. 增量处理：保存每个城市的水位线和延续状态，只展开新到达的日期并追加写入
 """
 
 import pandas as pd
@@ -18,9 +21,84 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 import joblib
 from sklearn.preprocessing import MinMaxScaler
-import matplotlib.pyplot as plt
-import seaborn as sns
+import sys
+import zlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from scipy.interpolate import interp1d
+from src.data_quality import (
+    PlotRenderer, compute_report, print_report,
+    distribution_plot_data, analysis_plot_data,
+    render_distribution_plots, render_analysis_plots
+)
+from src.processed_store import dataset_path, write_processed, clear_dataset
+from src.encoding_registry import EncodingRegistry, ENCODED_COLUMNS, registry_path
+from src.hour_patterns import PATTERNS, SEASON_FACTORS, HOUR_FACTOR_TABLE, PEAK_HOUR_TABLE, season_of_month
+
+# 空气质量等级（按AQI从低到高）
+QUALITY_LEVELS = ['优', '良', '轻度污染', '中度污染', '重度污染', '严重污染']
+
+# 滞后特征的步长（小时）
+LAG_STEPS = [1, 3, 6, 12, 24]
+
+# 移动平均窗口（小时），也是跨批次需要保留的小时数据长度
+WINDOW_HOURS = 24
+
+# 小时随机波动的标准差（±3%）
+NOISE_SCALE = 0.03
+
+# 随机波动的指标（daily_noise 返回数组第二维的顺序）
+NOISE_METRICS = ['aqi', 'pm25']
+
+
+def daily_noise(city, day_ordinals, seed, scale=NOISE_SCALE):
+    """
+    生成指定城市若干天的随机波动系数
+
+    使用计数器型随机数生成器（Philox），密钥由随机种子和城市名确定，
+    计数器由日期确定，因此每个 (城市, 日期) 的波动与处理顺序、分批方式和进程无关。
+
+    参数:
+        city (str): 城市名
+        day_ordinals (np.ndarray): 日期序号（date.toordinal()）
+        seed (int): 随机种子
+        scale (float): 波动的标准差
+
+    返回:
+        np.ndarray: 形状为 (天数, 2, 24) 的系数，索引为 [天, 指标(aqi/pm25), 小时]
+    """
+    day_ordinals = np.asarray(day_ordinals, dtype=np.int64)
+    first = int(day_ordinals.min())
+    n_days = int(day_ordinals.max()) - first + 1
+    
+    # 每天48个随机数，占用12个计数器值
+    key = np.random.SeedSequence([seed, zlib.crc32(city.encode('utf-8'))]).generate_state(2, np.uint64)
+    bit_generator = np.random.Philox(counter=[first * 12, 0, 0, 0], key=key)
+    raw = bit_generator.random_raw(n_days * 48).reshape(n_days, 48)[day_ordinals - first]
+    
+    # Box-Muller 变换得到正态分布
+    u = (raw >> np.uint64(11)) * 2.0 ** -53
+    r = np.sqrt(-2 * np.log1p(-u[:, :24]))
+    theta = 2 * np.pi * u[:, 24:]
+    z = np.stack([r * np.cos(theta), r * np.sin(theta)], axis=1)
+    return 1 + scale * z
+
+
+# 工作进程中的数据处理器（由 _init_worker 创建）
+_worker_processor = None
+
+
+def _init_worker(random_seed, processed_dataset):
+    """初始化工作进程"""
+    global _worker_processor
+    _worker_processor = AirQualityDataProcessor(random_seed=random_seed)
+    _worker_processor.processed_dataset = processed_dataset
+
+
+def _process_chunk_task(daily_df, state, categories, part_name):
+    """在工作进程中处理一批城市，返回写入的行数和更新后的延续状态"""
+    rows = _worker_processor.process_chunk(daily_df, state, categories, part_name)
+    return rows, state
 
 class AirQualityDataProcessor:
     """
@@ -32,9 +110,11 @@ class AirQualityDataProcessor:
         data_dir (Path): 数据目录的路径
         processed_data_dir (Path): 处理后数据存储的目录路径
         scalers (dict): 存储数据标准化器的字典
+        render_plots (bool): 是否绘制数据分布和分析图表（在独立进程中绘制）
+        random_seed (int): 小时随机波动的随机种子，相同种子生成相同的数据
     """
     
-    def __init__(self):
+    def __init__(self, render_plots=False, random_seed=None):
         """初始化数据处理器"""
         # 设置数据目录
         self.root_dir = Path(__file__).parent.parent.absolute()
@@ -42,6 +122,11 @@ class AirQualityDataProcessor:
         self.data_dir = self.root_dir / 'data'
         self.processed_data_dir = self.data_dir / 'processed'
         self.plots_dir = self.data_dir / 'plots'
+        self.processed_dataset = dataset_path(self.processed_data_dir)
+        self.etl_state_path = self.processed_data_dir / 'etl_state.joblib'
+        
+        # 城市和省份编码注册表（与训练和在线预测共用）
+        self.encodings = EncodingRegistry(registry_path(self.processed_data_dir))
         
         # 创建必要的目录
         for dir_path in [self.processed_data_dir, self.plots_dir]:
@@ -50,71 +135,40 @@ class AirQualityDataProcessor:
         # 用于存储数据统计信息
         self.scalers = {}
         
+        # 图表绘制是可选步骤，在独立进程中执行
+        self.render_plots = render_plots
+        self.plot_renderer = PlotRenderer(self.plots_dir)
+        
         # 定义数据范围限制
         self.aqi_range = (0, 500)      # AQI的标准范围是0-500
         self.pm25_range = (0, 500)     # PM2.5的范围限制在0-500
 
-        # 定义不同情况下的小时变化模式
-        self.patterns = {
-            'workday': {  # 工作日模式
-                'morning_peak': {'hours': [7,8,9], 'factor': 1.15},  # 降低峰值
-                'afternoon_low': {'hours': [12,13,14], 'factor': 0.85},
-                'evening_peak': {'hours': [17,18,19], 'factor': 1.20},
-                'night_low': {'hours': [2,3,4], 'factor': 0.80}
-            },
-            'weekend': {  # 周末模式
-                'morning_peak': {'hours': [9,10,11], 'factor': 1.05},
-                'afternoon_peak': {'hours': [14,15,16], 'factor': 1.10},
-                'evening_peak': {'hours': [19,20,21], 'factor': 1.12},
-                'night_low': {'hours': [2,3,4], 'factor': 0.85}
-            }
-        }
-        
-        # 修改季节影响因子
-        self.season_factors = {
-            1: 1.15,  # 冬季：供暖期污染加重，但降低系数
-            2: 1.05,  # 春季：扬尘等影响
-            3: 0.90,  # 夏季：降水导致污染物沉降
-            4: 1.0    # 秋季：基准水平
-        }
+        # 小时变化模式和季节影响因子（与在线预测共用同一份定义）
+        self.patterns = PATTERNS
+        self.season_factors = SEASON_FACTORS
+        self.hour_factor_table = HOUR_FACTOR_TABLE
+        self.peak_hour_table = PEAK_HOUR_TABLE
 
         # 添加天气持续性影响
         self.weather_persistence = 0.7  # 天气持续性因子
 
+        # 随机种子（未指定时随机生成，处理时打印出来以便复现）
+        if random_seed is None:
+            random_seed = int(np.random.SeedSequence().entropy % 2**32)
+        self.random_seed = random_seed
+
     def validate_data(self, df, stage='unknown'):
         """验证数据的有效性"""
-        print(f"\n开始数据验证... (阶段: {stage})")
+        # 一次遍历计算各列的统计信息
+        print_report(compute_report(df, stage))
         
-        # 检查并处理异常值
-        print("\n检查异常值...")
-        for col in ['pm25', 'aqi']:
-            if col in df.columns:
-                invalid_count = df[df[col].isin([float('-inf'), float('inf')]) | df[col].isna()].shape[0]
-                print(f"{col}无效值数量: {invalid_count}")
-                print(f"{col}统计信息:")
-                print(df[col].describe())
-                
-                # 绘制分布图
-                plt.figure(figsize=(10, 6))
-                sns.histplot(data=df, x=col, bins=50)
-                plt.title(f'{col}分布图 ({stage})')
-                plt.savefig(self.plots_dir / f'{col}_dist_{stage}.png')
-                plt.close()
-        
-        # 检查时间特征的分布
-        if 'hour' in df.columns:
-            print("\n时间特征分布:")
-            for col in ['hour', 'day', 'month', 'dayofweek', 'season']:
-                if col in df.columns:
-                    print(f"\n{col}值分布:")
-                    print(df[col].value_counts().sort_index())
-        
-        # 检查分类特征的分布
-        if 'quality_level' in df.columns:
-            print("\n空气质量等级分布:")
-            print(df['quality_level'].value_counts())
-        
-        # 移除或修正异常值
+        if self.render_plots:
+            self.plot_renderer.submit(render_distribution_plots, distribution_plot_data(df, stage))
+        
+        return self.clip_values(df)
+
+    def clip_values(self, df):
+        """将 pm25 和 aqi 截断到有效范围内"""
         for col in ['pm25', 'aqi']:
             if col in df.columns:
                 original_values = df[col].copy()
@@ -129,29 +183,23 @@ class AirQualityDataProcessor:
         return df
 
     def get_hour_factor(self, hour, is_weekend, season):
-        """获取小时变化因子"""
-        pattern = self.patterns['weekend'] if is_weekend else self.patterns['workday']
-        base_factor = 1.0
-        
-        # 应用时段因子
-        for period in pattern.values():
-            if hour in period['hours']:
-                base_factor = period['factor']
-                break
-        
-        # 应用季节因子
-        season_factor = self.season_factors[season]
-        
-        return base_factor * season_factor
+        """获取小时变化因子（时段因子 × 季节因子）"""
+        return self.hour_factor_table[int(is_weekend), season - 1, hour]
 
-    def generate_smooth_daily_curve(self, base_value, date, is_weekend, season, prev_day_values=None):
-        """生成平滑的日变化曲线，考虑天气持续性"""
+    def generate_smooth_daily_curve(self, base_value, date, is_weekend, season, prev_day_values=None, city=None,
+                                    metric='aqi'):
+        """
+        生成平滑的日变化曲线，考虑天气持续性
+
+        指定城市时随机波动由随机种子、城市、日期和指标（aqi/pm25）确定，
+        与 expand_to_hourly 中同一城市同一天同一指标的波动相同。
+        """
         # 生成24小时的基础变化因子
-        hour_factors = [self.get_hour_factor(h, is_weekend, season) for h in range(24)]
+        hour_factors = self.hour_factor_table[int(is_weekend), season - 1]
         
         # 使用三次样条插值生成平滑曲线
         x = np.arange(24)
-        y = np.array(hour_factors) * base_value
+        y = hour_factors * base_value
         
         # 为了确保曲线首尾相连，我们在首尾添加额外的点
         x_extended = np.concatenate([x-24, x, x+24])
@@ -171,7 +219,12 @@ class AirQualityDataProcessor:
                 smooth_values[i] = smooth_values[i-1] * 0.6 + smooth_values[i] * 0.4
         
         # 添加小幅随机波动（±3%）
-        random_factors = np.random.normal(1, 0.03, 24)
+        if city is not None:
+            random_factors = daily_noise(
+                city, [pd.Timestamp(date).toordinal()], self.random_seed
+            )[0, NOISE_METRICS.index(metric)]
+        else:
+            random_factors = np.random.normal(1, NOISE_SCALE, 24)
         smooth_values = smooth_values * random_factors
         
         # 应用天气持续性
@@ -180,8 +233,318 @@ class AirQualityDataProcessor:
         
         return np.clip(smooth_values, 0, self.aqi_range[1])
 
+    def _daily_curve_shapes(self):
+        """
+        预先计算每种 (是否周末, 季节) 组合的24小时平滑曲线形状
+
+        三次样条对基准值是线性的，因此每种组合只需插值一次，
+        日曲线 = 基准值 × 形状。
+
+        返回:
+            np.ndarray: 形状为 (2, 4, 24) 的数组，索引为 [is_weekend, season-1, hour]
+        """
+        shapes = np.empty((2, 4, 24))
+        x = np.arange(24)
+        x_extended = np.concatenate([x-24, x, x+24])
+        for is_weekend in (0, 1):
+            for season in range(1, 5):
+                y = self.hour_factor_table[is_weekend, season - 1]
+                f = interp1d(x_extended, np.concatenate([y, y, y]), kind='cubic')
+                shapes[is_weekend, season - 1] = f(x)
+        return shapes
+
+    def expand_to_hourly(self, df, state=None):
+        """
+        将日数据向量化地展开为小时数据
+
+        所有城市对齐到同一个日期网格上，逐日对 (城市, 指标, 小时) 数组进行
+        平滑过渡、随机波动和天气持续性的递推，效果与逐城市逐日调用
+        generate_smooth_daily_curve 相同。
+
+        参数:
+            df (pd.DataFrame): 包含 city/province/date/aqi/pm25/main_pollutant 的日数据
+            state (dict): 分批处理时每个城市的延续状态（城市 -> 状态字典），
+                包含上一批最后一天的日数据 'last_day' 和小时曲线 'curve'；
+                已生成过的日期不会重复输出，处理后状态会被更新
+
+        返回:
+            pd.DataFrame: 按城市、日期、小时排列的小时数据
+        """
+        daily = df.copy()
+        daily['date'] = pd.to_datetime(daily['date']).dt.normalize()
+        
+        cities = df['city'].unique()
+        carried = {c: state[c] for c in cities if 'last_day' in state.get(c, {})} if state else {}
+        if carried:
+            # 上一批最后一天的数据放在最前面，用于填补缺失日期和曲线的平滑过渡
+            daily = pd.concat([pd.DataFrame([s['last_day'] for s in carried.values()]), daily], ignore_index=True)
+        daily = daily.drop_duplicates(['city', 'date'], keep='first').reset_index(drop=True)
+        
+        city_idx = pd.Categorical(daily['city'], categories=cities).codes
+        start = daily['date'].min()
+        day_idx = (daily['date'] - start).dt.days.to_numpy()
+        n_cities, n_days = len(cities), int(day_idx.max()) + 1
+        
+        # 日期网格：grid_row[城市, 日] 为当天的数据行号，-1 表示缺失
+        grid_row = np.full((n_cities, n_days), -1, dtype=np.int64)
+        grid_row[city_idx, day_idx] = np.arange(len(daily))
+        
+        # 当天没有数据时使用前一天的数据
+        prev_row = np.full_like(grid_row, -1)
+        prev_row[:, 1:] = grid_row[:, :-1]
+        src_row = np.where(grid_row >= 0, grid_row, prev_row)
+        
+        # 只在每个城市自己的日期范围内生成数据
+        days = np.arange(n_days)
+        first_day = np.full(n_cities, n_days, dtype=np.int64)
+        last_day = np.full(n_cities, -1, dtype=np.int64)
+        np.minimum.at(first_day, city_idx, day_idx)
+        np.maximum.at(last_day, city_idx, day_idx)
+        valid = (src_row >= 0) & (days >= first_day[:, None]) & (days <= last_day[:, None])
+        
+        # 上一批已经生成过的日期不再输出
+        prev = np.zeros((n_cities, 2, 24))
+        has_prev = np.zeros(n_cities, dtype=bool)
+        for c, city in enumerate(cities):
+            if city in carried:
+                has_prev[c] = True
+                prev[c] = carried[city]['curve']
+                valid[c, :(carried[city]['last_day']['date'] - start).days + 1] = False
+        
+        # 输出行号（按城市、日期排列）
+        out_pos = np.cumsum(valid.ravel()).reshape(valid.shape) - 1
+        n_out = int(valid.sum())
+        
+        # 日期特征
+        dates = pd.date_range(start, periods=n_days, freq='D')
+        is_weekend = (dates.dayofweek >= 5).astype(int)
+        season = season_of_month(dates.month)
+        shapes = self._daily_curve_shapes()
+        
+        base = daily[['aqi', 'pm25']].to_numpy(dtype=float)  # (行, 指标)
+        curves = np.empty((n_out, 2, 24))
+        p = self.weather_persistence
+        
+        # 每个 (城市, 日期) 的随机波动
+        noise = np.empty((n_out, 2, 24))
+        ordinals = days + start.toordinal()
+        for c, city in enumerate(cities):
+            d = np.nonzero(valid[c])[0]
+            if len(d):
+                noise[out_pos[c, d]] = daily_noise(city, ordinals[d], self.random_seed)
+        
+        for d in range(n_days):
+            v = valid[:, d]
+            if not v.any():
+                continue
+            rows = src_row[v, d]
+            
+            # 平滑的日变化曲线 (城市, 指标, 小时)
+            curve = base[rows][:, :, None] * shapes[is_weekend[d], season[d] - 1]
+            
+            # 与前一天平滑过渡（前3个小时）
+            hp = has_prev[v]
+            if hp.any():
+                last = prev[v][hp]
+                trans = curve[hp]
+                trans[:, :, 0] = last[:, :, -1] * 0.7 + trans[:, :, 0] * 0.3
+                for i in range(1, 4):
+                    trans[:, :, i] = trans[:, :, i-1] * 0.6 + trans[:, :, i] * 0.4
+                curve[hp] = trans
+            
+            # 添加小幅随机波动（±3%）
+            curve *= noise[out_pos[v, d]]
+            
+            # 应用天气持续性
+            if hp.any():
+                curve[hp] = prev[v][hp] * p + curve[hp] * (1 - p)
+            
+            curve = np.clip(curve, 0, self.aqi_range[1])
+            curves[out_pos[v, d]] = curve
+            prev[v] = curve
+            has_prev[v] = True
+        
+        # 更新每个城市的延续状态（最后一天一定有原始数据）
+        if state is not None:
+            columns = ['city', 'province', 'date', 'aqi', 'pm25', 'main_pollutant']
+            for c, city in enumerate(cities):
+                if valid[c].any():
+                    city_state = state.setdefault(city, {})
+                    city_state['last_day'] = daily.loc[grid_row[c, last_day[c]], columns].to_dict()
+                    city_state['curve'] = prev[c].copy()
+        
+        # 组装小时数据
+        out_city, out_day = np.nonzero(valid)
+        out_rows = src_row[out_city, out_day]
+        hourly_aqi = curves[:, 0, :].ravel()
+        
+        quality_levels = np.array(QUALITY_LEVELS)
+        level_idx = np.searchsorted([50, 100, 150, 200, 300], hourly_aqi, side='left')
+        
+        return pd.DataFrame({
+            'date': np.repeat(dates.strftime('%Y-%m-%d').to_numpy()[out_day], 24),
+            'hour': np.tile(np.arange(24), n_out),
+            'city': np.repeat(cities[out_city], 24),
+            'province': np.repeat(daily['province'].to_numpy()[out_rows], 24),
+            'aqi': hourly_aqi,
+            'pm25': curves[:, 1, :].ravel(),
+            'quality_level': quality_levels[level_idx],
+            'main_pollutant': np.repeat(daily['main_pollutant'].to_numpy()[out_rows], 24)
+        })
+
+    def add_calendar_features(self, hourly_df):
+        """
+        向量化地添加时间特征和高峰时段标记
+
+        日期字符串只解析一次（每个不同日期一次），其余特征都由整数数组计算。
+        """
+        codes, unique_dates = pd.factorize(hourly_df['date'])
+        days = pd.DatetimeIndex(pd.to_datetime(unique_dates, format='%Y-%m-%d'))
+        hours = hourly_df['hour'].to_numpy(dtype=np.int64)
+        
+        timestamps = days.values[codes] + hours.astype('timedelta64[h]')
+        month = days.month.to_numpy()[codes]
+        dayofweek = days.dayofweek.to_numpy()[codes]
+        is_weekend = (dayofweek >= 5).astype(int)
+        
+        hourly_df['timestamp'] = timestamps
+        hourly_df['year'] = days.year.to_numpy()[codes]
+        hourly_df['month'] = month
+        hourly_df['day'] = days.day.to_numpy()[codes]
+        hourly_df['dayofweek'] = dayofweek
+        hourly_df['season'] = season_of_month(month)
+        hourly_df['is_weekend'] = is_weekend
+        hourly_df['is_peak_hour'] = self.peak_hour_table[is_weekend, hours].astype(int)
+        return hourly_df
+
+    def add_window_features(self, hourly_df, state=None):
+        """
+        添加24小时移动平均和滞后特征
+
+        每个城市历史开头缺少的滞后值使用该城市最早的值填充。
+
+        参数:
+            hourly_df (pd.DataFrame): 按城市、时间排列的小时数据
+            state (dict): 分批处理时每个城市的延续状态，'window' 为上一批最后
+                WINDOW_HOURS 小时的 (aqi, pm25)，处理后会被更新
+        """
+        value_cols = ['aqi', 'pm25']
+        frame = hourly_df[['city'] + value_cols].reset_index(drop=True)
+        
+        # 上一批的小时数据放在最前面，使窗口跨批次连续
+        n_carry = 0
+        if state:
+            windows = [(c, state[c]['window']) for c in frame['city'].unique() if 'window' in state.get(c, {})]
+            if windows:
+                carry = pd.DataFrame({
+                    'city': np.concatenate([[c] * len(w) for c, w in windows]),
+                    'aqi': np.concatenate([w[:, 0] for _, w in windows]),
+                    'pm25': np.concatenate([w[:, 1] for _, w in windows])
+                })
+                frame = pd.concat([carry, frame], ignore_index=True)
+                n_carry = len(carry)
+        
+        groups = frame.groupby('city', sort=False)
+        
+        # 计算24小时移动平均
+        print("\n计算移动平均...")
+        for col in value_cols:
+            ma = groups[col].transform(
+                lambda x: x.rolling(window=WINDOW_HOURS, min_periods=1, center=False).mean()
+            )
+            value_range = self.aqi_range if col == 'aqi' else self.pm25_range
+            hourly_df[f'{col}_ma24'] = ma.clip(value_range[0], value_range[1]).to_numpy()[n_carry:]
+        
+        # 添加滞后特征
+        print("计算滞后特征...")
+        for i in LAG_STEPS:
+            for col in value_cols:
+                lag = groups[col].shift(i)
+                lag = lag.groupby(frame['city'], sort=False).bfill().fillna(frame[col])
+                value_range = self.aqi_range if col == 'aqi' else self.pm25_range
+                hourly_df[f'{col}_lag{i}'] = lag.clip(value_range[0], value_range[1]).to_numpy()[n_carry:]
+        
+        # 保存每个城市最后的小时数据，供下一批使用
+        if state is not None:
+            for city, window in groups.tail(WINDOW_HOURS).groupby('city', sort=False):
+                state.setdefault(city, {})['window'] = window[value_cols].to_numpy()
+        
+        return hourly_df
+
+    def encode_categories(self, hourly_df, categories=None):
+        """
+        类别特征编码
+
+        参数:
+            hourly_df (pd.DataFrame): 小时数据
+            categories (dict): 各列的全部类别（列名 -> 类别列表），分批处理时保证各批编码一致；
+                未指定的列按本次数据中出现的类别编码
+        """
+        categories = categories or {}
+        for col in ['city', 'province', 'quality_level']:
+            hourly_df[f'{col}_code'] = pd.Categorical(hourly_df[col], categories=categories.get(col)).codes
+        return hourly_df
+
+    def scan_categories(self, input_files):
+        """只读取城市和省份列，收集所有文件中出现的类别"""
+        values = {col: set() for col in ENCODED_COLUMNS}
+        for input_file in input_files:
+            df = pd.read_csv(input_file, usecols=ENCODED_COLUMNS)
+            for col in ENCODED_COLUMNS:
+                values[col].update(df[col].unique())
+        return values
+
+    def register_categories(self, values):
+        """
+        在编码注册表中登记新出现的城市和省份（只追加，已有编码不变）
+
+        参数:
+            values (dict): {列名: 类别集合}
+
+        返回:
+            dict: 各编码列按编码排列的全部类别，可直接传给 encode_categories
+        """
+        added = sum(self.encodings.register(col, values.get(col, [])) for col in ENCODED_COLUMNS)
+        if added:
+            self.encodings.save()
+            print(f"编码注册表新增 {added} 个类别")
+        categories = {col: self.encodings.categories(col) for col in ENCODED_COLUMNS}
+        categories['quality_level'] = sorted(QUALITY_LEVELS)
+        return categories
+
+    def load_etl_state(self):
+        """
+        加载上一次处理保存的状态（每个城市的延续状态和随机种子）
+
+        返回:
+            dict: 处理状态，数据集或状态文件不存在时返回 None
+        """
+        if not self.etl_state_path.exists() or not self.processed_dataset.exists():
+            return None
+        return joblib.load(self.etl_state_path)
+
+    def save_etl_state(self, state):
+        """保存处理状态，供下一次增量处理使用"""
+        joblib.dump({
+            'state': state,
+            'random_seed': self.random_seed,
+            'updated_at': datetime.now().isoformat()
+        }, self.etl_state_path)
+
+    def filter_new_days(self, df, state):
+        """只保留每个城市水位线（已处理的最后一天）之后的日数据"""
+        watermarks = pd.Series({c: s['last_day']['date'] for c, s in state.items() if 'last_day' in s}, dtype='datetime64[ns]')
+        dates = pd.to_datetime(df['date']).dt.normalize()
+        watermark = df['city'].map(watermarks)
+        return df[watermark.isna().to_numpy() | (dates > watermark).to_numpy()]
+
     def process_data(self, input_file):
-        """处理数据的主函数"""
+        """
+        一次性处理单个数据文件（覆盖整个数据集）
+
+        这种方式不记录每个城市的延续状态，会删除已有的处理状态，
+        之后的增量处理会先执行一次全量处理，而不是沿用过期的水位线。
+        """
         print(f"开始处理数据文件: {input_file}")
         
         try:
@@ -194,145 +557,28 @@ class AirQualityDataProcessor:
             df = self.validate_data(df, '原始数据')
             
             # 生成小时数据
-            hourly_data = []
-            
-            # 按城市分组处理数据
-            for city in df['city'].unique():
-                city_data = df[df['city'] == city].copy()
-                city_data = city_data.sort_values('date')
-                
-                prev_day_aqi = None
-                prev_day_pm25 = None
-                
-                # 确保日期连续
-                date_range = pd.date_range(
-                    start=pd.to_datetime(city_data['date'].min()),
-                    end=pd.to_datetime(city_data['date'].max())
-                )
-                
-                for date in date_range:
-                    # 获取当天的数据，如果没有则使用前一天的数据
-                    date_str = date.strftime('%Y-%m-%d')
-                    date_data = city_data[city_data['date'] == date_str]
-                    
-                    if len(date_data) == 0:
-                        # 如果当天没有数据，使用前一天的数据
-                        prev_date = (date - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
-                        date_data = city_data[city_data['date'] == prev_date]
-                        if len(date_data) == 0:
-                            continue
-                    
-                    # 获取基准值
-                    base_aqi = float(date_data['aqi'].iloc[0])
-                    base_pm25 = float(date_data['pm25'].iloc[0])
-                    
-                    # 获取日期特征
-                    is_weekend = date.weekday() >= 5
-                    season = (date.month % 12 + 3) // 3
-                    
-                    # 生成平滑的日变化曲线
-                    daily_aqi = self.generate_smooth_daily_curve(
-                        base_aqi, date, is_weekend, season, prev_day_aqi
-                    )
-                    daily_pm25 = self.generate_smooth_daily_curve(
-                        base_pm25, date, is_weekend, season, prev_day_pm25
-                    )
-                    
-                    # 更新前一天的值
-                    prev_day_aqi = daily_aqi
-                    prev_day_pm25 = daily_pm25
-                    
-                    # 生成24小时的数据
-                    for hour in range(24):
-                        # 获取该小时的AQI和PM2.5值
-                        hourly_aqi = daily_aqi[hour]
-                        hourly_pm25 = daily_pm25[hour]
-                        
-                        # 确定空气质量等级
-                        if hourly_aqi <= 50:
-                            quality_level = '优'
-                        elif hourly_aqi <= 100:
-                            quality_level = '良'
-                        elif hourly_aqi <= 150:
-                            quality_level = '轻度污染'
-                        elif hourly_aqi <= 200:
-                            quality_level = '中度污染'
-                        elif hourly_aqi <= 300:
-                            quality_level = '重度污染'
-                        else:
-                            quality_level = '严重污染'
-                        
-                        hourly_data.append({
-                            'date': date_str,
-                            'hour': hour,
-                            'city': city,
-                            'province': date_data['province'].iloc[0],
-                            'aqi': hourly_aqi,
-                            'pm25': hourly_pm25,
-                            'quality_level': quality_level,
-                            'main_pollutant': date_data['main_pollutant'].iloc[0]
-                        })
-            
-            hourly_df = pd.DataFrame(hourly_data)
+            hourly_df = self.expand_to_hourly(df)
             
             # 验证小时数据
             hourly_df = self.validate_data(hourly_df, '小时化后')
             
             # 添加时间特征
-            hourly_df['timestamp'] = hourly_df.apply(
-                lambda x: pd.Timestamp(x['date']).replace(hour=x['hour']),
-                axis=1
-            )
-            hourly_df['year'] = hourly_df['timestamp'].dt.year
-            hourly_df['month'] = hourly_df['timestamp'].dt.month
-            hourly_df['day'] = hourly_df['timestamp'].dt.day
-            hourly_df['dayofweek'] = hourly_df['timestamp'].dt.dayofweek
-            hourly_df['season'] = (hourly_df['month'] % 12 + 3) // 3
-            hourly_df['is_weekend'] = hourly_df['dayofweek'].isin([5, 6]).astype(int)
-            hourly_df['is_peak_hour'] = hourly_df.apply(
-                lambda x: int(hour in self.patterns['weekend' if x['is_weekend'] else 'workday']['morning_peak']['hours'] or 
-                            hour in self.patterns['weekend' if x['is_weekend'] else 'workday']['evening_peak']['hours']),
-                axis=1
-            )
+            hourly_df = self.add_calendar_features(hourly_df)
             
-            # 计算24小时移动平均
-            print("\n计算移动平均...")
-            for col in ['aqi', 'pm25']:
-                ma_col = f'{col}_ma24'
-                hourly_df[ma_col] = hourly_df.groupby('city')[col].transform(
-                    lambda x: x.rolling(window=24, min_periods=1, center=False).mean()
-                )
-                if col == 'aqi':
-                    hourly_df[ma_col] = hourly_df[ma_col].clip(self.aqi_range[0], self.aqi_range[1])
-                else:
-                    hourly_df[ma_col] = hourly_df[ma_col].clip(self.pm25_range[0], self.pm25_range[1])
+            # 计算移动平均和滞后特征
+            hourly_df = self.add_window_features(hourly_df)
             
-            # 添加滞后特征
-            print("计算滞后特征...")
-            for i in [1, 3, 6, 12, 24]:
-                for col in ['aqi', 'pm25']:
-                    lag_col = f'{col}_lag{i}'
-                    hourly_df[lag_col] = hourly_df.groupby('city')[col].shift(i)
-                    hourly_df[lag_col] = hourly_df[lag_col].fillna(method='ffill').fillna(method='bfill')
-                    if col == 'aqi':
-                        hourly_df[lag_col] = hourly_df[lag_col].clip(self.aqi_range[0], self.aqi_range[1])
-                    else:
-                        hourly_df[lag_col] = hourly_df[lag_col].clip(self.pm25_range[0], self.pm25_range[1])
-            
-            # 类别特征编码
-            hourly_df['city_code'] = pd.Categorical(hourly_df['city']).codes
-            hourly_df['province_code'] = pd.Categorical(hourly_df['province']).codes
-            hourly_df['quality_level_code'] = pd.Categorical(hourly_df['quality_level']).codes
+            # 类别特征编码（城市和省份使用编码注册表）
+            categories = self.register_categories({col: df[col].unique() for col in ENCODED_COLUMNS})
+            hourly_df = self.encode_categories(hourly_df, categories)
             
             # 验证特征工程后的数据
             hourly_df = self.validate_data(hourly_df, '特征工程后')
             
-            # 保存数据
-            original_file = self.processed_data_dir / 'hourly_data_original.csv'
-            processed_file = self.processed_data_dir / 'hourly_data_processed.csv'
-            
-            hourly_df.to_csv(original_file, index=False, encoding='utf-8-sig')
-            hourly_df.to_csv(processed_file, index=False, encoding='utf-8-sig')
+            # 保存数据（Parquet，按年份和城市分区），先删除与旧数据集对应的处理状态
+            self.etl_state_path.unlink(missing_ok=True)
+            write_processed(hourly_df, self.processed_dataset)
+            print(f"\n处理后的数据已保存至: {self.processed_dataset}")
             
             # 保存数据范围信息
             scalers = {
@@ -341,57 +587,180 @@ class AirQualityDataProcessor:
             }
             joblib.dump(scalers, self.processed_data_dir / 'scalers.joblib')
             
-            # 生成数据分析图表
-            self._generate_analysis_plots(hourly_df)
+            print("\n数据处理完成！")
+            
+            # 生成数据分析图表（可选）
+            if self.render_plots:
+                self._generate_analysis_plots(hourly_df)
+            
+        except Exception as e:
+            print(f"数据处理过程中出错: {str(e)}")
+            raise
+        
+        finally:
+            # 等待绘图进程完成
+            self.plot_renderer.close()
+    
+    def process_chunk(self, daily_df, state, categories, part_name):
+        """
+        处理一批城市的日数据并追加写入数据集
+
+        参数:
+            daily_df (pd.DataFrame): 这批城市的日数据
+            state (dict): 这批城市的延续状态，处理后被更新
+            categories (dict): 统一的类别编码
+            part_name (str): 写入的分片文件名前缀
+
+        返回:
+            int: 写入的小时数据行数
+        """
+        hourly_df = self.expand_to_hourly(daily_df, state)
+        if hourly_df.empty:
+            return 0
+        
+        hourly_df = self.clip_values(hourly_df)
+        hourly_df = self.add_calendar_features(hourly_df)
+        hourly_df = self.add_window_features(hourly_df, state)
+        hourly_df = self.encode_categories(hourly_df, categories)
+        
+        write_processed(hourly_df, self.processed_dataset, overwrite=False, part_name=part_name)
+        return len(hourly_df)
+
+    def process_files(self, input_files, cities_per_chunk=32, workers=1, incremental=False):
+        """
+        流式处理多个年度数据文件
+
+        文件按年份顺序逐个读取（日数据只有小时数据的1/24），每个文件内按城市分批
+        展开为小时数据并计算特征，每批处理完立即追加写入数据集，内存占用只与
+        一批城市一年的小时数据有关。每个城市上一批最后一天的日数据和曲线、
+        最后24小时的数据作为延续状态传给下一批，跨文件的日曲线平滑过渡、
+        移动平均和滞后特征与一次性处理全部数据时一致。
+
+        workers > 1 时同一文件的各批城市在进程池中并行处理（各批城市之间互不依赖），
+        延续状态随任务传给工作进程并随结果返回。城市和省份编码来自编码注册表，
+        随机波动由随机种子、城市和日期确定，因此结果与进程数和分批方式无关。
+
+        处理完成后保存每个城市的延续状态（其中最后一天即该城市的水位线）。
+        incremental=True 时加载上次的状态，只展开各城市水位线之后的新日期，
+        移动平均和滞后特征使用保存的最后24小时数据，新数据追加写入数据集，
+        结果与全量重新处理相同。
+
+        参数:
+            input_files (list): air_quality_*.csv 文件路径列表
+            cities_per_chunk (int): 每批处理的最多城市数量
+            workers (int): 并行的工作进程数
+            incremental (bool): 是否只处理上次处理之后新增的日期
+        """
+        input_files = sorted(input_files)
+        
+        saved = self.load_etl_state() if incremental else None
+        if saved is not None:
+            # 沿用上次的随机种子
+            state = saved['state']
+            self.random_seed = saved['random_seed']
+            print(f"增量处理: 已有 {len(state)} 个城市的处理状态 (上次处理: {saved['updated_at']})")
+        else:
+            if incremental:
+                print("没有可用的处理状态，执行全量处理")
+            state = {}
+            clear_dataset(self.processed_dataset)
+        
+        # 新出现的城市和省份追加到编码注册表
+        categories = self.register_categories(self.scan_categories(input_files))
+        
+        # 本次写入的分片文件带有运行标记，失败时可以只删除本次写入的文件
+        run_tag = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        print(f"开始流式处理 {len(input_files)} 个数据文件 (进程数: {workers}, 随机种子: {self.random_seed})")
+        
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.random_seed, self.processed_dataset)
+            )
+        
+        try:
+            total_rows = 0
+            for input_file in input_files:
+                df = pd.read_csv(input_file)
+                if saved is not None:
+                    df = self.filter_new_days(df, state)
+                    if df.empty:
+                        continue
+                df = self.validate_data(df, f'原始数据_{input_file.stem}')
+                
+                # 并行时每个进程至少分到一批城市
+                cities = df['city'].unique()
+                chunk_size = min(cities_per_chunk, -(-len(cities) // workers))
+                chunks = [cities[i:i + chunk_size] for i in range(0, len(cities), chunk_size)]
+                
+                file_rows = 0
+                if executor is None:
+                    for chunk_idx, chunk_cities in enumerate(chunks):
+                        file_rows += self.process_chunk(
+                            df[df['city'].isin(chunk_cities)], state, categories,
+                            f'{input_file.stem}-{run_tag}-{chunk_idx:04d}'
+                        )
+                else:
+                    futures = [
+                        executor.submit(
+                            _process_chunk_task,
+                            df[df['city'].isin(chunk_cities)],
+                            {c: state[c] for c in chunk_cities if c in state},
+                            categories,
+                            f'{input_file.stem}-{run_tag}-{chunk_idx:04d}'
+                        )
+                        for chunk_idx, chunk_cities in enumerate(chunks)
+                    ]
+                    for future in futures:
+                        rows, chunk_state = future.result()
+                        file_rows += rows
+                        state.update(chunk_state)
+                
+                total_rows += file_rows
+                print(f"\n{input_file.name} 处理完成: {file_rows:,} 条小时数据")
+                del df
+            
+            self.save_etl_state(state)
+            print(f"\n处理后的数据已保存至: {self.processed_dataset} (本次写入 {total_rows:,} 条)")
+            
+            # 保存数据范围信息
+            scalers = {
+                'aqi_range': self.aqi_range,
+                'pm25_range': self.pm25_range
+            }
+            joblib.dump(scalers, self.processed_data_dir / 'scalers.joblib')
             
             print("\n数据处理完成！")
             
         except Exception as e:
             print(f"数据处理过程中出错: {str(e)}")
+            # 删除本次写入的分片文件，数据集保持在上次保存的状态
+            for part in self.processed_dataset.glob(f'**/*-{run_tag}-*.parquet'):
+                part.unlink()
             raise
+        
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            # 等待绘图进程完成
+            self.plot_renderer.close()
     
     def _generate_analysis_plots(self, df):
-        """生成数据分析图表"""
-        # 创建24小时变化曲线图
-        plt.figure(figsize=(15, 6))
-        for day_type in ['工作日', '周末']:
-            mask = df['is_weekend'] == (1 if day_type == '周末' else 0)
-            hourly_means = df[mask].groupby('hour')['aqi'].mean()
-            plt.plot(hourly_means.index, hourly_means.values, 
-                    label=day_type, marker='o')
-        
-        plt.title('24小时AQI变化曲线')
-        plt.xlabel('小时')
-        plt.ylabel('AQI')
-        plt.legend()
-        plt.grid(True)
-        plt.savefig(self.plots_dir / 'daily_pattern.png')
-        plt.close()
-        
-        # 创建季节变化箱线图
-        plt.figure(figsize=(12, 6))
-        sns.boxplot(data=df, x='season', y='aqi')
-        plt.title('季节AQI分布')
-        plt.xlabel('季节')
-        plt.ylabel('AQI')
-        plt.savefig(self.plots_dir / 'seasonal_pattern.png')
-        plt.close()
-        
-        # 创建相关性热图
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        corr_matrix = df[numeric_cols].corr()
-        plt.figure(figsize=(15, 12))
-        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0)
-        plt.title('特征相关性矩阵')
-        plt.tight_layout()
-        plt.savefig(self.plots_dir / 'feature_correlations.png')
-        plt.close()
+        """生成数据分析图表（只计算汇总数据，绘图在独立进程中完成）"""
+        self.plot_renderer.submit(render_analysis_plots, analysis_plot_data(df))
 
 def main():
     """
     主函数：初始化数据处理器并处理数据
     """
-    processor = AirQualityDataProcessor()
+    # 使用 --plots 参数时绘制数据分布和分析图表，--workers N 指定并行进程数，
+    # --incremental 只处理上次处理之后新增的日期
+    processor = AirQualityDataProcessor(render_plots='--plots' in sys.argv)
+    workers = 1
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
     
     # 查找数据文件
     input_files = list(processor.src_data_dir.glob('air_quality_*.csv'))
@@ -399,14 +768,11 @@ def main():
         raise FileNotFoundError(f"在{processor.src_data_dir}目录下未找到air_quality_*.csv文件")
     
     print(f"找到以下数据文件:")
-    for file in input_files:
+    for file in sorted(input_files):
         print(f"- {file}")
     
-    # 处理第一个找到的文件
-    input_file = input_files[0]
-    print(f"\n将处理文件: {input_file}")
-    
-    processor.process_data(input_file)
+    # 按年份顺序流式处理所有文件
+    processor.process_files(input_files, workers=workers, incremental='--incremental' in sys.argv)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+数据质量报告模块
+
+这个模块负责数据处理各阶段的质量统计和可选的图表绘制，主要功能包括：
+1. 逐列一次遍历计算无效值数量、分布统计和类别计数
+2. 只把图表需要的汇总数据（直方图、分组均值、分位数、相关系数）交给绘图
+3. 绘图在独立进程中执行，数据处理主流程不需要导入或等待 matplotlib
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# 需要检查的数值列
+VALUE_COLS = ['pm25', 'aqi']
+
+# 需要统计取值分布的时间特征
+TIME_COLS = ['hour', 'day', 'month', 'dayofweek', 'season']
+
+
+def _column_stats(values):
+    """计算一列的统计信息（与 describe() 的字段一致）"""
+    finite = values[np.isfinite(values)]
+    stats = {'invalid': int(len(values) - len(finite)), 'count': int(len(finite))}
+    if len(finite) == 0:
+        return stats
+    q25, q50, q75 = np.percentile(finite, [25, 50, 75])
+    stats.update({
+        'mean': float(finite.mean()),
+        'std': float(finite.std(ddof=1)) if len(finite) > 1 else float('nan'),
+        'min': float(finite.min()),
+        '25%': float(q25),
+        '50%': float(q50),
+        '75%': float(q75),
+        'max': float(finite.max())
+    })
+    return stats
+
+
+def compute_report(df, stage='unknown'):
+    """
+    计算数据质量报告
+
+    参数:
+        df (pd.DataFrame): 待检查的数据
+        stage (str): 处理阶段名称
+
+    返回:
+        dict: 包含数值列统计、时间特征分布和空气质量等级分布的报告
+    """
+    report = {'stage': stage, 'rows': len(df), 'values': {}, 'time': {}, 'quality_level': None}
+
+    for col in VALUE_COLS:
+        if col in df.columns:
+            report['values'][col] = _column_stats(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float))
+
+    if 'hour' in df.columns:
+        for col in TIME_COLS:
+            if col in df.columns:
+                counts = np.bincount(df[col].to_numpy(dtype=np.int64))
+                report['time'][col] = {int(k): int(v) for k, v in enumerate(counts) if v > 0}
+
+    if 'quality_level' in df.columns:
+        report['quality_level'] = df['quality_level'].value_counts().to_dict()
+
+    return report
+
+
+def print_report(report):
+    """打印数据质量报告"""
+    print(f"\n开始数据验证... (阶段: {report['stage']})")
+    print(f"数据行数: {report['rows']:,}")
+
+    print("\n检查异常值...")
+    for col, stats in report['values'].items():
+        print(f"{col}无效值数量: {stats['invalid']}")
+        print(f"{col}统计信息: " + ", ".join(
+            f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+            for k, v in stats.items() if k != 'invalid'
+        ))
+
+    if report['time']:
+        print("\n时间特征分布:")
+        for col, counts in report['time'].items():
+            print(f"{col}值分布: {counts}")
+
+    if report['quality_level']:
+        print("\n空气质量等级分布:")
+        print(report['quality_level'])
+
+
+def distribution_plot_data(df, stage, bins=50):
+    """计算分布图需要的直方图数据"""
+    data = {'stage': stage, 'histograms': {}}
+    for col in VALUE_COLS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            counts, edges = np.histogram(values[np.isfinite(values)], bins=bins)
+            data['histograms'][col] = (counts, edges)
+    return data
+
+
+def analysis_plot_data(df):
+    """计算分析图表需要的汇总数据"""
+    hourly_means = {}
+    for day_type, flag in (('工作日', 0), ('周末', 1)):
+        means = df[df['is_weekend'] == flag].groupby('hour')['aqi'].mean()
+        hourly_means[day_type] = (means.index.to_numpy(), means.to_numpy())
+
+    # 箱线图统计（与 seaborn 默认的 1.5 倍四分位距须线一致）
+    seasonal_stats = []
+    for season, values in df.groupby('season')['aqi']:
+        values = values.to_numpy(dtype=float)
+        q1, med, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        seasonal_stats.append({
+            'label': str(season), 'q1': q1, 'med': med, 'q3': q3,
+            'whislo': inside.min(), 'whishi': inside.max(), 'fliers': []
+        })
+
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    return {
+        'hourly_means': hourly_means,
+        'seasonal_stats': seasonal_stats,
+        'correlations': df[numeric_cols].corr()
+    }
+
+
+def render_distribution_plots(data, plots_dir):
+    """绘制数值列分布图（在绘图进程中执行）"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    for col, (counts, edges) in data['histograms'].items():
+        plt.figure(figsize=(10, 6))
+        plt.stairs(counts, edges, fill=True)
+        plt.title(f"{col}分布图 ({data['stage']})")
+        plt.savefig(plots_dir / f"{col}_dist_{data['stage']}.png")
+        plt.close()
+
+
+def render_analysis_plots(data, plots_dir):
+    """绘制24小时曲线、季节箱线图和相关性热图（在绘图进程中执行）"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # 创建24小时变化曲线图
+    plt.figure(figsize=(15, 6))
+    for day_type, (hours, means) in data['hourly_means'].items():
+        plt.plot(hours, means, label=day_type, marker='o')
+    plt.title('24小时AQI变化曲线')
+    plt.xlabel('小时')
+    plt.ylabel('AQI')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(plots_dir / 'daily_pattern.png')
+    plt.close()
+
+    # 创建季节变化箱线图
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.bxp(data['seasonal_stats'], showfliers=False)
+    ax.set_title('季节AQI分布')
+    ax.set_xlabel('季节')
+    ax.set_ylabel('AQI')
+    fig.savefig(plots_dir / 'seasonal_pattern.png')
+    plt.close(fig)
+
+    # 创建相关性热图
+    plt.figure(figsize=(15, 12))
+    sns.heatmap(data['correlations'], annot=True, cmap='coolwarm', center=0)
+    plt.title('特征相关性矩阵')
+    plt.tight_layout()
+    plt.savefig(plots_dir / 'feature_correlations.png')
+    plt.close()
+
+
+class PlotRenderer:
+    """
+    独立进程中的图表绘制器
+
+    提交任务时只传递汇总数据，主进程不会因为绘图阻塞；
+    close() 时等待所有图表绘制完成。
+    """
+
+    def __init__(self, plots_dir):
+        """初始化绘制器（绘图进程在第一次提交时启动）"""
+        self.plots_dir = plots_dir
+        self._executor = None
+        self._futures = []
+
+    def submit(self, render, data):
+        """提交绘图任务"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1)
+        self._futures.append(self._executor.submit(render, data, self.plots_dir))
+
+    def close(self):
+        """等待绘图任务完成并关闭绘图进程"""
+        if self._executor is None:
+            return
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"绘制图表时出错: {str(e)}")
+        self._executor.shutdown()
+        self._executor = None
+        self._futures = []
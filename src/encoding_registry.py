@@ -0,0 +1,95 @@
+"""
+类别编码注册表模块
+
+这个模块为 city_code 和 province_code 维护持久化的编码，数据处理、模型训练
+和在线预测共用同一份编码，主要功能包括：
+1. 编码保存在 data/processed/encodings.json 中，列表下标即编码
+2. 只追加：新出现的城市或省份排在已有类别之后，已有编码永远不变
+3. 加载后常驻内存，按值查编码和按编码查值都是 O(1)
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 使用注册表编码的列
+ENCODED_COLUMNS = ['city', 'province']
+
+
+def registry_path(processed_data_dir):
+    """获取编码注册表文件路径"""
+    return Path(processed_data_dir) / 'encodings.json'
+
+
+class EncodingRegistry:
+    """
+    只追加的类别编码注册表
+
+    属性:
+        path (Path): 注册表文件路径
+        values (dict): {列名: 按编码排列的类别列表}
+        codes (dict): {列名: {类别: 编码}}
+    """
+
+    def __init__(self, path, columns=ENCODED_COLUMNS):
+        """初始化注册表，文件存在时加载已有编码"""
+        self.path = Path(path)
+        self.values = {col: [] for col in columns}
+        self.codes = {col: {} for col in columns}
+        if self.path.exists():
+            self.load()
+
+    def load(self):
+        """从文件加载编码"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for col, values in data.items():
+            self.values[col] = list(values)
+            self.codes[col] = {value: code for code, value in enumerate(values)}
+
+    def save(self):
+        """保存编码（先写临时文件再替换，避免读到写了一半的文件）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.values, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def register(self, column, values):
+        """
+        登记类别，新类别按排序后的顺序追加到末尾
+
+        第一次登记时编码与 pd.Categorical 按值排序的编码一致。
+
+        返回:
+            int: 新增的类别数量
+        """
+        known = self.codes[column]
+        new_values = sorted({value for value in values if value not in known})
+        for value in new_values:
+            known[value] = len(self.values[column])
+            self.values[column].append(value)
+        return len(new_values)
+
+    def code(self, column, value, default=-1):
+        """获取类别的编码，未登记时返回 default"""
+        return self.codes[column].get(value, default)
+
+    def decode(self, column, code):
+        """根据编码获取类别"""
+        return self.values[column][code]
+
+    def encode(self, column, values):
+        """批量编码，未登记的类别编码为 -1"""
+        return pd.Categorical(values, categories=self.values[column]).codes.astype(np.int64)
+
+    def categories(self, column):
+        """获取按编码排列的全部类别"""
+        return list(self.values[column])
+
+    def size(self, column):
+        """获取已登记的类别数量"""
+        return len(self.values[column])
@@ -0,0 +1,159 @@
+"""
+预测结果缓存模块
+
+这个模块为实时数据和24小时预测提供进程内缓存，主要功能包括：
+1. 以 (城市, 预测整点) 为键缓存结果，在下一个整点自动过期
+2. 超过容量时按最近最少使用（LRU）淘汰
+3. 同一个键的并发未命中只计算一次，其余请求等待结果（single-flight）
+4. 失效代数：计算期间缓存被清除时，计算结果不写入缓存，之后的请求重新计算
+5. 统计命中、未命中、淘汰等次数，用于观察节省的上游请求量
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """正在计算中的缓存项"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class ForecastCache:
+    """
+    按小时对齐过期的 TTL + LRU 预测缓存
+
+    属性:
+        max_entries (int): 最多缓存的条目数
+        ttl_seconds (int): 过期周期（秒），缓存项在所在周期结束时过期
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, clock=time.time):
+        """初始化缓存"""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._generation = 0          # invalidate() 清除全部缓存的次数
+        self._city_generations = {}   # {城市: invalidate(city) 的次数}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0  # 等待其他请求计算结果的次数
+        self.discarded = 0  # 计算期间缓存被清除而没有写入的结果数
+
+    def _key(self, city, now):
+        """获取缓存键和过期时间"""
+        period_start = int(now // self.ttl_seconds) * self.ttl_seconds
+        return (city, period_start), period_start + self.ttl_seconds
+
+    def get_or_compute(self, city, compute):
+        """
+        获取缓存结果，未命中时调用 compute() 计算
+
+        compute 返回 None 时不缓存，便于下次请求重试。计算开始后该城市的缓存被清除时，
+        结果仍返回给本次请求和正在等待的请求，但不写入缓存。
+        """
+        now = self._clock()
+        key, expires_at = self._key(city, now)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+                self.misses += 1
+                leader = True
+                generation = self._generation_of(city)
+
+        if not leader:
+            in_flight.event.wait()
+            return in_flight.value
+
+        try:
+            value = compute()
+            in_flight.value = value
+            if value is not None:
+                with self._lock:
+                    if self._generation_of(city) != generation:
+                        self.discarded += 1
+                    else:
+                        self._entries[key] = (expires_at, value)
+                        self._entries.move_to_end(key)
+                        self._evict()
+            return value
+        finally:
+            with self._lock:
+                # 清除缓存后可能已有新的计算，只移除自己的记录
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+            in_flight.event.set()
+
+    def _generation_of(self, city):
+        """城市当前的失效代数（调用方需持有锁）"""
+        return self._generation, self._city_generations.get(city, 0)
+
+    def _evict(self):
+        """淘汰过期条目和超出容量的最旧条目（调用方需持有锁）"""
+        now = self._clock()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, city=None):
+        """
+        清除指定城市（或全部）的缓存
+
+        正在进行的计算不再被新请求复用，其结果也不会写入缓存。
+        """
+        with self._lock:
+            if city is None:
+                self._generation += 1
+                self._entries.clear()
+                self._in_flight.clear()
+                return
+            self._city_generations[city] = self._city_generations.get(city, 0) + 1
+            for key in [key for key in self._entries if key[0] == city]:
+                del self._entries[key]
+            for key in [key for key in self._in_flight if key[0] == city]:
+                del self._in_flight[key]
+
+    def stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'discarded': self.discarded,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round((self.hits + self.coalesced) / requests, 4) if requests else 0.0
+            }
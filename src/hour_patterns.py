@@ -0,0 +1,80 @@
+"""
+小时变化模式模块
+
+这个模块是小时变化模式的唯一定义，离线数据处理和在线预测共同使用，主要内容包括：
+1. 工作日/周末各时段的变化因子
+2. 季节影响因子
+3. 加载时编译得到的 (是否周末, 季节, 小时) 因子表和 (是否周末, 小时) 高峰时段表，查询时直接索引
+"""
+
+import numpy as np
+
+# 定义不同情况下的小时变化模式
+PATTERNS = {
+    'workday': {  # 工作日模式
+        'morning_peak': {'hours': [7,8,9], 'factor': 1.15},  # 降低峰值
+        'afternoon_low': {'hours': [12,13,14], 'factor': 0.85},
+        'evening_peak': {'hours': [17,18,19], 'factor': 1.20},
+        'night_low': {'hours': [2,3,4], 'factor': 0.80}
+    },
+    'weekend': {  # 周末模式
+        'morning_peak': {'hours': [9,10,11], 'factor': 1.05},
+        'afternoon_peak': {'hours': [14,15,16], 'factor': 1.10},
+        'evening_peak': {'hours': [19,20,21], 'factor': 1.12},
+        'night_low': {'hours': [2,3,4], 'factor': 0.85}
+    }
+}
+
+# 季节影响因子（季节编码：1冬 2春 3夏 4秋）
+SEASON_FACTORS = {
+    1: 1.15,  # 冬季：供暖期污染加重，但降低系数
+    2: 1.05,  # 春季：扬尘等影响
+    3: 0.90,  # 夏季：降水导致污染物沉降
+    4: 1.0    # 秋季：基准水平
+}
+
+
+def season_of_month(month):
+    """根据月份获取季节编码（1冬 2春 3夏 4秋），支持标量和数组"""
+    return (month % 12 + 3) // 3
+
+
+def _compile_factor_table():
+    """编译 (是否周末, 季节, 小时) 的因子表"""
+    table = np.ones((2, 4, 24))
+    for is_weekend, day_type in enumerate(['workday', 'weekend']):
+        # 同一小时出现在多个时段时，以定义顺序中的第一个为准
+        for period in reversed(list(PATTERNS[day_type].values())):
+            table[is_weekend, :, period['hours']] = period['factor']
+    for season, factor in SEASON_FACTORS.items():
+        table[:, season - 1, :] *= factor
+    table.setflags(write=False)
+    return table
+
+
+# 小时因子表，索引为 [is_weekend, season-1, hour]
+HOUR_FACTOR_TABLE = _compile_factor_table()
+
+
+def hour_factor(hour, is_weekend, season):
+    """获取小时变化因子（时段因子 × 季节因子），支持标量和数组"""
+    return HOUR_FACTOR_TABLE[np.asarray(is_weekend, dtype=int), np.asarray(season) - 1, hour]
+
+
+def _compile_peak_table():
+    """编译 (是否周末, 小时) 的高峰时段表（早高峰和晚高峰）"""
+    table = np.zeros((2, 24), dtype=np.int8)
+    for is_weekend, day_type in enumerate(['workday', 'weekend']):
+        for period in ('morning_peak', 'evening_peak'):
+            table[is_weekend, PATTERNS[day_type][period]['hours']] = 1
+    table.setflags(write=False)
+    return table
+
+
+# 高峰时段表，索引为 [is_weekend, hour]
+PEAK_HOUR_TABLE = _compile_peak_table()
+
+
+def is_peak_hour(hour, is_weekend):
+    """判断是否为高峰时段，支持标量和数组"""
+    return PEAK_HOUR_TABLE[np.asarray(is_weekend, dtype=int), hour]
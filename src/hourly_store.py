@@ -0,0 +1,132 @@
+"""
+实时小时数据存储模块
+
+这个模块负责 data/air_quality.db 中 hourly_data 表的读写，主要功能包括：
+1. 每个线程复用一个长连接，避免每次读写都重新打开数据库
+2. 使用 WAL 日志模式，读写互不阻塞
+3. 一次采集的所有数据使用 executemany 在一个事务中批量写入
+4. 固定的 SQL 语句由连接的语句缓存复用（预编译）
+5. 按城市和时间范围查询使用 UNIQUE(city, timestamp) 约束自带的索引，不再额外建索引
+"""
+
+import sqlite3
+import threading
+import pandas as pd
+
+# 数据列（不含自增ID）
+COLUMNS = ['city', 'timestamp', 'aqi', 'pm25', 'pm10', 'so2', 'no2', 'o3', 'co', 'quality_level']
+
+CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS hourly_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT,
+    timestamp DATETIME,
+    aqi INTEGER,
+    pm25 REAL,
+    pm10 REAL,
+    so2 REAL,
+    no2 REAL,
+    o3 REAL,
+    co REAL,
+    quality_level TEXT,
+    UNIQUE(city, timestamp)
+)
+'''
+
+# 旧版本创建的覆盖索引（包含所有列，每次写入都要再写一份整行），已由唯一约束的索引代替
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS idx_hourly_data_city_timestamp'
+
+UPSERT_SQL = f'''
+INSERT OR REPLACE INTO hourly_data ({', '.join(COLUMNS)})
+VALUES ({', '.join('?' for _ in COLUMNS)})
+'''
+
+
+class HourlyDataStore:
+    """
+    hourly_data 表的存储层
+
+    属性:
+        db_path (Path): SQLite 数据库文件路径
+        timeout (float): 等待写锁的超时时间（秒）
+    """
+
+    def __init__(self, db_path, timeout=30.0, cached_statements=64):
+        """初始化存储层并创建表"""
+        self.db_path = db_path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self.init_schema()
+
+    @property
+    def connection(self):
+        """获取当前线程的长连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.timeout,
+                cached_statements=self.cached_statements
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def init_schema(self):
+        """创建表，并删除旧版本创建的覆盖索引"""
+        conn = self.connection
+        with conn:
+            conn.execute(CREATE_TABLE_SQL)
+            conn.execute(DROP_INDEX_SQL)
+
+    def upsert_many(self, records):
+        """
+        在一个事务中批量写入多条数据（同一城市同一时间的数据会被覆盖）
+
+        参数:
+            records (list): 包含 COLUMNS 中各字段的字典列表
+
+        返回:
+            int: 写入的记录数
+        """
+        rows = [tuple(record[col] for col in COLUMNS) for record in records]
+        if not rows:
+            return 0
+
+        conn = self.connection
+        with conn:
+            conn.executemany(UPSERT_SQL, rows)
+        return len(rows)
+
+    def upsert(self, record):
+        """写入一条数据"""
+        return self.upsert_many([record])
+
+    def query_range(self, city, start_time=None, end_time=None, descending=True):
+        """
+        查询指定城市在时间范围内的数据
+
+        返回:
+            pd.DataFrame: 查询结果
+        """
+        query = "SELECT * FROM hourly_data WHERE city = ?"
+        params = [city]
+
+        if start_time:
+            query += " AND timestamp >= ?"
+            params.append(start_time)
+        if end_time:
+            query += " AND timestamp <= ?"
+            params.append(end_time)
+
+        query += " ORDER BY timestamp DESC" if descending else " ORDER BY timestamp"
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def close(self):
+        """关闭当前线程的连接（其他线程的连接在线程结束时释放）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,230 @@
+"""
+超参数搜索模块
+
+这个模块为 LightGBM 模型搜索训练参数，主要功能包括：
+1. 在搜索空间中随机采样参数组合，每个组合作为一次试验
+2. 多个试验在进程池中并行运行，训练和验证数据只分箱一次，
+   以 LightGBM 二进制文件的形式由所有工作进程共享
+3. 每个试验在验证集上提前停止，记录最佳迭代次数
+4. 中位数剪枝：试验在检查点的验证 RMSE 差于其他试验在同一检查点的中位数时提前结束
+5. 返回最佳参数组合和所有试验的记录，由训练器写入模型清单
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+import lightgbm as lgb
+import numpy as np
+
+# 搜索空间：{参数: (类型, 下限, 上限)}，log 表示按对数均匀采样
+# 数据已经分箱，max_bin 等分箱参数不能在试验中改变
+SEARCH_SPACE = {
+    'num_leaves': ('int_log', 16, 256),
+    'learning_rate': ('log', 0.01, 0.2),
+    'max_depth': ('choice', [-1, 6, 8, 12]),
+    'min_child_samples': ('int_log', 20, 500),
+    'feature_fraction': ('uniform', 0.5, 1.0),
+    'bagging_fraction': ('uniform', 0.5, 1.0),
+    'lambda_l1': ('log', 1e-3, 10.0),
+    'lambda_l2': ('log', 1e-3, 10.0)
+}
+
+# 工作进程中的共享数据和剪枝记录
+_worker_data = None
+_worker_history = None
+_worker_lock = None
+_worker_settings = None
+
+
+def _init_worker(train_path, valid_path, history, lock, settings):
+    """初始化工作进程：加载已分箱的数据集（每个进程只加载一次）"""
+    global _worker_data, _worker_history, _worker_lock, _worker_settings
+    dataset_params = {'verbose': -1}
+    train_data = lgb.Dataset(train_path, params=dataset_params).construct()
+    valid_data = lgb.Dataset(valid_path, reference=train_data, params=dataset_params).construct()
+    _worker_data = (train_data, valid_data)
+    _worker_history = history
+    _worker_lock = lock
+    _worker_settings = settings
+
+
+def _pruning_callback(trial_state):
+    """
+    中位数剪枝回调
+
+    每 prune_interval 轮记录一次当前最佳的验证 RMSE，已有足够多的试验到达同一检查点
+    且本试验差于它们的中位数时结束训练。
+    """
+    interval = _worker_settings['prune_interval']
+    min_trials = _worker_settings['min_trials']
+
+    def callback(env):
+        rmse = env.evaluation_result_list[0][2]
+        if rmse < trial_state['best_rmse']:
+            trial_state['best_rmse'] = rmse
+            trial_state['best_iteration'] = env.iteration
+        step = env.iteration + 1
+        if step % interval != 0:
+            return
+
+        with _worker_lock:
+            others = list(_worker_history.get(step, []))
+            _worker_history[step] = others + [trial_state['best_rmse']]
+
+        if len(others) >= min_trials and trial_state['best_rmse'] > np.median(others):
+            trial_state['pruned_at'] = step
+            raise lgb.callback.EarlyStopException(trial_state['best_iteration'], env.evaluation_result_list)
+
+    callback.order = 40  # 在提前停止回调之后执行
+    return callback
+
+
+def _run_trial(trial_id, params):
+    """在工作进程中运行一次试验"""
+    train_data, valid_data = _worker_data
+    settings = _worker_settings
+    trial_state = {'best_rmse': np.inf, 'best_iteration': 0, 'pruned_at': None}
+
+    start_time = time.time()
+    booster = lgb.train(
+        dict(params, num_threads=settings['num_threads']),
+        train_data,
+        num_boost_round=settings['max_rounds'],
+        valid_sets=[valid_data],
+        valid_names=['valid'],
+        callbacks=[
+            lgb.early_stopping(settings['early_stopping_rounds'], first_metric_only=True, verbose=False),
+            _pruning_callback(trial_state)
+        ]
+    )
+
+    return {
+        'trial': trial_id,
+        'params': {key: params[key] for key in SEARCH_SPACE},
+        'status': 'pruned' if trial_state['pruned_at'] else 'complete',
+        'pruned_at': trial_state['pruned_at'],
+        'best_iteration': int(booster.best_iteration or trial_state['best_iteration'] + 1),
+        'rounds': int(booster.current_iteration()),
+        'rmse': float(trial_state['best_rmse']),
+        'seconds': time.time() - start_time
+    }
+
+
+class HyperparameterSearch:
+    """
+    LightGBM 超参数随机搜索
+
+    属性:
+        base_params (dict): 基础参数（目标函数、评估指标、分箱等固定参数）
+        n_trials (int): 试验次数
+        workers (int): 并行试验的进程数
+        max_rounds (int): 每个试验的最大训练轮数
+        early_stopping_rounds (int): 验证 RMSE 连续多少轮没有改善时提前停止
+        prune_interval (int): 剪枝检查点的间隔（轮）
+        min_trials (int): 检查点上至少有多少个其他试验的记录才开始剪枝
+        random_seed (int): 参数采样的随机种子
+    """
+
+    def __init__(self, base_params, n_trials=20, workers=1, max_rounds=1000, early_stopping_rounds=30,
+                 prune_interval=25, min_trials=4, random_seed=42):
+        """初始化超参数搜索"""
+        self.base_params = dict(base_params)
+        self.n_trials = n_trials
+        self.workers = workers
+        self.max_rounds = max_rounds
+        self.early_stopping_rounds = early_stopping_rounds
+        self.prune_interval = prune_interval
+        self.min_trials = min_trials
+        self.random_seed = random_seed
+
+    def sample_params(self, rng):
+        """从搜索空间中采样一组参数"""
+        params = dict(self.base_params)
+        for name, (kind, *bounds) in SEARCH_SPACE.items():
+            if kind == 'choice':
+                params[name] = bounds[0][rng.integers(len(bounds[0]))]
+            elif kind == 'uniform':
+                params[name] = float(rng.uniform(*bounds))
+            else:
+                value = float(np.exp(rng.uniform(np.log(bounds[0]), np.log(bounds[1]))))
+                params[name] = int(round(value)) if kind == 'int_log' else value
+        return params
+
+    def trial_params(self):
+        """生成所有试验的参数，第一个试验使用基础参数作为对照"""
+        rng = np.random.default_rng(self.random_seed)
+        trials = [dict(self.base_params)]
+        while len(trials) < self.n_trials:
+            trials.append(self.sample_params(rng))
+        return trials
+
+    def run(self, train_data, valid_data, work_dir=None):
+        """
+        运行超参数搜索
+
+        参数:
+            train_data (lgb.Dataset): 已分箱的训练数据集
+            valid_data (lgb.Dataset): 已分箱的验证数据集（与训练集使用相同的分箱）
+            work_dir (Path): 存放共享数据文件的目录，默认为系统临时目录
+
+        返回:
+            dict: 搜索结果，best 为最佳试验（参数和最佳迭代次数），trials 为所有试验记录
+        """
+        start_time = time.time()
+        num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        settings = {
+            'max_rounds': self.max_rounds,
+            'early_stopping_rounds': self.early_stopping_rounds,
+            'prune_interval': self.prune_interval,
+            'min_trials': self.min_trials,
+            'num_threads': num_threads
+        }
+        trials = self.trial_params()
+        results = []
+
+        with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+            # 分箱后的数据写成二进制文件，工作进程直接加载，不再重新分箱
+            train_path = os.path.join(tmp_dir, 'train.bin')
+            valid_path = os.path.join(tmp_dir, 'valid.bin')
+            train_data.save_binary(train_path)
+            valid_data.save_binary(valid_path)
+
+            if self.workers > 1:
+                with Manager() as manager:
+                    initargs = (train_path, valid_path, manager.dict(), manager.Lock(), settings)
+                    with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=initargs) as executor:
+                        futures = [executor.submit(_run_trial, i, params) for i, params in enumerate(trials)]
+                        for future in as_completed(futures):
+                            results.append(self._report_trial(future.result()))
+            else:
+                _init_worker(train_path, valid_path, {}, threading.Lock(), settings)
+                for i, params in enumerate(trials):
+                    results.append(self._report_trial(_run_trial(i, params)))
+
+        results.sort(key=lambda r: r['trial'])
+        best = min(results, key=lambda r: r['rmse'])
+        return {
+            'best': {
+                'trial': best['trial'],
+                'params': best['params'],
+                'num_boost_round': best['best_iteration'],
+                'rmse': best['rmse']
+            },
+            'trials': results,
+            'pruned': sum(r['status'] == 'pruned' for r in results),
+            'total_rounds': sum(r['rounds'] for r in results),
+            'workers': self.workers,
+            'seconds': time.time() - start_time
+        }
+
+    @staticmethod
+    def _report_trial(result):
+        """打印一次试验的结果"""
+        status = f"剪枝于第{result['pruned_at']}轮" if result['status'] == 'pruned' else f"最佳轮次 {result['best_iteration']}"
+        print(f"试验 {result['trial']:>3}: 验证RMSE {result['rmse']:.4f} ({status}, {result['seconds']:.1f}秒)")
+        return result
@@ -0,0 +1,82 @@
+"""
+实时数据定时采集模块
+
+这个模块在后台线程中按小时采集所有已配置城市的实时空气质量，主要功能包括：
+1. 每个整点对所有城市并发请求一次上游接口
+2. 将一次采集的所有数据在一个事务中批量写入 hourly_data 表
+3. 更新采集器的最新数据和城市滞后状态，请求处理时直接使用已采集的数据
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HourlyIngestionScheduler:
+    """
+    按小时采集实时数据的后台调度器
+
+    属性:
+        collector (AirQualityCollector): 数据采集器
+        interval (int): 采集周期（秒），对齐到周期的整数倍时刻
+        delay (int): 每个周期开始后延迟多少秒再采集，等待上游发布新数据
+        retry_interval (int): 采集失败后的重试间隔（秒）
+    """
+
+    def __init__(self, collector, interval=3600, delay=60, retry_interval=300, concurrency=8):
+        """初始化调度器"""
+        self.collector = collector
+        self.interval = interval
+        self.delay = delay
+        self.retry_interval = retry_interval
+        self.concurrency = concurrency
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_count = 0
+
+    def run_once(self):
+        """立即执行一次采集，返回入库的记录数"""
+        start_time = time.time()
+        count = self.collector.ingest_hourly(concurrency=self.concurrency)
+        self.last_run = time.time()
+        self.last_count = count
+        logger.info(f"定时采集完成: {count} 条记录, 用时 {self.last_run - start_time:.2f}秒")
+        return count
+
+    def seconds_until_next_run(self, now=None):
+        """计算距离下一次采集的秒数"""
+        if now is None:
+            now = time.time()
+        next_run = (now - self.delay) // self.interval * self.interval + self.interval + self.delay
+        return max(0.0, next_run - now)
+
+    def _run(self):
+        """后台线程主循环"""
+        logger.info("启动实时数据定时采集任务")
+        wait = 0  # 启动时立即采集一次
+        while not self._stop_event.wait(wait):
+            try:
+                self.run_once()
+                wait = self.seconds_until_next_run()
+            except Exception as e:
+                logger.error(f"定时采集任务失败: {str(e)}")
+                wait = self.retry_interval
+
+    def start(self):
+        """启动后台采集线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='hourly-ingestion', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止后台采集线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,213 @@
+"""
+模型注册表模块
+
+这个模块负责训练好的 AQI/PM2.5 模型的保存和加载，主要功能包括：
+1. 模型以 LightGBM 原生文本格式保存在 data/models/<版本>/ 目录中，附带 manifest.json
+   （特征列、各目标的模型文件和树数量、评估指标、编码注册表大小）
+2. 版本目录先写入临时目录再整体重命名，读取方不会看到写了一半的版本
+3. 模型在第一次预测时才加载，服务启动和不做预测的工作进程不需要解析模型文件
+4. 只加载注册的版本：旧的 best_*_model_*.joblib 模型使用未保存的标准化特征训练，
+   不能直接用于在线预测，没有注册版本时服务使用统计预测
+5. 版本中可以包含按省份或城市聚类划分的分片模型，清单记录城市到分片的分配
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import lightgbm as lgb
+
+# 清单文件名
+MANIFEST_NAME = 'manifest.json'
+
+# 版本号冲突时的最大重试次数
+MAX_SAVE_ATTEMPTS = 100
+
+
+class LazyBooster:
+    """
+    第一次预测时才加载的模型
+
+    属性:
+        name (str): 模型名称（用于日志）
+        loaded (bool): 模型是否已加载
+    """
+
+    def __init__(self, loader, name):
+        """初始化（loader 为返回 Booster 的无参函数）"""
+        self._loader = loader
+        self._booster = None
+        self._lock = threading.Lock()
+        self.name = name
+
+    @property
+    def loaded(self):
+        return self._booster is not None
+
+    @property
+    def booster(self):
+        """获取模型，第一次访问时加载"""
+        if self._booster is None:
+            with self._lock:
+                if self._booster is None:
+                    self._booster = self._loader()
+        return self._booster
+
+    def predict(self, X, **kwargs):
+        """预测（与 lgb.Booster.predict 相同）"""
+        return self.booster.predict(X, **kwargs)
+
+
+class ModelVersion:
+    """
+    一个模型版本
+
+    属性:
+        version (str): 版本号
+        path (Path): 版本目录
+        manifest (dict): 清单内容
+        boosters (dict): {目标: LazyBooster}
+        shards (dict): {分片: {目标: LazyBooster}}，没有分片模型时为空
+    """
+
+    def __init__(self, version, path, manifest, boosters, shards=None):
+        """初始化模型版本"""
+        self.version = version
+        self.path = path
+        self.manifest = manifest
+        self.boosters = boosters
+        self.shards = shards or {}
+
+    @property
+    def shard_assignment(self):
+        """城市编码到分片的分配 {城市编码: 分片}"""
+        assignment = self.manifest.get('shards', {}).get('assignment', {})
+        return {int(code): shard for code, shard in assignment.items()}
+
+    def booster(self, target):
+        """获取指定目标的模型（延迟加载）"""
+        return self.boosters[target]
+
+    def artifact(self, name):
+        """获取随版本保存的附加文件路径，不存在时返回 None"""
+        if name not in self.manifest.get('artifacts', []):
+            return None
+        return self.path / name
+
+
+class ModelRegistry:
+    """
+    data/models 目录中的模型注册表
+
+    属性:
+        models_dir (Path): 模型目录
+    """
+
+    def __init__(self, models_dir):
+        """初始化注册表"""
+        self.models_dir = Path(models_dir)
+
+    def save(self, boosters, feature_columns, metrics=None, extra=None, artifacts=None):
+        """
+        保存一组模型为新版本
+
+        参数:
+            boosters (dict): {目标: lgb.Booster}
+            feature_columns (list): 训练使用的特征列（按顺序）
+            metrics (dict): {目标: 评估指标}
+            extra (dict): 写入清单的其他信息
+            artifacts (dict): 随版本保存的附加文件，{文件名: 接收文件路径并写入的函数}
+
+        返回:
+            ModelVersion: 新保存的版本
+        """
+        # 版本号精确到微秒；临时目录名唯一，并发保存互不影响
+        version = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f'.{version}.', suffix='.tmp', dir=self.models_dir))
+
+        targets = {}
+        for target, booster in boosters.items():
+            file_name = f'{target}.txt'
+            booster.save_model(str(tmp_dir / file_name))
+            targets[target] = {
+                'file': file_name,
+                'num_trees': booster.num_trees(),
+                'best_iteration': booster.best_iteration
+            }
+
+        for name, write in (artifacts or {}).items():
+            write(str(tmp_dir / name))
+
+        manifest = {
+            'version': version,
+            'created_at': datetime.now().isoformat(),
+            'format': 'lightgbm',
+            'lightgbm_version': lgb.__version__,
+            'feature_columns': list(feature_columns),
+            'targets': targets,
+            'metrics': metrics or {},
+            'artifacts': sorted(artifacts or {})
+        }
+        manifest.update(extra or {})
+
+        # 版本目录已存在时（同一时刻的另一次保存）换一个版本号重试，不覆盖已发布的版本
+        base_version = version
+        for attempt in range(1, MAX_SAVE_ATTEMPTS + 1):
+            manifest['version'] = version
+            with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            final_dir = self.models_dir / version
+            try:
+                if final_dir.exists():
+                    raise FileExistsError(final_dir)
+                os.rename(tmp_dir, final_dir)
+                return self.get(version)
+            except OSError:
+                if not final_dir.exists():
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+                version = f'{base_version}_{attempt}'
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise FileExistsError(f"无法为模型分配唯一的版本号: {base_version}")
+
+    def versions(self):
+        """列出所有已发布的版本（从旧到新）"""
+        if not self.models_dir.exists():
+            return []
+        return sorted(
+            p.name for p in self.models_dir.iterdir()
+            if p.is_dir() and not p.name.startswith('.') and (p / MANIFEST_NAME).exists()
+        )
+
+    def get(self, version):
+        """获取指定版本（模型延迟加载）"""
+        path = self.models_dir / version
+        with open(path / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        def lazy(file_name):
+            model_file = str(path / file_name)
+            return LazyBooster(lambda: lgb.Booster(model_file=model_file), f'{version}/{file_name}')
+
+        boosters = {target: lazy(info['file']) for target, info in manifest['targets'].items()}
+        shards = {
+            shard: {target: lazy(file_name) for target, file_name in files.items()}
+            for shard, files in manifest.get('shards', {}).get('models', {}).items()
+        }
+        return ModelVersion(version, path, manifest, boosters, shards)
+
+    def latest(self):
+        """
+        获取最新版本
+
+        返回:
+            ModelVersion: 最新版本，没有注册的版本时返回 None
+        """
+        versions = self.versions()
+        return self.get(versions[-1]) if versions else None
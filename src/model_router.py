@@ -0,0 +1,91 @@
+"""
+分片模型路由模块
+
+这个模块把在线预测的特征矩阵按城市分派给分片模型，主要功能包括：
+1. 按特征矩阵中的 city_code 列查找城市所属的分片（查表，O(1)）
+2. 同一分片的行合并为一次 predict 调用，多个城市的批量预测仍然是每个分片一次调用
+3. 没有分配分片的城市（包括训练之后新出现的城市）使用全局模型
+4. 与 LightGBM Booster 相同的 predict 接口，预测引擎不需要区分全局模型和分片路由
+"""
+
+import numpy as np
+
+from src.prediction_engine import FEATURE_COLUMNS
+
+# 特征矩阵中城市编码所在的列
+CITY_CODE_INDEX = FEATURE_COLUMNS.index('city_code')
+
+
+class ShardRouter:
+    """
+    按城市把预测请求分派给分片模型
+
+    属性:
+        global_model: 全局模型，未分配分片的城市使用
+        shard_models (dict): {分片: 模型}
+        lookup (np.ndarray): 城市编码 -> 模型下标，最后一个下标为全局模型
+    """
+
+    def __init__(self, global_model, shard_models, assignment):
+        """
+        初始化路由器
+
+        参数:
+            global_model: 全局模型
+            shard_models (dict): {分片: 模型}
+            assignment (dict): {城市编码: 分片}，分片不在 shard_models 中的城市使用全局模型
+        """
+        self.global_model = global_model
+        self.shard_models = shard_models
+        self.shard_keys = sorted(shard_models)
+        self.models = [shard_models[key] for key in self.shard_keys] + [global_model]
+
+        global_index = len(self.shard_keys)
+        index = {key: i for i, key in enumerate(self.shard_keys)}
+        self.lookup = np.full(max(assignment, default=-1) + 1, global_index, dtype=np.int64)
+        for code, shard in assignment.items():
+            self.lookup[code] = index.get(shard, global_index)
+
+    def route(self, city_codes):
+        """获取每个城市编码对应的模型下标"""
+        codes = np.asarray(city_codes).astype(np.int64)
+        routes = np.full(len(codes), len(self.shard_keys), dtype=np.int64)
+        known = (codes >= 0) & (codes < len(self.lookup))
+        routes[known] = self.lookup[codes[known]]
+        return routes
+
+    def shard_of(self, city_code):
+        """获取城市所属的分片，使用全局模型时返回 None"""
+        route = self.route([city_code])[0]
+        return self.shard_keys[route] if route < len(self.shard_keys) else None
+
+    def predict(self, X, **kwargs):
+        """按城市分派预测（与 lgb.Booster.predict 相同）"""
+        routes = self.route(X[:, CITY_CODE_INDEX])
+        first = routes[0] if len(routes) else len(self.shard_keys)
+        if (routes == first).all():
+            return self.models[first].predict(X, **kwargs)
+
+        result = np.empty(len(X), dtype=np.float64)
+        for route in np.unique(routes):
+            rows = routes == route
+            result[rows] = self.models[route].predict(X[rows], **kwargs)
+        return result
+
+
+def build_model(version, target, use_shards=True):
+    """
+    获取模型版本中某个目标的预测模型
+
+    参数:
+        version (ModelVersion): 模型版本
+        target (str): 预测目标
+        use_shards (bool): 是否使用分片模型
+
+    返回:
+        版本中有分片模型时返回 ShardRouter，否则返回全局模型
+    """
+    shard_models = {shard: models[target] for shard, models in version.shards.items() if target in models}
+    if not use_shards or not shard_models:
+        return version.booster(target)
+    return ShardRouter(version.booster(target), shard_models, version.shard_assignment)
@@ -7,39 +7,72 @@
 3. 交叉验证
 4. 模型评估
 5. 特征重要性分析
+6. 无头模式：不输出进度动画，记录各阶段用时并输出 JSON 运行报告，便于定时任务自动重训
+7. 多目标训练：AQI 和 PM2.5 共用一个特征矩阵和一次分箱，可分配线程并行训练
+8. 超参数搜索：并行试验、提前停止和剪枝，最佳参数随模型版本保存
+9. 低内存加载：特征直接读入 float32 矩阵，可使用内存映射的缓存文件
+10. 增量训练：按年份或城市分区流式读取新数据，在已有模型上继续训练或重新拟合叶子值
+11. 分片模型：按省份或城市聚类训练分片模型（并行），与全局模型保存在同一个版本中
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import joblib
 from sklearn.model_selection import TimeSeriesSplit, cross_val_score
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.cluster import KMeans
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import xgboost as xgb
 import lightgbm as lgb
-from sklearn.preprocessing import StandardScaler
 from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import threading
 import time
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 import seaborn as sns
 import sys
-import os
-
-def clear_console():
-    """清除控制台输出"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+from src.processed_store import dataset_path
+from src.encoding_registry import EncodingRegistry, ENCODED_COLUMNS, registry_path
+from src.model_registry import ModelRegistry
+from src.hyperparameter_search import HyperparameterSearch
+from src.training_data import load_training_data, dataset_files, partition_files, sample_rows
 
 class AirQualityModelTrainer:
-    """空气质量预测模型训练器"""
+    """
+    空气质量预测模型训练器
+    
+    属性:
+        headless (bool): 无头模式，不输出进度信息和进度条，适合定时任务
+        stage_timings (dict): 各阶段累计用时（秒）
+        run_report (dict): 最近一次训练的运行报告
+    """
     
-    def __init__(self):
+    def __init__(self, headless=False):
         """初始化模型训练器"""
         self.root_dir = Path(__file__).parent.parent.absolute()
         self.data_dir = self.root_dir / 'data'
         self.processed_data_dir = self.data_dir / 'processed'
         self.models_dir = self.data_dir / 'models'
+        self.reports_dir = self.models_dir / 'reports'
+        
+        self.headless = headless
+        self._timing_lock = threading.Lock()
+        self.stage_timings = {}
+        self.target_reports = {}
+        self.run_report = None
+        
+        # 城市和省份编码注册表（与数据处理和在线预测共用）
+        self.encodings = EncodingRegistry(registry_path(self.processed_data_dir))
+        
+        # 模型注册表，以及每个目标的最佳模型
+        self.model_registry = ModelRegistry(self.models_dir)
+        self.best_models = {}
+        self.train_end = None  # 训练集的时间边界（不含），回测从这里开始
+        self.cache_dir = None  # 训练数组缓存目录，设置后以内存映射方式加载
         
         # 创建必要的目录
         self.models_dir.mkdir(parents=True, exist_ok=True)
@@ -57,27 +90,39 @@ class AirQualityModelTrainer:
             'city_code', 'province_code'
         ]
         
-        # 定义要训练的模型（大数据集优化配置）
-        self.models = {
-            'lgb': lgb.LGBMRegressor(
-                n_estimators=200,     # 增加树的数量以提高性能
-                max_depth=8,          # 增加深度以捕捉更复杂的模式
-                learning_rate=0.03,   # 降低学习率以提高稳定性
-                n_jobs=-1,            # 使用所有CPU核心
-                random_state=42,
-                verbose=0,            # 关闭默认进度显示，使用自定义进度
-                subsample=0.6,        # 降低采样率以加快训练
-                colsample_bytree=0.7, # 特征采样
-                num_leaves=64,        # 增加叶子节点数
-                min_child_samples=100,# 增加最小样本数防止过拟合
-                feature_fraction=0.7, # 每次迭代随机选择70%的特征
-                bagging_fraction=0.6, # 每次迭代随机选择60%的数据
-                bagging_freq=5,      # 每5次迭代进行一次bagging
-                lambda_l1=0.1,       # L1正则化
-                lambda_l2=0.1,       # L2正则化
-                max_bin=255         # 减少特征分箱数提高速度
-            )
+        # LightGBM 训练参数（所有目标共用）
+        self.lgb_params = {
+            'objective': 'regression',
+            'metric': 'rmse',
+            'boosting_type': 'gbdt',
+            'num_leaves': 64,
+            'learning_rate': 0.03,
+            'feature_fraction': 0.7,
+            'bagging_fraction': 0.7,
+            'bagging_freq': 5,
+            'max_depth': 8,
+            'min_child_samples': 100,
+            'lambda_l1': 0.1,
+            'lambda_l2': 0.1,
+            'max_bin': 255,
+            'force_col_wise': True,
+            'verbose': -1
         }
+        self.num_boost_round = 200  # 增加训练轮数
+        self.refit_decay_rate = 0.9  # 增量重新拟合时保留旧叶子值的比例
+        
+        # 定义要训练的模型（模型名称: 训练参数）
+        self.models = {'lgb': self.lgb_params}
+        
+        # 超参数搜索得到的各目标参数，{目标: {'params': ..., 'num_boost_round': ...}}
+        self.tuned_params = {}
+        self.tuning_reports = {}
+        
+        # 分片模型，{分片: {目标: 模型}}，以及城市编码到分片的分配
+        self.shard_by = None
+        self.shard_models = {}
+        self.shard_assignment = {}
+        self.shard_reports = {}
         
         # 评估指标
         self.metrics = {
@@ -86,166 +131,220 @@ class AirQualityModelTrainer:
             'r2': r2_score
         }
 
-    def print_progress(self, message, sleep_time=0.5):
-        """打印带有动画效果的进度信息"""
-        chars = "/—\\|"
-        for char in chars:
-            sys.stdout.write('\r' + char + ' ' + message)
-            sys.stdout.flush()
-            time.sleep(sleep_time)
-        sys.stdout.write('\r✓ ' + message + '\n')
-        sys.stdout.flush()
+    def print_progress(self, message):
+        """打印进度信息（无头模式下不打印）"""
+        if not self.headless:
+            print('✓ ' + message)
+    
+    @contextmanager
+    def timed(self, stage, target=None):
+        """记录一个阶段的用时，指定 target 时同时计入该目标的阶段用时"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._timing_lock:
+                self.stage_timings[stage] = self.stage_timings.get(stage, 0.0) + elapsed
+                if target is not None:
+                    stages = self.target_reports.setdefault(target, {}).setdefault('stages', {})
+                    stages[stage] = stages.get(stage, 0.0) + elapsed
     
-    def analyze_data_quality(self, df):
-        """分析数据质量"""
+    def analyze_data_quality(self, data):
+        """分析数据质量（缺失值在加载时已统计）"""
         print("\n[数据质量分析]")
-        self.print_progress("检查数据完整性...", 0.3)
-        missing_stats = df.isnull().sum()
+        self.print_progress("检查数据完整性...")
+        missing_stats = pd.Series(data.missing)
         if missing_stats.sum() > 0:
             print("\n发现缺失值:")
             print(missing_stats[missing_stats > 0])
         else:
             print("数据完整性良好，无缺失值")
         
-        self.print_progress("分析数据分布...", 0.3)
-        print("\n数值特征统计:")
-        print(df.describe().round(2))
+        # 分布统计需要对全部数据排序，无头模式下跳过
+        if not self.headless:
+            self.print_progress("分析数据分布...")
+            print("\n数值特征统计:")
+            print(pd.DataFrame(data.X, columns=data.feature_columns, copy=False).describe().round(2))
         
-        self.print_progress("检查特征相关性...", 0.3)
-        time.sleep(1)  # 展示分析过程
     
     def load_data(self):
-        """加载处理后的数据"""
+        """
+        加载处理后的数据
+
+        特征直接读入按时间排序的 float32 矩阵，不经过 float64 的 DataFrame；
+        设置了 cache_dir 时矩阵以内存映射方式保存和复用。
+
+        返回:
+            tuple: (特征矩阵, AQI, PM2.5, 时间戳)
+        """
         print("\n" + "="*50)
         print("第1阶段: 数据加载与预处理")
         print("="*50)
         
-        self.print_progress("初始化数据加载环境...", 0.5)
-        data_file = self.processed_data_dir / 'hourly_data_processed.csv'
+        self.print_progress("初始化数据加载环境...")
+        dataset = dataset_path(self.processed_data_dir)
         
-        self.print_progress("读取历史数据文件...", 0.5)
-        df = pd.read_csv(data_file, 
-                        usecols=self.feature_cols + ['aqi', 'pm25', 'date'])
+        self.print_progress("读取历史数据文件...")
+        data = load_training_data(dataset, self.feature_cols, ['aqi', 'pm25'], cache_dir=self.cache_dir)
         
-        print(f"\n总计读取 {len(df):,} 行数据")
+        print(f"\n总计读取 {len(data):,} 行数据 ({data.nbytes / 1024**2:.1f} MB)")
         
-        self.print_progress("处理时间序列特征...", 0.5)
-        df['timestamp'] = pd.to_datetime(df['date'])
-        df = df.sort_values('timestamp')
+        # 编码必须来自编码注册表，否则训练出的模型与在线预测的编码不一致
+        for i, col in enumerate(ENCODED_COLUMNS):
+            max_code = int(data.codes[:, i].max())
+            if max_code >= self.encodings.size(col):
+                raise ValueError(f"{col}_code 超出编码注册表范围，请重新运行数据处理")
         
         # 数据质量分析
-        self.analyze_data_quality(df[self.feature_cols])
+        self.analyze_data_quality(data)
         
-        # 分离特征和目标
-        X = df[self.feature_cols]
-        y_aqi = df['aqi']
-        y_pm25 = df['pm25']
-        
-        return X, y_aqi, y_pm25, df['timestamp']
+        return data.X, data.targets['aqi'], data.targets['pm25'], data.timestamps
     
-    def prepare_train_test_split(self, X, y, timestamps, test_size=0.2):
-        """准备训练集和测试集，考虑时间顺序"""
+    def prepare_train_test_split(self, X, targets, timestamps, test_size=0.2):
+        """
+        准备训练集和测试集，考虑时间顺序
+
+        所有预测目标共用同一个特征矩阵和划分点。树模型对特征的单调变换不敏感，
+        而在线预测直接使用原始特征，因此不做标准化。
+
+        参数:
+            X (np.ndarray): float32 特征矩阵（按时间排序）
+            targets (dict): {目标名称: 目标值数组}
+            timestamps (np.ndarray): 时间戳（已排序）
+            test_size (float): 测试集比例
+
+        返回:
+            tuple: (X_train, X_test, y_train, y_test, timestamps_test)，
+                其中 y_train/y_test 为 {目标名称: np.ndarray}
+        """
         print("\n" + "="*50)
-        print("第2阶段: 数据集划分与特征工程")
+        print("第2阶段: 数据集划分")
         print("="*50)
         
-        self.print_progress("计算最优划分点...", 0.5)
-        split_idx = int(len(X) * (1 - test_size))
-        
-        self.print_progress("划分训练集和测试集...", 0.5)
-        X_train = X.iloc[:split_idx]
-        X_test = X.iloc[split_idx:]
-        y_train = y.iloc[:split_idx]
-        y_test = y.iloc[split_idx:]
-        timestamps_test = timestamps.iloc[split_idx:]
-        
-        print(f"\n训练集: {len(X_train):,} 样本 ({(1-test_size)*100:.0f}%)")
-        print(f"测试集: {len(X_test):,} 样本 ({test_size*100:.0f}%)")
-        
-        self.print_progress("特征标准化...", 0.5)
-        scaler = StandardScaler()
+        with self.timed('split'):
+            # 划分点对齐到时间戳边界：同一小时的所有城市都在同一侧
+            self.print_progress("计算最优划分点...")
+            cutoff = timestamps[int(len(X) * (1 - test_size))]
+            split_idx = int(np.searchsorted(timestamps, cutoff, side='left'))
+            self.train_end = pd.Timestamp(cutoff)
+            
+            self.print_progress("划分训练集和测试集...")
+            # 连续的行切片，不复制特征矩阵
+            X_train = X[:split_idx]
+            X_test = X[split_idx:]
+            y_train = {name: y[:split_idx] for name, y in targets.items()}
+            y_test = {name: y[split_idx:] for name, y in targets.items()}
+            timestamps_test = timestamps[split_idx:]
         
-        self.print_progress("应用特征变换...", 0.5)
-        X_train_scaled = scaler.fit_transform(X_train.values)
-        X_test_scaled = scaler.transform(X_test.values)
+        print(f"\n训练集: {len(X_train):,} 样本 ({split_idx/len(X)*100:.0f}%)，截至 {self.train_end}")
+        print(f"测试集: {len(X_test):,} 样本 ({(1-split_idx/len(X))*100:.0f}%)")
         
-        return X_train_scaled, X_test_scaled, y_train.values, y_test.values, timestamps_test, scaler
+        return X_train, X_test, y_train, y_test, timestamps_test
+    
+    def build_datasets(self, X_train, X_test, y_train, y_test):
+        """
+        为所有预测目标构建 LightGBM 数据集，特征分箱只计算一次
+
+        第一个目标的数据集完成分箱后，其他目标通过 subset 复制已分箱的数据
+        （不重新分箱），再替换标签，因此各目标的数据集互相独立，可以并行训练。
+
+        返回:
+            dict: {目标名称: (训练数据集, 验证数据集)}
+        """
+        self.print_progress("构建共享的训练数据集...")
+        with self.timed('dataset'):
+            names = list(y_train)
+            dataset_params = {key: self.lgb_params[key] for key in ('max_bin', 'verbose')}
+            train_data = lgb.Dataset(X_train, label=y_train[names[0]], params=dataset_params, free_raw_data=False).construct()
+            valid_data = lgb.Dataset(X_test, label=y_test[names[0]], reference=train_data, free_raw_data=False).construct()
+            
+            datasets = {names[0]: (train_data, valid_data)}
+            train_rows, valid_rows = np.arange(len(X_train)), np.arange(len(X_test))
+            for name in names[1:]:
+                target_train = train_data.subset(train_rows).construct()
+                target_valid = valid_data.subset(valid_rows).construct()
+                target_train.set_label(y_train[name])
+                target_valid.set_label(y_test[name])
+                datasets[name] = (target_train, target_valid)
+        return datasets
     
-    def train_and_evaluate(self, X_train, X_test, y_train, y_test, target_name):
-        """训练和评估所有模型"""
+    def train_and_evaluate(self, train_data, valid_data, X_train, X_test, y_train, y_test, target_name,
+                           num_threads=0, show_progress=True):
+        """
+        训练和评估所有模型
+
+        参数:
+            train_data (lgb.Dataset): 已分箱的训练数据集
+            valid_data (lgb.Dataset): 已分箱的验证数据集
+            X_train, X_test (np.ndarray): 特征（用于评估）
+            y_train, y_test (np.ndarray): 该目标的标签
+            target_name (str): 目标名称
+            num_threads (int): LightGBM 线程数，0 表示使用默认值
+            show_progress (bool): 是否显示进度条（并行训练时关闭）
+        """
         print("\n" + "="*50)
         print(f"第3阶段: {target_name}预测模型训练")
         print("="*50)
         
         results = {}
         
-        for model_name, model in self.models.items():
+        for model_name, model_params in self.models.items():
             print(f"\n[{model_name}模型训练]")
             start_time = time.time()
             
-            self.print_progress("初始化模型配置...", 0.5)
-            print(f"训练数据维度: X_train{X_train.shape}, y_train{y_train.shape}")
-            
-            self.print_progress("准备训练数据集...", 0.5)
-            train_data = lgb.Dataset(X_train, label=y_train)
-            valid_data = lgb.Dataset(X_test, label=y_test, reference=train_data)
-            
-            # 配置训练参数
-            params = {
-                'objective': 'regression',
-                'metric': 'rmse',
-                'boosting_type': 'gbdt',
-                'num_leaves': 64,
-                'learning_rate': 0.03,
-                'feature_fraction': 0.7,
-                'bagging_fraction': 0.7,
-                'bagging_freq': 5,
-                'max_depth': 8,
-                'min_child_samples': 100,
-                'lambda_l1': 0.1,
-                'lambda_l2': 0.1,
-                'max_bin': 255,
-                'force_col_wise': True
-            }
-            
-            print("\n[模型训练进度]")
-            num_boost_round = 200  # 增加训练轮数
-            
-            # 使用tqdm创建进度条
-            with tqdm(total=num_boost_round, desc="训练进度", ncols=100) as pbar:
-                def callback(env):
-                    pbar.update(1)
-                    if env.iteration % 20 == 0:  # 每20轮显示一次指标
-                        print(f"\n当前轮次: {env.iteration}/{num_boost_round}")
-                        print(f"训练RMSE: {env.evaluation_result_list[0][2]:.4f}")
-                        print(f"验证RMSE: {env.evaluation_result_list[1][2]:.4f}")
+            with self.timed('train', target_name):
+                self.print_progress("初始化模型配置...")
+                print(f"训练数据维度: X_train{X_train.shape}, y_train{y_train.shape}")
                 
-                gbm = lgb.train(
-                    params,
-                    train_data,
+                params, num_boost_round = self.target_config(target_name, model_params)
+                params['num_threads'] = num_threads
+                train_kwargs = dict(
                     num_boost_round=num_boost_round,
                     valid_sets=[train_data, valid_data],
-                    valid_names=['train', 'valid'],
-                    callbacks=[callback]
+                    valid_names=['train', 'valid']
                 )
+                
+                if self.headless or not show_progress:
+                    gbm = lgb.train(params, train_data, **train_kwargs)
+                else:
+                    print("\n[模型训练进度]")
+                    # 使用tqdm创建进度条
+                    with tqdm(total=num_boost_round, desc="训练进度", ncols=100) as pbar:
+                        def callback(env):
+                            pbar.update(1)
+                            if env.iteration % 20 == 0:  # 每20轮显示一次指标
+                                print(f"\n当前轮次: {env.iteration}/{num_boost_round}")
+                                print(f"训练RMSE: {env.evaluation_result_list[0][2]:.4f}")
+                                print(f"验证RMSE: {env.evaluation_result_list[1][2]:.4f}")
+                        
+                        gbm = lgb.train(params, train_data, callbacks=[callback], **train_kwargs)
             
             train_time = time.time() - start_time
-            print(f"\n训练完成! 用时: {train_time:.2f}秒 ({train_time/60:.2f}分钟)")
-            
-            self.print_progress("计算模型评估指标...", 0.5)
-            y_pred_train = gbm.predict(X_train)
-            y_pred_test = gbm.predict(X_test)
+            print(f"\n{target_name}训练完成! 用时: {train_time:.2f}秒 ({train_time/60:.2f}分钟)")
             
-            metrics_train = {
-                name: metric(y_train, y_pred_train)
-                for name, metric in self.metrics.items()
-            }
-            metrics_test = {
-                name: metric(y_test, y_pred_test)
-                for name, metric in self.metrics.items()
-            }
+            with self.timed('evaluate', target_name):
+                self.print_progress("计算模型评估指标...")
+                y_pred_train = gbm.predict(X_train, num_threads=num_threads)
+                y_pred_test = gbm.predict(X_test, num_threads=num_threads)
+                
+                metrics_train = {
+                    name: metric(y_train, y_pred_train)
+                    for name, metric in self.metrics.items()
+                }
+                metrics_test = {
+                    name: metric(y_test, y_pred_test)
+                    for name, metric in self.metrics.items()
+                }
+                
+                self.print_progress("分析特征重要性...")
+                importance = pd.DataFrame({
+                    'feature': self.feature_cols,
+                    'importance': gbm.feature_importance()
+                })
+                importance = importance.sort_values('importance', ascending=False)
             
-            print("\n[模型评估结果]")
+            print(f"\n[{target_name}模型评估结果]")
             print("\n训练集指标:")
             for metric_name, value in metrics_train.items():
                 print(f"{metric_name}: {value:.4f}")
@@ -253,73 +352,607 @@ class AirQualityModelTrainer:
             for metric_name, value in metrics_test.items():
                 print(f"{metric_name}: {value:.4f}")
             
-            self.print_progress("分析特征重要性...", 0.5)
-            importance = pd.DataFrame({
-                'feature': self.feature_cols,
-                'importance': gbm.feature_importance()
-            })
-            importance = importance.sort_values('importance', ascending=False)
-            print("\n最重要的10个特征:")
-            print(importance.head(10))
+            if not self.headless:
+                print("\n最重要的10个特征:")
+                print(importance.head(10))
             
             results[model_name] = {
                 'model': gbm,
                 'train_metrics': metrics_train,
                 'test_metrics': metrics_test,
                 'predictions': y_pred_test,
-                'training_time': train_time
+                'training_time': train_time,
+                'importance': importance
             }
         
         print("\n" + "="*50)
         print("第4阶段: 模型保存与部署")
         print("="*50)
         
-        self.print_progress("选择最佳模型...", 0.5)
+        self.print_progress("选择最佳模型...")
         best_model_name = min(results.keys(), key=lambda k: results[k]['test_metrics']['rmse'])
-        best_model = results[best_model_name]['model']
+        best = results[best_model_name]
+        self.best_models[target_name] = best
+        print(f"\n{target_name}最佳模型: {best_model_name}")
         
-        self.print_progress("保存模型文件...", 0.5)
-        model_file = self.models_dir / f'best_{target_name}_model_{datetime.now().strftime("%Y%m%d_%H%M")}.joblib'
-        joblib.dump(best_model, model_file)
-        print(f"\n最佳模型({best_model_name})已保存至: {model_file}")
+        self.target_reports.setdefault(target_name, {}).update({
+            'model': best_model_name,
+            'num_trees': best['model'].num_trees(),
+            'params': self.target_config(target_name, self.models[best_model_name])[0],
+            'train_metrics': {name: float(value) for name, value in best['train_metrics'].items()},
+            'test_metrics': {name: float(value) for name, value in best['test_metrics'].items()},
+            'top_features': best['importance'].head(10)['feature'].tolist()
+        })
         
         return results
     
-    def run_training(self):
-        """运行完整的训练流程"""
+    def target_config(self, target_name, model_params=None):
+        """
+        获取目标的训练参数和训练轮数（有超参数搜索结果时使用搜索结果）
+
+        返回:
+            tuple: (参数, 训练轮数)
+        """
+        params = dict(model_params if model_params is not None else self.lgb_params)
+        tuned = self.tuned_params.get(target_name)
+        if tuned is None:
+            return params, self.num_boost_round
+        params.update(tuned['params'])
+        return params, tuned['num_boost_round']
+    
+    def tune_hyperparameters(self, datasets, timestamps_train, n_trials=20, workers=1, valid_size=0.2):
+        """
+        为每个目标搜索超参数
+
+        验证集取训练集中最后一段时间（按时间戳边界划分），测试集不参与参数选择。
+        验证集从已分箱的训练数据集中取子集，不重新分箱。
+
+        参数:
+            datasets (dict): {目标名称: (训练数据集, 验证数据集)}
+            timestamps_train (np.ndarray): 训练集的时间戳（已排序）
+            n_trials (int): 每个目标的试验次数
+            workers (int): 并行试验的进程数
+            valid_size (float): 验证集占训练集的比例
+        """
+        print("\n" + "="*50)
+        print("超参数搜索")
+        print("="*50)
+        
+        ordered = timestamps_train
+        cutoff = ordered[int(len(ordered) * (1 - valid_size))]
+        split_idx = int(np.searchsorted(ordered, cutoff, side='left'))
+        print(f"\n搜索训练集: {split_idx:,} 样本，验证集: {len(ordered) - split_idx:,} 样本 (自 {pd.Timestamp(cutoff)})")
+        
+        for name, (train_data, _) in datasets.items():
+            print(f"\n[{name}超参数搜索] {n_trials} 次试验，{workers} 个进程")
+            with self.timed('tune', name):
+                tune_train = train_data.subset(np.arange(split_idx)).construct()
+                tune_valid = train_data.subset(np.arange(split_idx, len(ordered))).construct()
+                search = HyperparameterSearch(self.lgb_params, n_trials=n_trials, workers=workers)
+                result = search.run(tune_train, tune_valid, work_dir=self.models_dir)
+            
+            best = result['best']
+            self.tuned_params[name] = {'params': best['params'], 'num_boost_round': best['num_boost_round']}
+            self.tuning_reports[name] = result
+            print(f"{name}最佳试验: {best['trial']}，验证RMSE {best['rmse']:.4f}，"
+                  f"训练轮数 {best['num_boost_round']}，剪枝 {result['pruned']}/{n_trials}")
+    
+    def assign_shards(self, X_train, y_train, shard_by='province', n_clusters=8):
+        """
+        把城市分配到分片
+
+        参数:
+            X_train (np.ndarray): 训练特征
+            y_train (dict): {目标名称: 训练标签}
+            shard_by (str): 'province' 按省份分片；'cluster' 按各城市逐月平均 AQI/PM2.5 曲线聚类
+            n_clusters (int): 聚类分片的数量
+
+        返回:
+            dict: {城市编码: 分片名}
+        """
+        city_codes = X_train[:, self.feature_cols.index('city_code')].astype(np.int64)
+        if shard_by == 'province':
+            province_codes = X_train[:, self.feature_cols.index('province_code')].astype(np.int64)
+            pairs = np.unique(np.stack([city_codes, province_codes], axis=1), axis=0)
+            return {int(city): f'province_{int(province)}' for city, province in pairs}
+        if shard_by != 'cluster':
+            raise ValueError(f"不支持的分片方式: {shard_by}")
+        
+        # 每个城市的逐月平均值曲线（缺少的月份用该城市的总体平均值填充）
+        cities, city_index = np.unique(city_codes, return_inverse=True)
+        cells = city_index * 12 + X_train[:, self.feature_cols.index('month')].astype(np.int64) - 1
+        counts = np.bincount(cells, minlength=len(cities) * 12).reshape(len(cities), 12)
+        profiles = []
+        for y in y_train.values():
+            sums = np.bincount(cells, weights=y, minlength=len(cities) * 12).reshape(len(cities), 12)
+            overall = sums.sum(axis=1) / counts.sum(axis=1)
+            profiles.append(np.where(counts > 0, sums / np.maximum(counts, 1), overall[:, np.newaxis]))
+        profiles = np.hstack(profiles)
+        profiles = (profiles - profiles.mean(axis=0)) / (profiles.std(axis=0) + 1e-9)
+        
+        labels = KMeans(n_clusters=min(n_clusters, len(cities)), n_init=10, random_state=42).fit_predict(profiles)
+        return {int(city): f'cluster_{int(label)}' for city, label in zip(cities, labels)}
+    
+    def train_shards(self, datasets, X_train, X_test, y_train, y_test, shard_by='province', n_clusters=8,
+                     min_shard_rows=5000, parallel=True):
+        """
+        训练分片模型
+
+        每个分片的训练集是全局训练集中所属城市行的子集（已分箱的数据，不重新分箱），各分片和目标并行训练。
+        训练样本太少的分片不训练，其城市在线预测时使用全局模型。
+
+        参数:
+            datasets (dict): {目标名称: (训练数据集, 验证数据集)}，提供分箱
+            X_train, X_test (np.ndarray): 特征
+            y_train, y_test (dict): {目标名称: 标签}
+            shard_by (str): 'province' 或 'cluster'
+            n_clusters (int): 聚类分片的数量
+            min_shard_rows (int): 分片的最少训练样本数
+            parallel (bool): 是否并行训练（CPU 线程平均分配给各分片）
+        """
+        print("\n" + "="*50)
+        print(f"分片模型训练（按{'省份' if shard_by == 'province' else '城市聚类'}）")
+        print("="*50)
+        
+        self.print_progress("分配城市到分片...")
+        assignment = self.assign_shards(X_train, y_train, shard_by, n_clusters)
+        shard_keys = sorted(set(assignment.values()))
+        lookup = np.full(self.encodings.size('city'), -1, dtype=np.int64)
+        for city, shard in assignment.items():
+            lookup[city] = shard_keys.index(shard)
+        
+        code_index = self.feature_cols.index('city_code')
+        train_shard = lookup[X_train[:, code_index].astype(np.int64)]
+        test_shard = lookup[X_test[:, code_index].astype(np.int64)]
+        train_rows = np.bincount(train_shard[train_shard >= 0], minlength=len(shard_keys))
+        trained = [i for i, rows in enumerate(train_rows) if rows >= min_shard_rows]
+        skipped = len(shard_keys) - len(trained)
+        print(f"\n{len(shard_keys)} 个分片，训练 {len(trained)} 个" + (f"（{skipped} 个样本不足，使用全局模型）" if skipped else ""))
+        
+        jobs = [(i, target) for i in trained for target in y_train]
+        workers = max(1, min(len(jobs), os.cpu_count() or 1)) if parallel else 1
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        
+        def train_job(i, target):
+            rows = np.nonzero(train_shard == i)[0]
+            with self.timed('shard_train'):
+                params, num_boost_round = self.target_config(target)
+                params['num_threads'] = num_threads
+                # 从全局数据集中取出已分箱的行（与 build_datasets 相同），不重新分箱也不复制特征矩阵
+                train_set = datasets[target][0].subset(rows).construct()
+                train_set.set_label(y_train[target][rows])
+                return lgb.train(params, train_set, num_boost_round=num_boost_round)
+        
+        with self.timed('shard_wall'):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {job: executor.submit(train_job, *job) for job in jobs}
+                boosters = {job: future.result() for job, future in futures.items()}
+        
+        # 评估：每个分片的测试样本上对比分片模型和全局模型，以及路由后的整体测试指标
+        self.print_progress("评估分片模型...")
+        reports = {shard_keys[i]: {'cities': int((lookup == i).sum()), 'train_rows': int(train_rows[i])} for i in trained}
+        with self.timed('shard_evaluate'):
+            for target in y_train:
+                global_pred = self.best_models[target]['predictions']
+                routed = global_pred.copy()
+                for i in trained:
+                    rows = test_shard == i
+                    if not rows.any():
+                        continue
+                    routed[rows] = boosters[(i, target)].predict(X_test[rows])
+                    reports[shard_keys[i]][target] = {
+                        'rmse': float(self.metrics['rmse'](y_test[target][rows], routed[rows])),
+                        'global_rmse': float(self.metrics['rmse'](y_test[target][rows], global_pred[rows]))
+                    }
+                routed_metrics = {name: float(metric(y_test[target], routed)) for name, metric in self.metrics.items()}
+                self.target_reports.setdefault(target, {})['routed_test_metrics'] = routed_metrics
+                print(f"{target} 测试集RMSE: 全局模型 {self.best_models[target]['test_metrics']['rmse']:.4f}，"
+                      f"分片路由 {routed_metrics['rmse']:.4f}")
+        
+        self.shard_by = shard_by
+        self.shard_models = {shard_keys[i]: {target: boosters[(i, target)] for target in y_train} for i in trained}
+        self.shard_assignment = {city: shard for city, shard in assignment.items() if shard in self.shard_models}
+        self.shard_reports = reports
+    
+    def save_models(self, extra=None, artifacts=None):
+        """
+        将各目标的最佳模型作为一个新版本保存到模型注册表
+
+        参数:
+            extra (dict): 写入清单的其他信息
+            artifacts (dict): 随版本保存的附加文件，{文件名: 写入函数}
+        """
+        self.print_progress("保存模型文件...")
+        extra = dict(extra or {})
+        artifacts = dict(artifacts or {})
+        if self.shard_models:
+            files = {
+                shard: {target: f'shard_{shard}_{target}.txt' for target in models}
+                for shard, models in self.shard_models.items()
+            }
+            for shard, models in self.shard_models.items():
+                for target, booster in models.items():
+                    artifacts[files[shard][target]] = booster.save_model
+            extra['shards'] = {
+                'by': self.shard_by,
+                'assignment': {str(code): shard for code, shard in sorted(self.shard_assignment.items())},
+                'models': files,
+                'metrics': self.shard_reports
+            }
+        
+        with self.timed('save'):
+            version = self.model_registry.save(
+                {target: result['model'] for target, result in self.best_models.items()},
+                feature_columns=self.feature_cols,
+                metrics={
+                    target: {name: float(value) for name, value in result['test_metrics'].items()}
+                    for target, result in self.best_models.items()
+                },
+                extra={
+                    'encodings': {col: self.encodings.size(col) for col in ENCODED_COLUMNS},
+                    'train_end': self.train_end.isoformat() if self.train_end is not None else None,
+                    'params': {
+                        target: dict(zip(('params', 'num_boost_round'), self.target_config(target)))
+                        for target in self.best_models
+                    },
+                    'tuning': self.tuning_reports or None,
+                    **extra
+                },
+                artifacts=artifacts or None
+            )
+        print(f"\n模型版本 {version.version} 已保存至: {version.path}")
+        return version
+    
+    def write_report(self, report, report_path=None):
+        """
+        保存 JSON 运行报告
+
+        参数:
+            report (dict): 运行报告
+            report_path (Path): 报告文件路径，默认为 data/models/reports/train_<时间>.json
+
+        返回:
+            Path: 报告文件路径
+        """
+        if report_path is None:
+            self.reports_dir.mkdir(parents=True, exist_ok=True)
+            report_path = self.reports_dir / f"train_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report_path
+    
+    def run_training(self, report_path=None, parallel=False, tune_trials=0, tune_workers=1, shard_by=None,
+                     n_clusters=8):
+        """
+        运行完整的训练流程
+
+        参数:
+            report_path (Path): JSON 运行报告的保存路径，默认保存在 data/models/reports/
+            parallel (bool): 是否并行训练各目标（CPU 线程平均分配给各目标）
+            tune_trials (int): 每个目标的超参数搜索试验次数，0 表示使用默认参数
+            tune_workers (int): 超参数搜索的并行进程数
+            shard_by (str): 同时训练分片模型，'province' 按省份，'cluster' 按城市聚类，None 表示不训练
+            n_clusters (int): 按城市聚类分片时的分片数量
+
+        返回:
+            dict: 运行报告（各阶段用时、各目标的评估指标、模型版本）
+        """
         print("\n" + "="*50)
         print("空气质量预测模型训练系统 v2.0")
         print("="*50)
         
+        started_at = datetime.now()
         total_start_time = time.time()
+        self.stage_timings = {}
+        self.target_reports = {}
+        self.tuned_params = {}
+        self.tuning_reports = {}
+        self.shard_models = {}
+        self.shard_assignment = {}
+        self.shard_reports = {}
         
         # 加载数据
-        X, y_aqi, y_pm25, timestamps = self.load_data()
+        with self.timed('load'):
+            X, y_aqi, y_pm25, timestamps = self.load_data()
         print(f"\n数据集概况:")
         print(f"- 特征数量: {X.shape[1]}")
         print(f"- 样本数量: {X.shape[0]:,}")
-        print(f"- 时间跨度: {timestamps.min().strftime('%Y-%m-%d')} 至 {timestamps.max().strftime('%Y-%m-%d')}")
+        start_date, end_date = (pd.Timestamp(t).strftime('%Y-%m-%d') for t in (timestamps[0], timestamps[-1]))
+        print(f"- 时间跨度: {start_date} 至 {end_date}")
         
-        # 训练AQI预测模型
-        print("\n开始AQI预测模型训练流程...")
-        X_train, X_test, y_train, y_test, timestamps_test, scaler = self.prepare_train_test_split(X, y_aqi, timestamps)
-        aqi_results = self.train_and_evaluate(X_train, X_test, y_train, y_test, 'AQI')
+        # 所有目标共用一次划分和一次分箱
+        targets = {'AQI': y_aqi, 'PM2.5': y_pm25}
+        X_train, X_test, y_train, y_test, timestamps_test = self.prepare_train_test_split(X, targets, timestamps)
+        datasets = self.build_datasets(X_train, X_test, y_train, y_test)
         
-        # 训练PM2.5预测模型
-        print("\n开始PM2.5预测模型训练流程...")
-        X_train, X_test, y_train, y_test, timestamps_test, scaler = self.prepare_train_test_split(X, y_pm25, timestamps)
-        pm25_results = self.train_and_evaluate(X_train, X_test, y_train, y_test, 'PM2.5')
+        if tune_trials > 0:
+            self.tune_hyperparameters(datasets, timestamps[:len(X_train)], tune_trials, tune_workers)
+        
+        def train_target(name, num_threads=0, show_progress=True):
+            train_data, valid_data = datasets[name]
+            return self.train_and_evaluate(
+                train_data, valid_data, X_train, X_test, y_train[name], y_test[name], name,
+                num_threads=num_threads, show_progress=show_progress
+            )
+        
+        with self.timed('train_wall'):
+            if parallel:
+                # 线程预算平均分配给各目标（LightGBM 训练时释放 GIL）
+                num_threads = max(1, (os.cpu_count() or 1) // len(targets))
+                print(f"\n并行训练 {len(targets)} 个目标，每个目标 {num_threads} 个线程...")
+                with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                    futures = [executor.submit(train_target, name, num_threads, False) for name in targets]
+                    for future in futures:
+                        future.result()
+            else:
+                for name in targets:
+                    print(f"\n开始{name}预测模型训练流程...")
+                    train_target(name)
+        
+        if shard_by is not None:
+            self.train_shards(datasets, X_train, X_test, y_train, y_test, shard_by, n_clusters)
+        
+        # 两个目标的模型（以及分片模型）保存为同一个版本
+        version = self.save_models()
         
         total_time = time.time() - total_start_time
         print("\n" + "="*50)
         print("训练完成!")
         print(f"总用时: {total_time:.2f}秒 ({total_time/60:.2f}分钟)")
+        for stage, seconds in self.stage_timings.items():
+            print(f"- {stage}: {seconds:.2f}秒")
+        print("="*50)
+        
+        # 运行报告
+        self.run_report = {
+            'started_at': started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'total_seconds': total_time,
+            'stages': self.stage_timings,
+            'data': {
+                'rows': int(X.shape[0]),
+                'features': int(X.shape[1]),
+                'start': start_date,
+                'end': end_date
+            },
+            'targets': self.target_reports,
+            'parallel': parallel,
+            'tuning': {
+                target: {key: value for key, value in report.items() if key != 'trials'}
+                for target, report in self.tuning_reports.items()
+            },
+            'shards': {'by': shard_by, 'shards': self.shard_reports} if self.shard_models else None,
+            'model_version': version.version
+        }
+        report_file = self.write_report(self.run_report, report_path)
+        print(f"运行报告已保存至: {report_file}")
+        
+        return self.run_report
+    
+    def incremental_base(self):
+        """获取最新的增量训练模型版本（清单中有 incremental 记录），没有时返回 None"""
+        for version in reversed(self.model_registry.versions()):
+            model_version = self.model_registry.get(version)
+            if 'incremental' in model_version.manifest:
+                return model_version
+        return None
+    
+    @staticmethod
+    def accumulated_metrics(totals):
+        """由累计的 [行数, 平方误差和, 绝对误差和, y和, y平方和] 计算 rmse/mae/r2（与 self.metrics 一致）"""
+        n, sse, sae, y_sum, y_sq_sum = totals
+        sst = y_sq_sum - y_sum ** 2 / n
+        return {
+            'rmse': float(np.sqrt(sse / n)),
+            'mae': float(sae / n),
+            'r2': float(1 - sse / sst) if sst > 0 else float('nan')
+        }
+
+    def run_incremental_training(self, partition_by='year', rounds_per_partition=50, refit=False,
+                                 bin_sample_rows=200000, report_path=None):
+        """
+        增量训练：按分区流式读取新数据，在最新的增量模型版本上继续训练
+
+        内存中每次只有一个分区的数据。模型清单记录每个城市已训练到的时间，
+        之后的运行只读取修改时间更新的数据文件中晚于这个时间的行，因此每晚的数据处理
+        之后只需要训练新增的数据；重新处理全部数据也不会重复训练已训练过的小时。
+        特征分箱由第一次运行的抽样数据计算，作为 bins.bin 随模型版本保存，之后的分区都使用同一组分箱。
+        第一次运行（没有增量模型版本）时依次训练全部分区。
+
+        参数:
+            partition_by (str): 'year' 或 'city'，流式读取的分区粒度
+            rounds_per_partition (int): 每个分区继续训练的轮数（按城市分区时每个城市都会增加这么多棵树）
+            refit (bool): 只用新数据重新拟合已有树的叶子值，不增加新树（需要已有的增量模型版本）
+            bin_sample_rows (int): 计算分箱的抽样行数
+            report_path (Path): JSON 运行报告的保存路径
+
+        返回:
+            dict: 运行报告，没有新数据时返回 None
+        """
+        print("\n" + "="*50)
+        print("空气质量预测模型增量训练")
+        print("="*50)
+        
+        started_at = datetime.now()
+        total_start_time = time.time()
+        self.stage_timings = {}
+        self.target_reports = {}
+        self.tuned_params = {}
+        self.tuning_reports = {}
+        self.shard_models = {}
+        targets = {'AQI': 'aqi', 'PM2.5': 'pm25'}
+        
+        dataset = dataset_path(self.processed_data_dir)
+        base = self.incremental_base()
+        if refit and base is None:
+            raise ValueError("重新拟合需要已有的增量训练模型版本")
+        
+        # 每个城市已训练到的小时（自1970年起的小时数），以及已训练数据文件的最新修改时间
+        watermark = np.full(self.encodings.size('city'), np.iinfo(np.int64).min, dtype=np.int64)
+        files_mtime_ns = 0
+        if base is not None:
+            state = base.manifest['incremental']
+            for code, until in state['trained_until'].items():
+                watermark[int(code)] = np.datetime64(until, 'h').astype(np.int64)
+            files_mtime_ns = state['files_mtime_ns']
+            self.tuned_params = {
+                target: config for target, config in base.manifest.get('params', {}).items()
+                if target in targets
+            }
+            print(f"\n基础模型版本: {base.version}")
+        
+        files = [f for f in dataset_files(dataset) if f.stat().st_mtime_ns > files_mtime_ns]
+        if not files:
+            print("\n没有新的数据文件，模型无需更新")
+            return None
+        latest_mtime_ns = max(f.stat().st_mtime_ns for f in files)
+        
+        # 分箱：沿用基础版本保存的分箱，第一次运行时由抽样数据计算
+        dataset_params = {key: self.lgb_params[key] for key in ('max_bin', 'verbose')}
+        with self.timed('bins'):
+            bins_path = base.artifact('bins.bin') if base is not None else None
+            if bins_path is not None:
+                reference = lgb.Dataset(str(bins_path), params=dataset_params).construct()
+            else:
+                self.print_progress("抽样计算特征分箱...")
+                sample = sample_rows(files, self.feature_cols, bin_sample_rows)
+                reference = lgb.Dataset(sample, params=dataset_params, free_raw_data=False).construct()
+                del sample
+        
+        boosters = {target: base.booster(target).booster for target in targets} if base is not None else {}
+        # 更新前在新数据上的误差，按行累计所有分区：{目标: [行数, 平方误差和, 绝对误差和, y和, y平方和]}
+        forward_errors = {}
+        trained_partitions = []
+        total_rows = 0
+        
+        for key, part_files in partition_files(files, partition_by).items():
+            with self.timed('load'):
+                data = load_training_data(dataset, self.feature_cols, list(targets.values()),
+                                          files=part_files, after=watermark)
+            if len(data) == 0:
+                continue
+            print(f"\n[分区 {key}] {len(data):,} 行新数据")
+            
+            for name, col in targets.items():
+                y = data.targets[col]
+                booster = boosters.get(name)
+                # 更新前先在新数据上评估，得到模型对未见过数据的误差
+                if booster is not None:
+                    with self.timed('evaluate', name):
+                        y_true = y.astype(np.float64)
+                        err = booster.predict(data.X) - y_true
+                        forward_errors.setdefault(name, np.zeros(5))[:] += [
+                            len(y_true), np.dot(err, err), np.abs(err).sum(), y_true.sum(), np.dot(y_true, y_true)
+                        ]
+                    print(f"{name} 本分区更新前 RMSE: {np.sqrt(np.dot(err, err) / len(err)):.4f}")
+                
+                with self.timed('train', name):
+                    if refit:
+                        boosters[name] = booster.refit(data.X, y, decay_rate=self.refit_decay_rate,
+                                                       reference=reference)
+                    else:
+                        params, _ = self.target_config(name)
+                        train_set = lgb.Dataset(data.X, label=y, reference=reference)
+                        boosters[name] = lgb.train(params, train_set, num_boost_round=rounds_per_partition,
+                                                   init_model=booster, keep_training_booster=True)
+            
+            # 更新各城市的水位
+            hours = data.timestamps.astype(np.int64)
+            np.maximum.at(watermark, data.codes[:, 0], hours)
+            trained_partitions.append(key)
+            total_rows += len(data)
+            del data
+        
+        if not trained_partitions:
+            print("\n新的数据文件中没有未训练过的数据，模型无需更新")
+            return None
+        
+        forward_metrics = {name: self.accumulated_metrics(totals) for name, totals in forward_errors.items()}
+        for name, metrics in forward_metrics.items():
+            print(f"\n{name} 更新前 RMSE（全部新数据）: {metrics['rmse']:.4f}, MAE: {metrics['mae']:.4f}, R2: {metrics['r2']:.4f}")
+        
+        trained = watermark > np.iinfo(np.int64).min
+        self.train_end = pd.Timestamp(np.datetime64(int(watermark[trained].max()), 'h')) + pd.Timedelta(hours=1)
+        self.best_models = {
+            name: {'model': booster, 'test_metrics': forward_metrics.get(name, {})}
+            for name, booster in boosters.items()
+        }
+        for name, booster in boosters.items():
+            self.target_reports.setdefault(name, {}).update({
+                'num_trees': booster.num_trees(),
+                'forward_metrics': forward_metrics.get(name)
+            })
+        
+        incremental = {
+            'base_version': base.version if base is not None else None,
+            'mode': 'refit' if refit else 'boost',
+            'partition_by': partition_by,
+            'rounds_per_partition': None if refit else rounds_per_partition,
+            'partitions': trained_partitions,
+            'rows': total_rows,
+            'files_mtime_ns': latest_mtime_ns,
+            'trained_until': {
+                str(code): str(np.datetime64(int(watermark[code]), 'h'))
+                for code in np.nonzero(trained)[0]
+            }
+        }
+        version = self.save_models(extra={'incremental': incremental},
+                                   artifacts={'bins.bin': reference.save_binary})
+        
+        total_time = time.time() - total_start_time
+        print("\n" + "="*50)
+        print(f"增量训练完成! {len(trained_partitions)} 个分区，{total_rows:,} 行新数据")
+        print(f"总用时: {total_time:.2f}秒 ({total_time/60:.2f}分钟)")
         print("="*50)
+        
+        self.run_report = {
+            'started_at': started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'total_seconds': total_time,
+            'stages': self.stage_timings,
+            'incremental': {key: value for key, value in incremental.items() if key != 'trained_until'},
+            'targets': self.target_reports,
+            'model_version': version.version
+        }
+        report_file = self.write_report(self.run_report, report_path)
+        print(f"运行报告已保存至: {report_file}")
+        
+        return self.run_report
 
 def main():
-    """主函数"""
-    trainer = AirQualityModelTrainer()
-    trainer.run_training()
+    """
+    主函数
+
+    使用 --headless 参数时不输出进度信息和进度条（适合定时任务），
+    --report PATH 指定 JSON 运行报告的保存路径，--parallel 并行训练 AQI 和 PM2.5 模型，
+    --tune N 训练前为每个目标运行 N 次超参数搜索试验，--tune-workers N 指定并行试验的进程数，
+    --mmap 把训练数组缓存在 data/processed/training_cache/ 中并以内存映射方式加载，
+    --incremental 只训练新数据（--partition-by year|city 分区粒度，--rounds N 每个分区的训练轮数，
+    --refit 只重新拟合叶子值），--shards province|cluster 同时训练分片模型（--clusters N 聚类分片数）
+    """
+    report_path = None
+    if '--report' in sys.argv:
+        report_path = sys.argv[sys.argv.index('--report') + 1]
+    
+    tune_trials = int(sys.argv[sys.argv.index('--tune') + 1]) if '--tune' in sys.argv else 0
+    tune_workers = int(sys.argv[sys.argv.index('--tune-workers') + 1]) if '--tune-workers' in sys.argv else 1
+    
+    trainer = AirQualityModelTrainer(headless='--headless' in sys.argv)
+    if '--mmap' in sys.argv:
+        trainer.cache_dir = trainer.processed_data_dir / 'training_cache'
+    if '--incremental' in sys.argv:
+        partition_by = sys.argv[sys.argv.index('--partition-by') + 1] if '--partition-by' in sys.argv else 'year'
+        rounds = int(sys.argv[sys.argv.index('--rounds') + 1]) if '--rounds' in sys.argv else 50
+        trainer.run_incremental_training(partition_by=partition_by, rounds_per_partition=rounds,
+                                         refit='--refit' in sys.argv, report_path=report_path)
+    else:
+        shard_by = sys.argv[sys.argv.index('--shards') + 1] if '--shards' in sys.argv else None
+        n_clusters = int(sys.argv[sys.argv.index('--clusters') + 1]) if '--clusters' in sys.argv else 8
+        trainer.run_training(report_path=report_path, parallel='--parallel' in sys.argv,
+                             tune_trials=tune_trials, tune_workers=tune_workers,
+                             shard_by=shard_by, n_clusters=n_clusters)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+模型热切换模块
+
+这个模块在后台线程中监视模型注册表，新版本通过验证后不停机地替换在线预测模型，主要功能包括：
+1. 定期检查 data/models 中是否有新的模型版本
+2. 新版本先加载并在预热批次上验证（特征列、特征数量、预测值是否有效）
+3. 验证通过后原子地替换当前预测引擎，正在处理的请求继续使用旧引擎完成
+4. 验证失败的版本不会被启用，也不会被反复重试
+5. 提供当前启用的模型版本信息
+6. 模型版本包含分片模型时通过分片路由预测，未分配分片的城市使用全局模型
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.prediction_engine import PredictionEngine, FEATURE_COLUMNS, WINDOW_SIZE
+from src.model_router import build_model
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHotSwapper:
+    """
+    监视模型注册表并热切换预测引擎
+
+    当前的 (模型版本, 预测引擎) 保存在一个元组中，切换时整体替换，
+    读取方每次请求只取一次引擎，不需要加锁。
+
+    属性:
+        registry (ModelRegistry): 模型注册表
+        state (CityStateStore): 城市实时状态，用于构建预热批次
+        poll_interval (int): 检查新版本的间隔（秒）
+        warmup_cities (int): 预热批次使用的城市数量
+        on_swap (callable): 切换成功后的回调，参数为新版本
+        use_shards (bool): 版本包含分片模型时是否使用分片路由
+    """
+
+    def __init__(self, registry, state=None, poll_interval=60, warmup_cities=16, on_swap=None, use_shards=True):
+        """初始化热切换器"""
+        self.registry = registry
+        self.state = state
+        self.poll_interval = poll_interval
+        self.warmup_cities = warmup_cities
+        self.on_swap = on_swap
+        self.use_shards = use_shards
+
+        self._active = (None, None)
+        self._swap_lock = threading.Lock()
+        self._rejected = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.activated_at = None
+        self.last_check = None
+
+    @property
+    def engine(self):
+        """当前的预测引擎，没有可用模型时为 None"""
+        return self._active[1]
+
+    @property
+    def version(self):
+        """当前启用的模型版本"""
+        return self._active[0]
+
+    def validate(self, version):
+        """
+        加载模型并在预热批次上验证
+
+        参数:
+            version (ModelVersion): 待验证的模型版本
+
+        返回:
+            PredictionEngine: 使用该版本模型的预测引擎
+
+        异常:
+            ValueError: 模型与在线特征不兼容或预测值无效
+        """
+        feature_columns = version.manifest.get('feature_columns')
+        if feature_columns is not None and list(feature_columns) != FEATURE_COLUMNS:
+            raise ValueError("模型的特征列与在线预测的特征列不一致")
+
+        for target in ('AQI', 'PM2.5'):
+            models = {'全局': version.booster(target)}
+            if self.use_shards:
+                models.update({shard: shard_models[target] for shard, shard_models in version.shards.items()})
+            for name, model in models.items():
+                booster = model.booster
+                if booster.num_feature() != len(FEATURE_COLUMNS):
+                    raise ValueError(f"{target}模型（{name}）的特征数量为 {booster.num_feature()}，应为 {len(FEATURE_COLUMNS)}")
+
+        engine = self.build_engine(version)
+
+        # 预热批次：部分城市的递归预测
+        if self.state is not None and len(self.state) > 0:
+            cities = list(self.state.city_index)[:self.warmup_cities]
+            _, aqi_window, pm25_window, codes = self.state.windows(cities, WINDOW_SIZE)
+            aqi, pm25 = engine.predict_recursive(aqi_window, pm25_window, codes, engine.forecast_timestamps())
+            if not (np.isfinite(aqi).all() and np.isfinite(pm25).all()):
+                raise ValueError("预热批次的预测值无效")
+
+        return engine
+
+    def build_engine(self, version):
+        """为模型版本创建预测引擎（有分片模型时使用分片路由）"""
+        return PredictionEngine(
+            build_model(version, 'AQI', self.use_shards),
+            build_model(version, 'PM2.5', self.use_shards)
+        )
+
+    def activate(self, version, validate=True):
+        """
+        启用指定的模型版本
+
+        参数:
+            version (ModelVersion): 模型版本
+            validate (bool): 是否先加载并验证；为 False 时模型在第一次预测时才加载
+        """
+        with self._swap_lock:
+            if validate:
+                engine = self.validate(version)
+            else:
+                engine = self.build_engine(version)
+            self._active = (version, engine)
+            self.activated_at = datetime.now()
+
+        logger.info(f"已启用模型版本: {version.version}")
+        if self.on_swap is not None:
+            self.on_swap(version)
+
+    def check_for_update(self):
+        """
+        检查并启用新的模型版本
+
+        返回:
+            bool: 是否切换了模型
+        """
+        self.last_check = datetime.now()
+        latest = self.registry.latest()
+        current = self.version
+        if latest is None or latest.version in self._rejected:
+            return False
+        if current is not None and latest.version == current.version:
+            return False
+
+        try:
+            self.activate(latest)
+            return True
+        except Exception as e:
+            self._rejected[latest.version] = str(e)
+            logger.error(f"模型版本 {latest.version} 验证失败，继续使用当前版本: {str(e)}")
+            return False
+
+    def status(self):
+        """获取当前模型版本信息"""
+        version = self.version
+        return {
+            'version': version.version if version else None,
+            'format': version.manifest.get('format') if version else None,
+            'created_at': version.manifest.get('created_at') if version else None,
+            'metrics': version.manifest.get('metrics', {}) if version else {},
+            'shards': {
+                'by': version.manifest['shards']['by'],
+                'count': len(version.shards),
+                'enabled': self.use_shards
+            } if version and version.shards else None,
+            'activated_at': self.activated_at.isoformat() if self.activated_at else None,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'rejected': dict(self._rejected)
+        }
+
+    def _run(self):
+        """后台线程主循环"""
+        logger.info("启动模型版本监视任务")
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.error(f"检查模型版本失败: {str(e)}")
+
+    def start(self):
+        """启动后台监视线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止后台监视线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,298 @@
+"""
+空气质量批量预测引擎
+
+这个模块负责把训练好的AQI/PM2.5模型用于在线预测，主要功能包括：
+1. 按训练时的顺序组织特征列（FEATURE_COLUMNS）
+2. 一次性为 N 个城市 × 24 个预测时刻构建连续的 NumPy 特征矩阵
+3. 每个预测目标只调用一次 predict 完成全部打分
+4. 递归多步预测：将每一步的预测值写回环形缓冲区作为下一步的滞后特征
+5. 将预测结果整理为与 AirQualityCollector 相同的返回格式
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from src.hour_patterns import season_of_month, is_peak_hour
+
+# 特征列名（按照训练时的顺序）
+FEATURE_COLUMNS = [
+    'hour', 'dayofweek', 'month', 'season',
+    'is_weekend', 'is_peak_hour',
+    'aqi_ma24', 'pm25_ma24',
+    'aqi_lag1', 'pm25_lag1',
+    'aqi_lag3', 'pm25_lag3',
+    'aqi_lag6', 'pm25_lag6',
+    'aqi_lag12', 'pm25_lag12',
+    'aqi_lag24', 'pm25_lag24',
+    'city_code', 'province_code'
+]
+
+# 时间特征（随预测时刻变化）
+TIME_FEATURES = FEATURE_COLUMNS[:6]
+
+# 城市特征（同一城市的所有预测时刻共享）
+CITY_FEATURES = FEATURE_COLUMNS[6:]
+
+# 滞后步长（小时）
+LAG_STEPS = [1, 3, 6, 12, 24]
+
+# 滞后窗口长度（小时），覆盖最大滞后步长和24小时移动平均
+WINDOW_SIZE = 24
+
+# 默认预测时长（小时）
+FORECAST_HORIZON = 24
+
+# 数据范围限制
+AQI_RANGE = (0, 500)
+PM25_RANGE = (0, 500)
+
+
+def get_quality_level(aqi):
+    """根据AQI获取空气质量等级"""
+    if aqi <= 50:
+        return '优'
+    elif aqi <= 100:
+        return '良'
+    elif aqi <= 150:
+        return '轻度污染'
+    elif aqi <= 200:
+        return '中度污染'
+    elif aqi <= 300:
+        return '重度污染'
+    else:
+        return '严重污染'
+
+
+def build_time_features(timestamps):
+    """
+    为一组预测时刻构建时间特征矩阵
+
+    参数:
+        timestamps: datetime 列表或 DatetimeIndex
+
+    返回:
+        np.ndarray: 形状为 (H, len(TIME_FEATURES)) 的 float32 矩阵
+    """
+    index = pd.DatetimeIndex(timestamps)
+    hour = index.hour.to_numpy()
+    dayofweek = index.dayofweek.to_numpy()
+    month = index.month.to_numpy()
+
+    features = np.empty((len(index), len(TIME_FEATURES)), dtype=np.float32)
+    features[:, 0] = hour
+    features[:, 1] = dayofweek
+    features[:, 2] = month
+    features[:, 3] = season_of_month(month)  # 与数据处理阶段的季节定义保持一致
+    features[:, 4] = dayofweek >= 5
+    features[:, 5] = is_peak_hour(hour, dayofweek >= 5)  # 与数据处理阶段的高峰时段定义保持一致
+    return features
+
+
+class LagRingBuffer:
+    """
+    N 个城市最近 W 小时数值的环形缓冲区
+
+    写入新值时只覆盖最旧的一列，并增量更新窗口总和，
+    因此滞后值和移动平均的读取都是 O(N)，不需要重新排序或切片。
+    """
+
+    def __init__(self, values):
+        """使用 (N, W) 的初始窗口（按时间从旧到新排列）初始化缓冲区"""
+        self.buffer = np.array(values, dtype=np.float32)
+        self.size = self.buffer.shape[1]
+        self.head = 0  # 最旧数据所在的列，也是下一次写入的位置
+        self.total = self.buffer.sum(axis=1, dtype=np.float64)
+
+    def lag(self, k):
+        """获取 k 小时前的数值（k=1 为最新值，k=W 为最旧值）"""
+        return self.buffer[:, (self.head - k) % self.size]
+
+    def mean(self):
+        """获取窗口内的移动平均"""
+        return (self.total / self.size).astype(np.float32)
+
+    def push(self, values):
+        """写入最新一小时的数值"""
+        self.total += values - self.buffer[:, self.head]
+        self.buffer[:, self.head] = values
+        self.head = (self.head + 1) % self.size
+
+
+def window_features(aqi_buffer, pm25_buffer, codes):
+    """
+    根据环形缓冲区构建城市特征矩阵
+
+    返回:
+        np.ndarray: 形状为 (N, len(CITY_FEATURES)) 的 float32 矩阵
+    """
+    features = np.empty((codes.shape[0], len(CITY_FEATURES)), dtype=np.float32)
+    features[:, 0] = aqi_buffer.mean()
+    features[:, 1] = pm25_buffer.mean()
+    for i, lag in enumerate(LAG_STEPS):
+        features[:, 2 + 2 * i] = aqi_buffer.lag(lag)
+        features[:, 3 + 2 * i] = pm25_buffer.lag(lag)
+    features[:, -2:] = codes
+    return features
+
+
+class PredictionEngine:
+    """
+    批量向量化预测引擎
+
+    直接预测：将 N 个城市 × H 个预测时刻的特征组织为一个 (N*H, len(FEATURE_COLUMNS))
+    的连续矩阵，每个预测目标只调用一次模型。
+
+    递归预测：每一步为所有城市批量打分，并把预测值写回环形缓冲区作为下一步
+    的滞后特征，H 步预测每个目标共调用 H 次模型。
+
+    属性:
+        aqi_model: AQI 预测模型（LightGBM Booster）
+        pm25_model: PM2.5 预测模型（LightGBM Booster）
+        horizon (int): 预测时长（小时）
+    """
+
+    def __init__(self, aqi_model, pm25_model, horizon=FORECAST_HORIZON):
+        """初始化预测引擎"""
+        self.aqi_model = aqi_model
+        self.pm25_model = pm25_model
+        self.horizon = horizon
+
+    def forecast_timestamps(self, last_time=None):
+        """
+        获取预测时刻列表
+
+        与训练和回测一致，第一个预测时刻是最新数据的下一个小时，
+        此时 lag1 为最新数据所在的小时。
+
+        参数:
+            last_time (datetime): 最新数据的时间，默认为当前时间
+        """
+        if last_time is None:
+            last_time = datetime.now()
+        last_time = last_time.replace(minute=0, second=0, microsecond=0)
+        return [last_time + timedelta(hours=h + 1) for h in range(self.horizon)]
+
+    def build_feature_matrix(self, city_features, timestamps):
+        """
+        构建 (N*H, F) 的特征矩阵
+
+        参数:
+            city_features (np.ndarray): 形状为 (N, len(CITY_FEATURES)) 的城市特征
+            timestamps (list): 长度为 H 的预测时刻
+
+        返回:
+            np.ndarray: 按城市为主序排列的 C 连续 float32 矩阵
+        """
+        n_cities = city_features.shape[0]
+        time_features = build_time_features(timestamps)
+        n_steps = time_features.shape[0]
+
+        matrix = np.empty((n_cities, n_steps, len(FEATURE_COLUMNS)), dtype=np.float32)
+        matrix[:, :, :len(TIME_FEATURES)] = time_features[np.newaxis, :, :]
+        matrix[:, :, len(TIME_FEATURES):] = city_features[:, np.newaxis, :]
+        return matrix.reshape(n_cities * n_steps, len(FEATURE_COLUMNS))
+
+    def predict(self, city_features, timestamps):
+        """
+        批量直接预测（所有预测时刻共享同一组滞后特征）
+
+        返回:
+            tuple: (aqi, pm25)，形状均为 (N, H)
+        """
+        n_cities = city_features.shape[0]
+        n_steps = len(timestamps)
+        if n_cities == 0:
+            empty = np.empty((0, n_steps), dtype=np.float32)
+            return empty, empty
+
+        matrix = self.build_feature_matrix(city_features, timestamps)
+        aqi = np.clip(self.aqi_model.predict(matrix), *AQI_RANGE)
+        pm25 = np.clip(self.pm25_model.predict(matrix), *PM25_RANGE)
+        return aqi.reshape(n_cities, n_steps), pm25.reshape(n_cities, n_steps)
+
+    def predict_recursive(self, aqi_window, pm25_window, codes, timestamps):
+        """
+        批量递归预测
+
+        参数:
+            aqi_window (np.ndarray): (N, W) 的AQI历史窗口，按时间从旧到新排列
+            pm25_window (np.ndarray): (N, W) 的PM2.5历史窗口
+            codes (np.ndarray): (N, 2) 的城市和省份编码
+            timestamps (list): 长度为 H 的预测时刻
+
+        返回:
+            tuple: (aqi, pm25)，形状均为 (N, H)
+        """
+        n_cities = codes.shape[0]
+        n_steps = len(timestamps)
+        aqi = np.empty((n_cities, n_steps), dtype=np.float32)
+        pm25 = np.empty((n_cities, n_steps), dtype=np.float32)
+        if n_cities == 0:
+            return aqi, pm25
+
+        aqi_buffer = LagRingBuffer(aqi_window)
+        pm25_buffer = LagRingBuffer(pm25_window)
+        time_features = build_time_features(timestamps)
+
+        matrix = np.empty((n_cities, len(FEATURE_COLUMNS)), dtype=np.float32)
+        for step in range(n_steps):
+            matrix[:, :len(TIME_FEATURES)] = time_features[step]
+            matrix[:, len(TIME_FEATURES):] = window_features(aqi_buffer, pm25_buffer, codes)
+
+            aqi[:, step] = np.clip(self.aqi_model.predict(matrix), *AQI_RANGE)
+            pm25[:, step] = np.clip(self.pm25_model.predict(matrix), *PM25_RANGE)
+
+            # 预测值作为下一步的滞后特征
+            aqi_buffer.push(aqi[:, step])
+            pm25_buffer.push(pm25[:, step])
+
+        return aqi, pm25
+
+    def forecast(self, state, cities, base_time=None, recursive=True):
+        """
+        为多个城市生成未来预测
+
+        参数:
+            state (CityStateStore): 城市实时状态存储
+            cities (list): 城市名称列表
+            base_time (datetime): 当前时间（用于判断城市状态是否过期），默认为系统时间
+            recursive (bool): 是否使用递归多步预测
+
+        返回:
+            dict: {城市: 预测列表}，每个城市从其最新数据的下一个小时开始预测，
+                预测列表格式与 AirQualityCollector 一致；
+                状态过期或数据不足的城市不会出现在结果中（由调用方使用统计预测）
+        """
+        cities = state.fresh_cities(cities, base_time)
+        found, aqi_window, pm25_window, codes = state.windows(cities, WINDOW_SIZE)
+        last_times = np.array([state.last_timestamp(city) for city in found], dtype='datetime64[h]')
+
+        # 最新数据时间相同的城市共享预测时刻，一起批量预测
+        results = {}
+        for last_time in np.unique(last_times):
+            rows = np.nonzero(last_times == last_time)[0]
+            timestamps = self.forecast_timestamps(last_time.astype(datetime))
+            if recursive:
+                aqi, pm25 = self.predict_recursive(aqi_window[rows], pm25_window[rows], codes[rows], timestamps)
+            else:
+                city_features = window_features(
+                    LagRingBuffer(aqi_window[rows]), LagRingBuffer(pm25_window[rows]), codes[rows]
+                )
+                aqi, pm25 = self.predict(city_features, timestamps)
+            for i, row in enumerate(rows):
+                results[found[row]] = self.format_predictions(timestamps, aqi[i], pm25[i])
+        return {city: results[city] for city in found}
+
+    @staticmethod
+    def format_predictions(timestamps, aqi_values, pm25_values):
+        """将预测数组整理为字典列表"""
+        predictions = []
+        for timestamp, aqi, pm25 in zip(timestamps, aqi_values, pm25_values):
+            aqi = int(aqi)
+            predictions.append({
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'aqi': aqi,
+                'pm25': round(float(pm25), 1),
+                'quality_level': get_quality_level(aqi)
+            })
+        return predictions
@@ -0,0 +1,134 @@
+"""
+处理后数据存储模块
+
+这个模块负责小时级处理结果的列式存储，主要功能包括：
+1. 以 Parquet 格式保存，按年份和城市分区（data/processed/hourly/year=*/city=*/）
+2. 城市、省份、空气质量等级等文本列使用分类类型，数值列保留原始类型
+3. 读取时只加载需要的列和分区
+4. 支持按批次追加分片文件，流式处理时不需要在内存中保存全部数据
+5. 读取最近 N 小时的数据，跨年时同时读取前一年的分区
+"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+# 分区列
+PARTITION_COLS = ['year', 'city']
+
+# 使用分类类型保存的列
+CATEGORICAL_COLS = ['city', 'province', 'quality_level', 'main_pollutant']
+
+
+def dataset_path(processed_data_dir):
+    """获取小时数据集的目录"""
+    return Path(processed_data_dir) / 'hourly'
+
+
+def clear_dataset(root):
+    """删除整个数据集"""
+    root = Path(root)
+    if root.exists():
+        shutil.rmtree(root)
+
+
+def write_processed(df, root, overwrite=True, part_name=None):
+    """
+    保存处理后的小时数据
+
+    参数:
+        df (pd.DataFrame): 包含 year 和 city 列的小时数据
+        root (Path): 数据集目录
+        overwrite (bool): 是否先清空整个数据集；为 False 时只替换写入的分区
+        part_name (str): 分片文件名前缀；指定时保留分区中已有的文件，
+            新数据作为独立文件追加（用于分批写入）
+    """
+    root = Path(root)
+    if overwrite:
+        clear_dataset(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    df = df.copy()
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    options = {'existing_data_behavior': 'delete_matching'}
+    if part_name is not None:
+        options = {
+            'existing_data_behavior': 'overwrite_or_ignore',
+            'basename_template': f'{part_name}-{{i}}.parquet'
+        }
+
+    df.to_parquet(
+        root,
+        engine='pyarrow',
+        partition_cols=PARTITION_COLS,
+        index=False,
+        **options
+    )
+
+
+def list_years(root):
+    """列出数据集中已有的年份分区"""
+    root = Path(root)
+    if not root.exists():
+        return []
+    return sorted(int(p.name.split('=', 1)[1]) for p in root.glob('year=*'))
+
+
+def read_processed(root, columns=None, years=None, cities=None, filters=None):
+    """
+    读取处理后的小时数据
+
+    参数:
+        root (Path): 数据集目录
+        columns (list): 需要的列，None 表示全部
+        years (list): 只读取这些年份的分区
+        cities (list): 只读取这些城市的分区
+        filters (list): 额外的 pyarrow 过滤条件，如 [('date', '>=', '2024-01-01')]
+
+    返回:
+        pd.DataFrame: 小时数据（分区列和文本列为分类类型）
+    """
+    conditions = list(filters or [])
+    if years is not None:
+        conditions.append(('year', 'in', [int(y) for y in years]))
+    if cities is not None:
+        conditions.append(('city', 'in', list(cities)))
+
+    return pd.read_parquet(
+        root,
+        engine='pyarrow',
+        columns=columns,
+        filters=conditions or None
+    )
+
+
+def read_recent(root, hours, columns=None):
+    """
+    读取数据集中最近 hours 小时的数据
+
+    以最新年份分区中的最后日期为准向前取足 hours 小时所需的日期，
+    这些日期跨越年份时同时读取之前的年份分区（如1月初需要上一年12月底的数据）。
+
+    参数:
+        root (Path): 数据集目录
+        hours (int): 需要的小时数
+        columns (list): 需要的列，None 表示全部
+
+    返回:
+        pd.DataFrame: 小时数据
+    """
+    years = list_years(root)
+    if not years:
+        raise FileNotFoundError(f"数据集 {root} 中没有数据")
+    last_date = pd.Timestamp(read_processed(root, columns=['date'], years=years[-1:])['date'].max())
+    first = last_date - pd.Timedelta(days=-(-hours // 24))
+    return read_processed(
+        root,
+        columns=columns,
+        years=[y for y in years if y >= first.year],
+        filters=[('date', '>=', first.strftime('%Y-%m-%d'))]
+    )
@@ -0,0 +1,134 @@
+"""
+和风天气（QWeather）空气质量接口客户端
+
+这个模块封装对上游实时空气质量接口的访问，主要功能包括：
+1. 使用连接池复用 HTTP keep-alive 连接，并限制每个主机的连接数
+2. 为每个请求设置连接/读取超时
+3. 对超时、连接错误、429 和 5xx 响应进行带随机抖动的指数退避重试
+4. 基于 asyncio 的并发模式，以有限并发度一次刷新所有城市
+"""
+
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'https://devapi.qweather.com'
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class QWeatherClient:
+    """
+    带连接池和重试的 QWeather 空气质量客户端
+
+    属性:
+        base_url (str): 接口地址，测试时可以指向本地桩服务
+        timeout (tuple): (连接超时, 读取超时)，单位秒
+        max_retries (int): 每个请求最多重试的次数
+        backoff (float): 退避基准时间（秒）
+        executor (ThreadPoolExecutor): 并发请求使用的线程池，线程数与连接池大小相同
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, timeout=(3.05, 10),
+                 max_retries=3, backoff=0.5, pool_maxsize=16):
+        """初始化客户端"""
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_maxsize = pool_maxsize
+
+        # 所有请求共享同一个会话，pool_block=True 保证每个主机的连接数不超过 pool_maxsize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # 并发请求使用独立的线程池，不占用（也不受限于）事件循环的默认线程池
+        self.executor = ThreadPoolExecutor(max_workers=pool_maxsize, thread_name_prefix='qweather')
+
+    def close(self):
+        """关闭线程池和连接池"""
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def _sleep_before_retry(self, attempt):
+        """指数退避 + 完全随机抖动"""
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get_air_now(self, location):
+        """
+        获取一个地点的实时空气质量
+
+        参数:
+            location (str): QWeather 城市ID
+
+        返回:
+            dict: 接口返回的 now 字段；请求失败或接口返回错误时为 None
+        """
+        url = f"{self.base_url}/v7/air/now"
+        params = {'location': location, 'key': self.api_key}
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                logger.warning(f"请求 {location} 失败（第{attempt + 1}次）: {str(e)}")
+                if attempt < self.max_retries:
+                    self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                logger.warning(f"请求 {location} 返回 {response.status_code}（第{attempt + 1}次）")
+                if attempt < self.max_retries:
+                    self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code != 200:
+                return None
+
+            try:
+                data = response.json()
+            except ValueError:
+                return None
+            if data.get('code') != '200':
+                return None
+            return data.get('now')
+
+        return None
+
+    async def fetch_many_async(self, locations, concurrency=8):
+        """
+        并发获取多个地点的实时空气质量
+
+        请求在客户端自己的线程池中执行并共享连接池，信号量限制同时进行的请求数。
+
+        参数:
+            locations (dict): {名称: QWeather 城市ID}
+            concurrency (int): 最大并发请求数
+
+        返回:
+            dict: {名称: now 字段或 None}
+        """
+        semaphore = asyncio.Semaphore(min(concurrency, self.pool_maxsize))
+        loop = asyncio.get_running_loop()
+
+        async def fetch(name, location):
+            async with semaphore:
+                return name, await loop.run_in_executor(self.executor, self.get_air_now, location)
+
+        results = await asyncio.gather(*(fetch(name, location) for name, location in locations.items()))
+        return dict(results)
+
+    def fetch_many(self, locations, concurrency=8):
+        """fetch_many_async 的同步入口"""
+        return asyncio.run(self.fetch_many_async(locations, concurrency))
@@ -148,8 +148,8 @@ def download_from_database():
         return jsonify({'success': False, 'message': '请指定城市名称'}), 400
     
     try:
-        # 初始化数据收集器
-        collector = AirQualityCollector()
+        # 使用应用共享的数据收集器（复用数据库长连接）
+        from src.app import collector
         
         # 格式化日期
         if start_date:
@@ -453,7 +453,7 @@ def check_all_alerts():
         if not configs:
             return jsonify({'success': True, 'message': '没有找到启用的预警配置', 'alerts': []}), 200
         
-        from src.app import collector
+        from src.app import collector, get_model_forecasts
         total_alerts = 0
         new_alerts = []
         
@@ -464,15 +464,20 @@ def check_all_alerts():
                 city_configs[config.city] = []
             city_configs[config.city].append(config)
         
+        # 一次批量调用模型，为所有城市生成预测
+        model_forecasts = get_model_forecasts(city_configs.keys())
+        
         # 处理每个城市
         for city, city_configs_list in city_configs.items():
             # 获取预测数据
-            result = collector.get_real_time_and_forecast(city)
-            
-            if not result or 'predictions' not in result:
-                continue
-            
-            predictions = result['predictions']
+            predictions = model_forecasts.get(city)
+            if not predictions:
+                result = collector.get_real_time_and_forecast(city)
+                
+                if not result or 'predictions' not in result:
+                    continue
+                
+                predictions = result['predictions']
             
             # 对该城市的每个配置检查预警
             for config in city_configs_list:
@@ -0,0 +1,236 @@
+"""
+训练数据加载模块
+
+这个模块把处理后的 Parquet 数据集直接读入训练使用的紧凑数组，主要功能包括：
+1. 特征矩阵和目标值为 float32，城市/省份编码为 int16，时间戳精确到小时，
+   不经过 float64 的 DataFrame
+2. 先只读取时间戳和城市编码计算行的顺序，再按行组把各列直接写入排好序的位置，
+   整个矩阵不需要再排序或复制
+3. Parquet 文件以内存映射方式打开
+4. 可选把数组保存为 .npy 缓存并以内存映射方式使用：数据集没有变化时直接复用，
+   数据大于内存时也能加载
+5. 读取时同时统计每列的缺失值数量
+6. 增量训练支持：按年份或城市分组数据文件、按城市水位只读取新的小时数据、抽样计算分箱
+"""
+
+import json
+from pathlib import Path
+from urllib.parse import unquote
+
+import numpy as np
+import pyarrow.parquet as pq
+
+# 编码列（同时保存为 int16 数组）
+CODE_COLUMNS = ['city_code', 'province_code']
+
+# 缓存文件
+CACHE_META = 'meta.json'
+CACHE_ARRAYS = ['features', 'targets', 'timestamps', 'codes']
+
+
+class TrainingData:
+    """
+    按时间排序的训练数组
+
+    属性:
+        X (np.ndarray): (N, F) float32 特征矩阵，行按 (时间, 城市编码) 排序
+        targets (dict): {目标列: (N,) float32}
+        timestamps (np.ndarray): (N,) datetime64[h] 时间戳
+        codes (np.ndarray): (N, 2) int16 城市和省份编码
+        feature_columns (list): 特征列（X 的列顺序）
+        missing (dict): {列名: 缺失值数量}
+    """
+
+    def __init__(self, X, targets, timestamps, codes, feature_columns, missing):
+        """初始化训练数组"""
+        self.X = X
+        self.targets = targets
+        self.timestamps = timestamps
+        self.codes = codes
+        self.feature_columns = list(feature_columns)
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.X)
+
+    @property
+    def nbytes(self):
+        """数组占用的字节数"""
+        return sum(a.nbytes for a in (self.X, self.timestamps, self.codes)) + sum(
+            y.nbytes for y in self.targets.values()
+        )
+
+
+def dataset_files(root, years=None):
+    """列出数据集中的 Parquet 文件（按路径排序）"""
+    files = sorted(Path(root).glob('year=*/city=*/*.parquet'))
+    if years is not None:
+        wanted = {f'year={int(y)}' for y in years}
+        files = [f for f in files if f.parent.parent.name in wanted]
+    return files
+
+
+def dataset_fingerprint(files):
+    """数据集指纹（文件路径、大小和修改时间），用于判断缓存是否有效"""
+    return [[str(f), f.stat().st_size, f.stat().st_mtime_ns] for f in files]
+
+
+def partition_files(files, by='year'):
+    """
+    按分区分组数据文件
+
+    参数:
+        files (list): 数据文件
+        by (str): 'year' 或 'city'
+
+    返回:
+        dict: {分区名: 文件列表}，按分区名排序
+    """
+    if by not in ('year', 'city'):
+        raise ValueError(f"不支持的分区方式: {by}")
+    groups = {}
+    for f in files:
+        key = unquote(f.parent.parent.name if by == 'year' else f.parent.name)
+        groups.setdefault(key, []).append(f)
+    return dict(sorted(groups.items()))
+
+
+def sample_rows(files, columns, n_rows, random_seed=42):
+    """
+    从数据文件中均匀抽样（逐个行组读取，内存中只保留样本）
+
+    返回:
+        np.ndarray: (<=n_rows, 列数) float32 样本
+    """
+    total = sum(pq.ParquetFile(f, memory_map=True).metadata.num_rows for f in files)
+    fraction = min(1.0, n_rows / max(total, 1))
+    rng = np.random.default_rng(random_seed)
+    samples = []
+    for parquet_file, index in _row_groups(files):
+        table = parquet_file.read_row_group(index, columns=list(columns))
+        keep = np.nonzero(rng.random(table.num_rows) < fraction)[0]
+        samples.append(np.stack(
+            [table.column(col).to_numpy().astype(np.float32, copy=False)[keep] for col in columns], axis=1
+        ))
+    return np.concatenate(samples)
+
+
+def _row_groups(files):
+    """依次产生 (ParquetFile, 行组序号)"""
+    for path in files:
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for index in range(parquet_file.num_row_groups):
+            yield parquet_file, index
+
+
+def _allocate(cache_dir, name, shape, dtype):
+    """分配数组，指定缓存目录时为磁盘上的内存映射文件"""
+    if cache_dir is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(Path(cache_dir) / f'{name}.npy', mode='w+', shape=shape, dtype=dtype)
+
+
+def _load_cache(cache_dir, meta):
+    """缓存有效时以只读内存映射方式打开，否则返回 None"""
+    meta_path = Path(cache_dir) / CACHE_META
+    if not meta_path.exists():
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        cached = json.load(f)
+    if {k: cached.get(k) for k in meta} != meta:
+        return None
+
+    arrays = {name: np.load(Path(cache_dir) / f'{name}.npy', mmap_mode='r') for name in CACHE_ARRAYS}
+    targets = {col: arrays['targets'][i] for i, col in enumerate(meta['target_columns'])}
+    return TrainingData(
+        arrays['features'], targets, arrays['timestamps'], arrays['codes'],
+        meta['feature_columns'], cached['missing']
+    )
+
+
+def load_training_data(root, feature_columns, target_columns, years=None, cache_dir=None, files=None,
+                       after=None):
+    """
+    把数据集读入按时间排序的训练数组
+
+    参数:
+        root (Path): 数据集目录
+        feature_columns (list): 特征列
+        target_columns (list): 目标列
+        years (list): 只读取这些年份的分区
+        cache_dir (Path): 缓存目录；指定时数组保存为 .npy 文件并以内存映射方式返回，
+            数据集没有变化时直接复用
+        files (list): 只读取这些数据文件（代替 years）
+        after (np.ndarray): 按城市编码索引的小时水位（自1970年起的小时数），
+            只保留晚于所在城市水位的行；使用时不读写缓存
+
+    返回:
+        TrainingData: 训练数组
+    """
+    if files is None:
+        files = dataset_files(root, years)
+    if after is not None:
+        cache_dir = None
+    if not files:
+        raise FileNotFoundError(f"数据集 {root} 中没有数据文件")
+
+    meta = {
+        'fingerprint': dataset_fingerprint(files),
+        'feature_columns': list(feature_columns),
+        'target_columns': list(target_columns)
+    }
+    if cache_dir is not None:
+        cached = _load_cache(cache_dir, meta)
+        if cached is not None:
+            return cached
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        (Path(cache_dir) / CACHE_META).unlink(missing_ok=True)
+
+    # 第一遍：只读取时间戳和编码，按 (时间, 城市编码) 计算每一行的目标位置
+    hours, codes = [], []
+    for parquet_file, index in _row_groups(files):
+        table = parquet_file.read_row_group(index, columns=['timestamp'] + CODE_COLUMNS)
+        hours.append(table.column('timestamp').to_numpy().astype('datetime64[h]').astype(np.int64))
+        codes.append(np.stack([table.column(col).to_numpy().astype(np.int16) for col in CODE_COLUMNS], axis=1))
+    hours = np.concatenate(hours)
+    codes = np.concatenate(codes)
+    kept = np.arange(len(hours))
+    if after is not None:
+        kept = np.nonzero(hours > after[codes[:, 0]])[0]
+    order = kept[np.lexsort((codes[kept, 0], hours[kept]))]
+    destination = np.full(len(hours), -1, dtype=np.int64)
+    destination[order] = np.arange(len(order))
+    n_rows = len(order)
+
+    X = _allocate(cache_dir, 'features', (n_rows, len(feature_columns)), np.float32)
+    targets = _allocate(cache_dir, 'targets', (len(target_columns), n_rows), np.float32)
+    timestamps = _allocate(cache_dir, 'timestamps', (n_rows,), 'datetime64[h]')
+    sorted_codes = _allocate(cache_dir, 'codes', (n_rows, len(CODE_COLUMNS)), np.int16)
+    timestamps[:] = hours[order].astype('datetime64[h]')
+    sorted_codes[:] = codes[order]
+    del hours, codes, order
+
+    # 第二遍：按行组读取特征和目标列，直接写入排好序的位置
+    missing = {col: 0 for col in list(feature_columns) + list(target_columns)}
+    offset = 0
+    for parquet_file, index in _row_groups(files):
+        table = parquet_file.read_row_group(index, columns=list(feature_columns) + list(target_columns))
+        rows = destination[offset:offset + table.num_rows]
+        selected = rows >= 0
+        for out, columns in ((X, feature_columns), (targets.T, target_columns)):
+            for j, col in enumerate(columns):
+                values = table.column(col).to_numpy().astype(np.float32, copy=False)[selected]
+                missing[col] += int(np.isnan(values).sum())
+                out[rows[selected], j] = values
+        offset += table.num_rows
+
+    targets_by_column = {col: targets[i] for i, col in enumerate(target_columns)}
+    data = TrainingData(X, targets_by_column, timestamps, sorted_codes, feature_columns, missing)
+
+    if cache_dir is not None:
+        for array in (X, targets, timestamps, sorted_codes):
+            array.flush()
+        # 清单最后写入，写了一半的缓存不会被复用
+        with open(Path(cache_dir) / CACHE_META, 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, missing=missing, rows=n_rows), f, ensure_ascii=False)
+    return data
@@ -0,0 +1,102 @@
+"""
+城市状态存储测试
+
+检查长时间中断后的重置，以及过期或数据不足的城市不参与模型预测。
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.city_state import DEFAULT_CAPACITY, MA_WINDOW, CityStateStore
+from src.prediction_engine import FEATURE_COLUMNS, PredictionEngine
+
+
+class ConstantModel:
+    """返回固定值的模型"""
+
+    def predict(self, X, **kwargs):
+        return np.full(len(X), 50.0)
+
+
+def make_store(last_time, hours=48):
+    """构建一个城市的状态，最新数据在 last_time"""
+    times = pd.date_range(end=last_time, periods=hours, freq='h')
+    history = pd.DataFrame({
+        'city': '北京',
+        'date': times.strftime('%Y-%m-%d'),
+        'hour': times.hour,
+        'aqi': np.arange(hours, dtype=float),
+        'pm25': np.arange(hours, dtype=float) / 2,
+        'city_code': 0,
+        'province_code': 0
+    })
+    return CityStateStore.from_history(history)
+
+
+def test_short_gap_is_forward_filled():
+    store = make_store(datetime(2024, 12, 31, 23))
+    assert store.update('北京', datetime(2025, 1, 1, 3), 100.0, 60.0)
+    assert store.lag('北京', 1) == (100.0, 60.0)
+    # 中间缺失的3个小时用中断前的最后一个值补齐
+    assert [store.lag('北京', k)[0] for k in (2, 3, 4, 5)] == [47.0, 47.0, 47.0, 47.0]
+    assert store.counts[0] == 48 + 4
+
+
+def test_gap_longer_than_capacity_resets_buffer():
+    store = make_store(datetime(2024, 12, 31, 23))
+    now = datetime(2024, 12, 31, 23) + timedelta(hours=DEFAULT_CAPACITY + 5)
+    assert store.update('北京', now, 100.0, 60.0)
+    assert store.counts[0] == 1
+    assert store.last_timestamp('北京') == now
+    assert store.moving_average('北京') == (100.0, 60.0)
+    # 重置后数据不足24小时，不用于模型预测
+    assert store.fresh_cities(['北京'], now) == []
+
+    for h in range(1, MA_WINDOW):
+        store.update('北京', now + timedelta(hours=h), 100.0 + h, 60.0)
+    assert store.fresh_cities(['北京'], now + timedelta(hours=MA_WINDOW - 1)) == ['北京']
+
+
+def test_fresh_cities_skips_stale_state():
+    last_time = datetime(2024, 12, 31, 23)
+    store = make_store(last_time)
+    assert store.fresh_cities(['北京', '上海'], last_time + timedelta(hours=3)) == ['北京']
+    assert store.fresh_cities(['北京'], last_time + timedelta(hours=4)) == []
+    assert store.fresh_cities(['北京'], datetime(2026, 10, 18, 16)) == []
+
+
+def test_forecast_skips_stale_cities():
+    last_time = datetime(2024, 12, 31, 23)
+    store = make_store(last_time)
+    engine = PredictionEngine(ConstantModel(), ConstantModel())
+    assert engine.forecast(store, ['北京'], base_time=datetime(2026, 10, 18, 16, 30)) == {}
+    assert list(engine.forecast(store, ['北京'], base_time=last_time + timedelta(minutes=30))) == ['北京']
+
+
+class RecordingModel(ConstantModel):
+    """记录每次预测的特征矩阵"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X, **kwargs):
+        self.calls.append(np.array(X))
+        return super().predict(X)
+
+
+def test_forecast_starts_after_latest_hour():
+    last_time = datetime(2024, 12, 31, 23)
+    store = make_store(last_time)
+    model = RecordingModel()
+    engine = PredictionEngine(model, ConstantModel())
+    predictions = engine.forecast(store, ['北京'], base_time=last_time + timedelta(hours=1, minutes=10))['北京']
+
+    # 与训练和回测一致：第一步是最新数据的下一个小时，lag1 为最新数据
+    assert predictions[0]['timestamp'] == '2025-01-01 00:00:00'
+    assert predictions[-1]['timestamp'] == '2025-01-01 23:00:00'
+    first_step = model.calls[0][0]
+    assert first_step[FEATURE_COLUMNS.index('hour')] == 0
+    assert first_step[FEATURE_COLUMNS.index('aqi_lag1')] == 47.0
+    assert first_step[FEATURE_COLUMNS.index('aqi_lag24')] == 24.0
@@ -0,0 +1,79 @@
+"""
+预测缓存测试
+
+检查计算期间清除缓存时，旧的计算结果不会写入缓存，新请求也不会复用旧的计算。
+"""
+
+import threading
+
+from src.forecast_cache import ForecastCache
+
+
+def start_blocked_compute(cache, city, value):
+    """在后台线程中开始一次阻塞的计算，返回 (放行事件, 线程, 结果列表)"""
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return value
+
+    thread = threading.Thread(target=lambda: results.append(cache.get_or_compute(city, compute)))
+    thread.start()
+    assert started.wait(5)
+    return release, thread, results
+
+
+def test_hit_after_compute():
+    cache = ForecastCache(clock=lambda: 1000.0)
+    assert cache.get_or_compute('北京', lambda: 'v1') == 'v1'
+    assert cache.get_or_compute('北京', lambda: 'v2') == 'v1'
+    assert cache.stats()['hits'] == 1
+
+
+def test_invalidate_during_compute_discards_result():
+    cache = ForecastCache(clock=lambda: 1000.0)
+    release, thread, results = start_blocked_compute(cache, '北京', 'old')
+
+    cache.invalidate()
+    release.set()
+    thread.join(5)
+
+    assert results == ['old']
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['discarded'] == 1
+    assert cache.get_or_compute('北京', lambda: 'new') == 'new'
+    assert cache.get_or_compute('北京', lambda: 'newer') == 'new'
+
+
+def test_city_invalidate_only_affects_that_city():
+    cache = ForecastCache(clock=lambda: 1000.0)
+    release, thread, _ = start_blocked_compute(cache, '北京', 'beijing')
+
+    cache.invalidate('上海')
+    release.set()
+    thread.join(5)
+    assert cache.get_or_compute('北京', lambda: 'other') == 'beijing'
+
+    release, thread, _ = start_blocked_compute(cache, '广州', 'stale')
+    cache.invalidate('广州')
+    release.set()
+    thread.join(5)
+    assert cache.get_or_compute('广州', lambda: 'fresh') == 'fresh'
+    assert cache.get_or_compute('北京', lambda: 'other') == 'beijing'
+
+
+def test_request_after_invalidate_does_not_join_stale_compute():
+    cache = ForecastCache(clock=lambda: 1000.0)
+    release, thread, results = start_blocked_compute(cache, '北京', 'old')
+
+    cache.invalidate('北京')
+    # 清除之后的请求开始新的计算，而不是等待清除之前开始的计算
+    assert cache.get_or_compute('北京', lambda: 'new') == 'new'
+    release.set()
+    thread.join(5)
+
+    assert results == ['old']
+    assert cache.get_or_compute('北京', lambda: 'newer') == 'new'
+    assert cache.stats()['coalesced'] == 0
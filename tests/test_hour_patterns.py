@@ -0,0 +1,107 @@
+"""
+小时变化模式测试
+
+逐一检查编译得到的因子表、高峰时段表和数据处理阶段的向量化时间特征，
+是否与 PATTERNS、SEASON_FACTORS 的定义以及标量查询函数一致。
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processor import AirQualityDataProcessor
+from src.hour_patterns import (
+    HOUR_FACTOR_TABLE, PATTERNS, PEAK_HOUR_TABLE, SEASON_FACTORS,
+    hour_factor, is_peak_hour, season_of_month
+)
+from src.prediction_engine import TIME_FEATURES, build_time_features
+
+DAY_TYPES = ['workday', 'weekend']
+
+# 月份到季节编码的定义（1冬 2春 3夏 4秋）
+MONTH_SEASONS = {12: 1, 1: 1, 2: 1, 3: 2, 4: 2, 5: 2, 6: 3, 7: 3, 8: 3, 9: 4, 10: 4, 11: 4}
+
+
+def expected_peak(hour, is_weekend):
+    """按 PATTERNS 直接判断是否为高峰时段（早高峰或晚高峰）"""
+    day = PATTERNS[DAY_TYPES[is_weekend]]
+    return int(hour in day['morning_peak']['hours'] or hour in day['evening_peak']['hours'])
+
+
+def expected_factor(hour, is_weekend, season):
+    """按 PATTERNS 直接计算小时因子（多个时段包含同一小时时以定义顺序中的第一个为准）"""
+    for period in PATTERNS[DAY_TYPES[is_weekend]].values():
+        if hour in period['hours']:
+            return period['factor'] * SEASON_FACTORS[season]
+    return SEASON_FACTORS[season]
+
+
+@pytest.fixture(scope='module')
+def calendar_df():
+    """2024 全年（覆盖每个季节的工作日和周末）× 24 小时的时间特征"""
+    days = [date(2024, 1, 1) + timedelta(days=i) for i in range(366)]
+    hourly_df = pd.DataFrame({
+        'date': np.repeat([d.strftime('%Y-%m-%d') for d in days], 24),
+        'hour': np.tile(np.arange(24), len(days))
+    })
+    processor = AirQualityDataProcessor()
+    return processor.add_calendar_features(hourly_df)
+
+
+def test_season_of_month_matches_definition():
+    for month, season in MONTH_SEASONS.items():
+        assert season_of_month(month) == season
+    months = np.array(list(MONTH_SEASONS))
+    assert season_of_month(months).tolist() == list(MONTH_SEASONS.values())
+
+
+def test_peak_hour_table_matches_patterns():
+    for is_weekend in (0, 1):
+        for hour in range(24):
+            expected = expected_peak(hour, is_weekend)
+            assert PEAK_HOUR_TABLE[is_weekend, hour] == expected, (is_weekend, hour)
+            assert is_peak_hour(hour, is_weekend) == expected, (is_weekend, hour)
+            assert is_peak_hour(hour, bool(is_weekend)) == expected, (is_weekend, hour)
+
+
+def test_hour_factor_table_matches_patterns():
+    for is_weekend in (0, 1):
+        for season in SEASON_FACTORS:
+            for hour in range(24):
+                expected = expected_factor(hour, is_weekend, season)
+                assert HOUR_FACTOR_TABLE[is_weekend, season - 1, hour] == pytest.approx(expected)
+                assert hour_factor(hour, is_weekend, season) == pytest.approx(expected)
+
+
+def test_vectorized_lookups_match_scalar():
+    hours = np.tile(np.arange(24), 8)
+    weekend = np.repeat([0, 1], 96)
+    seasons = np.tile(np.repeat([1, 2, 3, 4], 24), 2)
+    peaks = is_peak_hour(hours, weekend)
+    factors = hour_factor(hours, weekend, seasons)
+    for i in range(len(hours)):
+        assert peaks[i] == is_peak_hour(hours[i], weekend[i])
+        assert factors[i] == hour_factor(hours[i], weekend[i], seasons[i])
+
+
+def test_calendar_features_cover_every_combination(calendar_df):
+    combos = set(zip(calendar_df['hour'], calendar_df['is_weekend'], calendar_df['season']))
+    assert combos == {(h, w, s) for h in range(24) for w in (0, 1) for s in SEASON_FACTORS}
+
+
+def test_calendar_features_match_scalar_helpers(calendar_df):
+    for row in calendar_df.itertuples(index=False):
+        day = date.fromisoformat(row.date)
+        is_weekend = int(day.weekday() >= 5)
+        assert row.timestamp == pd.Timestamp(day) + pd.Timedelta(hours=row.hour)
+        assert row.is_weekend == is_weekend
+        assert row.season == MONTH_SEASONS[day.month] == season_of_month(day.month)
+        assert row.is_peak_hour == expected_peak(row.hour, is_weekend) == is_peak_hour(row.hour, is_weekend)
+
+
+def test_online_time_features_match_processing(calendar_df):
+    features = build_time_features(pd.DatetimeIndex(calendar_df['timestamp']))
+    for column in ['hour', 'dayofweek', 'month', 'season', 'is_weekend', 'is_peak_hour']:
+        assert np.array_equal(features[:, TIME_FEATURES.index(column)], calendar_df[column].to_numpy()), column
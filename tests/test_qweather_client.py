@@ -0,0 +1,135 @@
+"""
+QWeather 客户端测试
+
+使用本地桩服务检查：5xx 响应带随机抖动地退避重试，并发请求数不超过限制。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src import qweather_client
+from src.qweather_client import QWeatherClient
+
+
+class StubServer:
+    """
+    本地桩服务：每个地点的前 failures 次请求返回 503，之后返回 200
+
+    属性:
+        requests (dict): {地点: 请求次数}
+        peak (int): 同时处理的最大请求数
+    """
+
+    def __init__(self, failures=1, delay=0.0):
+        """启动桩服务"""
+        self.failures = failures
+        self.delay = delay
+        self.requests = {}
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                location = parse_qs(urlparse(self.path).query)['location'][0]
+                with stub.lock:
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                    count = stub.requests[location] = stub.requests.get(location, 0) + 1
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.active -= 1
+
+                if count <= stub.failures:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps({'code': '200', 'now': {'aqi': '50', 'pm2p5': '20', 'id': location}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def close(self):
+        """停止桩服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def make_stub():
+    servers = []
+
+    def make(**kwargs):
+        servers.append(StubServer(**kwargs))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def test_retries_503_with_jitter(make_stub, monkeypatch):
+    stub = make_stub(failures=2)
+    delays = []
+
+    def record_uniform(low, high):
+        delays.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(qweather_client.random, 'uniform', record_uniform)
+    client = QWeatherClient('key', base_url=stub.url, max_retries=3, backoff=0.5)
+    try:
+        now = client.get_air_now('101010100')
+    finally:
+        client.close()
+
+    assert now == {'aqi': '50', 'pm2p5': '20', 'id': '101010100'}
+    assert stub.requests == {'101010100': 3}
+    # 完全随机抖动：第 n 次重试在 [0, backoff * 2^n] 内均匀取值
+    assert delays == [(0, 0.5), (0, 1.0)]
+
+
+def test_gives_up_after_max_retries(make_stub):
+    stub = make_stub(failures=10)
+    client = QWeatherClient('key', base_url=stub.url, max_retries=2, backoff=0.001)
+    try:
+        assert client.get_air_now('101010100') is None
+    finally:
+        client.close()
+    assert stub.requests == {'101010100': 3}
+
+
+@pytest.mark.parametrize('concurrency, pool_maxsize, limit', [(4, 16, 4), (8, 3, 3)])
+def test_fetch_many_respects_concurrency_limit(make_stub, concurrency, pool_maxsize, limit):
+    stub = make_stub(failures=1, delay=0.05)
+    locations = {f'city{i}': f'1010{i:05d}' for i in range(24)}
+    client = QWeatherClient('key', base_url=stub.url, backoff=0.001, pool_maxsize=pool_maxsize)
+    try:
+        results = client.fetch_many(locations, concurrency=concurrency)
+    finally:
+        client.close()
+
+    assert {name: now['id'] for name, now in results.items()} == locations
+    assert all(count == 2 for count in stub.requests.values())
+    assert 1 < stub.peak <= limit